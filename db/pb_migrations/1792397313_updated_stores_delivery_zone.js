@@ -0,0 +1,42 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // add field
+  collection.fields.addAt(collection.fields.length, new Field({
+    "hidden": false,
+    "id": "number1792397313",
+    "max": null,
+    "min": 0,
+    "name": "delivery_radius_km",
+    "onlyInt": false,
+    "presentable": false,
+    "required": false,
+    "system": false,
+    "type": "number"
+  }))
+
+  // add field
+  collection.fields.addAt(collection.fields.length, new Field({
+    "hidden": false,
+    "id": "json1792397313",
+    "maxSize": 0,
+    "name": "delivery_zone",
+    "presentable": false,
+    "required": false,
+    "system": false,
+    "type": "json"
+  }))
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // remove field
+  collection.fields.removeById("number1792397313")
+
+  // remove field
+  collection.fields.removeById("json1792397313")
+
+  return app.save(collection)
+})
@@ -0,0 +1,25 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // add field
+  collection.fields.addAt(collection.fields.length, new Field({
+    "hidden": false,
+    "id": "json1792398000",
+    "maxSize": 0,
+    "name": "hours",
+    "presentable": false,
+    "required": false,
+    "system": false,
+    "type": "json"
+  }))
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // remove field
+  collection.fields.removeById("json1792398000")
+
+  return app.save(collection)
+})
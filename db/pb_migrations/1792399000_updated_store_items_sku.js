@@ -0,0 +1,34 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_1842453536")
+
+  // add field
+  collection.fields.addAt(collection.fields.length, new Field({
+    "autogeneratePattern": "",
+    "hidden": false,
+    "id": "text1792399000",
+    "max": 0,
+    "min": 0,
+    "name": "sku",
+    "pattern": "",
+    "presentable": false,
+    "primaryKey": false,
+    "required": false,
+    "system": false,
+    "type": "text"
+  }))
+
+  // index the lookup keys used by bulk imports
+  collection.indexes.push("CREATE INDEX `idx_store_items_store_sku` ON `store_items` (`store`, `sku`)")
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_1842453536")
+
+  // remove field
+  collection.fields.removeById("text1792399000")
+
+  collection.indexes = collection.indexes.filter((idx) => !idx.includes("idx_store_items_store_sku"))
+
+  return app.save(collection)
+})
@@ -0,0 +1,16 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const settings = app.settings()
+
+  // enable the batch API used by the backend for bulk writes
+  settings.batch.enabled = true
+  settings.batch.maxRequests = 50
+
+  return app.save(settings)
+}, (app) => {
+  const settings = app.settings()
+
+  settings.batch.enabled = false
+
+  return app.save(settings)
+})
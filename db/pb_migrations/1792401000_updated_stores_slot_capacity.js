@@ -0,0 +1,27 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // add field
+  collection.fields.addAt(collection.fields.length, new Field({
+    "hidden": false,
+    "id": "number1792401000",
+    "max": null,
+    "min": 0,
+    "name": "delivery_slot_capacity",
+    "onlyInt": true,
+    "presentable": false,
+    "required": false,
+    "system": false,
+    "type": "number"
+  }))
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3800236418")
+
+  // remove field
+  collection.fields.removeById("number1792401000")
+
+  return app.save(collection)
+})
@@ -0,0 +1,15 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_684026653")
+
+  // timelines are read per order in time order
+  collection.indexes.push("CREATE INDEX `idx_order_status_updates_order` ON `order_status_updates` (`order`, `timestamp`)")
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_684026653")
+
+  collection.indexes = collection.indexes.filter((idx) => !idx.includes("idx_order_status_updates_order"))
+
+  return app.save(collection)
+})
@@ -0,0 +1,15 @@
+/// <reference path="../pb_data/types.d.ts" />
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3527180448")
+
+  // webhooks and reconciliation look orders up by payment intent
+  collection.indexes.push("CREATE INDEX `idx_orders_stripe_payment_intent_id` ON `orders` (`stripe_payment_intent_id`)")
+
+  return app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("pbc_3527180448")
+
+  collection.indexes = collection.indexes.filter((idx) => !idx.includes("idx_orders_stripe_payment_intent_id"))
+
+  return app.save(collection)
+})
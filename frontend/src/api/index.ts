@@ -118,18 +118,34 @@ export interface OrderCreateData {
   tax_amount: number;
   delivery_fee: number;
   total_amount: number;
-  delivery_address: {
-    street_address: string[];
-    city: string;
-    state: string;
-    zip_code: string;
-    country: string;
-  };
+  delivery_address: DeliveryAddress;
   scheduled_delivery_start?: string;
   scheduled_delivery_end?: string;
   customer_notes?: string;
 }
 
+export interface DeliveryAddress {
+  street_address: string[];
+  city: string;
+  state: string;
+  zip_code: string;
+  country: string;
+}
+
+export interface CartPrice {
+  items: {
+    store_item_id: string;
+    quantity: number;
+    price: number;
+    total_price: number;
+  }[];
+  tax_rate: number;
+  subtotal_amount: number;
+  tax_amount: number;
+  delivery_fee: number;
+  total_amount: number;
+}
+
 // Helper function to handle API responses
 async function handleResponse<T>(response: Response): Promise<T> {
   if (!response.ok) {
@@ -208,6 +224,21 @@ export const ordersApi = {
     return handleResponse(response);
   },
 
+  priceCart: async (
+    token: string,
+    cart: { store_id: string; items: { store_item_id: string; quantity: number }[]; delivery_address?: DeliveryAddress }
+  ): Promise<CartPrice> => {
+    const response = await fetch(`${config.apiUrl}/api/v0/orders/price`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(cart),
+    });
+    return handleResponse(response);
+  },
+
   createOrder: async (token: string, orderData: OrderCreateData): Promise<Order> => {
     const response = await fetch(`${config.apiUrl}/api/v0/orders`, {
       method: 'POST',
@@ -7,7 +7,7 @@ import { useCart } from '@/app/contexts/cart';
 import { useAuth } from '@/app/contexts/auth';
 import { toast } from 'react-hot-toast';
 import { useRouter } from 'next/navigation';
-import { storesApi, paymentApi, authApi, ordersApi, SavedCard, Store } from '@/api';
+import { storesApi, paymentApi, authApi, ordersApi, SavedCard, Store, Profile, DeliveryAddress } from '@/api';
 
 interface CheckoutModalProps {
   isOpen: boolean;
@@ -25,6 +25,17 @@ const DELIVERY_TIME_SLOTS = [
   { id: '1800-1900', label: '6:00 PM - 7:00 PM' }
 ];
 
+const hasDeliveryAddress = (profile: Profile) =>
+  Boolean(profile.street_1 && profile.city && profile.state && profile.zip);
+
+const deliveryAddressOf = (profile: Profile): DeliveryAddress => ({
+  street_address: [profile.street_1].concat(profile.street_2 ? [profile.street_2] : []),
+  city: profile.city,
+  state: profile.state,
+  zip_code: profile.zip,
+  country: 'US'
+});
+
 export default function CheckoutModal({ 
   isOpen, 
   onClose, 
@@ -37,14 +48,18 @@ export default function CheckoutModal({
   const { user } = useAuth();
   const router = useRouter();
   const [isCheckingOut, setIsCheckingOut] = useState(false);
+  const [profile, setProfile] = useState<Profile | null>(null);
+  const [isPricing, setIsPricing] = useState(false);
   const [selectedTimeSlot, setSelectedTimeSlot] = useState(DELIVERY_TIME_SLOTS[0].id);
   const [orderSummary, setOrderSummary] = useState<{
     subtotalAmount: number;
+    taxRate: number;
     taxAmount: number;
     deliveryFee: number;
     totalAmount: number;
   }>({
     subtotalAmount: 0,
+    taxRate: 0,
     taxAmount: 0,
     deliveryFee: 0,
     totalAmount: 0
@@ -65,34 +80,50 @@ export default function CheckoutModal({
     day: 'numeric'
   });
 
-  // Calculate order summary when items change
+  // Price the order on the server when items change; tax depends on the delivery ZIP
   useEffect(() => {
-    if (items.length > 0) {
-      const subtotalAmount = items.reduce((sum, item) => sum + (item.price * item.quantity), 0);
-      const taxRate = 0.08875; // Example tax rate (8.875%)
-      const taxAmount = subtotalAmount * taxRate;
-      const deliveryFee = 5.99; // Example delivery fee
-      const totalAmount = subtotalAmount + taxAmount + deliveryFee;
+    if (!isOpen || !user || !store || items.length === 0) return;
 
-      setOrderSummary({
-        subtotalAmount,
-        taxAmount,
-        deliveryFee,
-        totalAmount
-      });
-    }
-  }, [items]);
+    let cancelled = false;
+    const priceOrder = async () => {
+      setIsPricing(true);
+      try {
+        const userProfile = await authApi.getProfile(user.token);
+        const price = await ordersApi.priceCart(user.token, {
+          store_id: store.id,
+          items: items.map(item => ({ store_item_id: item.id, quantity: item.quantity })),
+          delivery_address: hasDeliveryAddress(userProfile) ? deliveryAddressOf(userProfile) : undefined
+        });
+        if (cancelled) return;
+        setProfile(userProfile);
+        setOrderSummary({
+          subtotalAmount: price.subtotal_amount,
+          taxRate: price.tax_rate,
+          taxAmount: price.tax_amount,
+          deliveryFee: price.delivery_fee,
+          totalAmount: price.total_amount
+        });
+      } catch (error) {
+        console.error('Error pricing order:', error);
+        if (!cancelled) toast.error('Failed to load order total');
+      } finally {
+        if (!cancelled) setIsPricing(false);
+      }
+    };
+
+    priceOrder();
+    return () => {
+      cancelled = true;
+    };
+  }, [isOpen, user, store, items]);
 
   const handleCheckout = async () => {
-    if (!user || !store || !selectedCardId) return;
+    if (!user || !store || !selectedCardId || !profile || isPricing) return;
 
     setIsCheckingOut(true);
     try {
-      // Get user's profile for delivery address
-      const profile = await authApi.getProfile(user.token);
-
       // Validate delivery address
-      if (!profile.street_1 || !profile.city || !profile.state || !profile.zip) {
+      if (!hasDeliveryAddress(profile)) {
         toast.error('Please complete your delivery address in your profile');
         onClose();
         router.push('/profile');
@@ -124,13 +155,7 @@ export default function CheckoutModal({
         total_amount: orderSummary.totalAmount,
         scheduled_delivery_start: startDate.toISOString(),
         scheduled_delivery_end: endDate.toISOString(),
-        delivery_address: {
-          street_address: [profile.street_1].concat(profile.street_2 ? [profile.street_2] : []),
-          city: profile.city,
-          state: profile.state,
-          zip_code: profile.zip,
-          country: 'US'
-        }
+        delivery_address: deliveryAddressOf(profile)
       });
 
       toast.success('Order placed successfully!');
@@ -139,7 +164,7 @@ export default function CheckoutModal({
       router.push(`/orders/${order.order_id}`);
     } catch (error) {
       console.error('Error creating order:', error);
-      toast.error('Failed to place order');
+      toast.error(error instanceof Error && error.message ? error.message : 'Failed to place order');
       onClose(false);
     } finally {
       setIsCheckingOut(false);
@@ -217,7 +242,7 @@ export default function CheckoutModal({
                               <span>${orderSummary.subtotalAmount.toFixed(2)}</span>
                             </div>
                             <div className="flex justify-between text-sm text-[#4A5568]">
-                              <span>Tax (8.875%)</span>
+                              <span>Tax ({Number((orderSummary.taxRate * 100).toFixed(3))}%)</span>
                               <span>${orderSummary.taxAmount.toFixed(2)}</span>
                             </div>
                             <div className="flex justify-between text-sm text-[#4A5568]">
@@ -322,7 +347,7 @@ export default function CheckoutModal({
                     type="button"
                     className="inline-flex w-full justify-center rounded-md bg-[#2A9D8F] px-3 py-2 text-sm font-medium text-white shadow-sm hover:bg-[#40B4A6] focus:outline-none disabled:opacity-50 disabled:cursor-not-allowed sm:col-start-2"
                     onClick={handleCheckout}
-                    disabled={isCheckingOut || !selectedCardId}
+                    disabled={isCheckingOut || isPricing || !profile || !selectedCardId}
                   >
                     {isCheckingOut ? 'Processing...' : 'Submit Order'}
                   </button>
@@ -0,0 +1,157 @@
+"""
+Command line entry point
+
+    python -m benchmarks load --scenario mixed --duration 30 --concurrency 20 \\
+        --latency pocketbase=0.005,stripe=0.2 --errors uber=0.05 --output run.json
+    python -m benchmarks serializers --output serializers.json
+    python -m benchmarks load --compare run.json      # run again and diff
+    python -m benchmarks replay traffic.ndjson --speed 2 --output replay.json
+    python -m benchmarks compare before.json after.json
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+from .fakes import SERVICES
+from .scenarios import SCENARIOS
+
+def _service_values(text: Optional[str], flag: str) -> Dict[str, float]:
+    """Parse "pocketbase=0.01,stripe=0.2" into a dict of floats"""
+    values = {}
+    for pair in filter(None, (text or '').split(',')):
+        name, _, value = pair.partition('=')
+        if name not in SERVICES:
+            raise argparse.ArgumentTypeError(f"{flag}: unknown service {name!r}, expected one of {', '.join(SERVICES)}")
+        values[name] = float(value)
+    return values
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return ''
+    return f"{(after - before) / before * 100:+.1f}%"
+
+def _number(value: float) -> str:
+    return str(value) if isinstance(value, int) else f"{value:.3f}".rstrip('0').rstrip('.')
+
+def _rows(result: Dict) -> Dict[str, Dict[str, float]]:
+    if result['kind'] == 'load':
+        return {**result['routes'], 'TOTAL': result['total']}
+    return result['benchmarks']
+
+COLUMNS = {
+    'load': ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'errors'),
+    'serializers': ('us_per_record', 'records_per_second'),
+}
+
+def print_report(result: Dict, baseline: Optional[Dict] = None) -> None:
+    columns = COLUMNS[result['kind']]
+    rows = _rows(result)
+    before = _rows(baseline) if baseline else {}
+    if baseline:
+        print(f"baseline {baseline.get('commit')}  ->  {result.get('commit')}")
+    width = max([len(name) for name in rows] + [5])
+    print(f"{'':{width}}  " + '  '.join(f"{column:>20}" for column in columns))
+    for name, row in rows.items():
+        cells = []
+        for column in columns:
+            cell = _number(row[column])
+            if name in before:
+                cell = f"{cell} ({_delta(before[name][column], row[column]) or '='})"
+            cells.append(f"{cell:>20}")
+        print(f"{name:{width}}  " + '  '.join(cells))
+    if before:
+        for name in sorted(set(before) - set(rows)):
+            print(f"{name:{width}}  (only in baseline)")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="LocalMart backend benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='run a load scenario against fake dependencies')
+    load.add_argument('--scenario', choices=sorted(SCENARIOS) + ['mixed'], default='mixed')
+    load.add_argument('--duration', type=float, default=30, help='measured seconds')
+    load.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before the run')
+    load.add_argument('--concurrency', type=int, default=20, help='virtual users')
+
+    replay = commands.add_parser('replay', help='replay a traffic log recorded with LOCALMART_TRAFFIC_RECORD_PATH')
+    replay.add_argument('log', help='NDJSON traffic log')
+    replay.add_argument('--speed', type=float, default=1.0, help='replay rate as a multiple of the recorded rate')
+    replay.add_argument('--limit', type=int, help='replay only the first N requests')
+    replay.add_argument('--max-in-flight', type=int, default=256, help='most requests outstanding at once')
+
+    micro = commands.add_parser('serializers', help='microbenchmark api/serializers.py')
+    micro.add_argument('--min-time', type=float, default=0.5, help='seconds per timed run')
+
+    compare = commands.add_parser('compare', help='diff two saved results')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+
+    for command in (load, replay):
+        command.add_argument('--workers', type=int, default=1, help='backend worker processes')
+        command.add_argument('--latency', help='mean latency in seconds per service, e.g. pocketbase=0.005,stripe=0.2')
+        command.add_argument('--errors', help='error rate per service, e.g. uber=0.05')
+        command.add_argument('--stores', type=int, default=20)
+        command.add_argument('--items', type=int, default=200, help='items per store')
+        command.add_argument('--users', type=int, default=100)
+        command.add_argument('--orders', type=int, default=500)
+        command.add_argument('--verbose', action='store_true', help='show fake and backend logs')
+
+    for command in (load, replay, micro):
+        command.add_argument('--output', help='write the result as JSON to this file')
+        command.add_argument('--compare', metavar='BASELINE', help='show changes against a saved result')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            print_report(json.load(f), baseline)
+        return
+
+    if args.command in ('load', 'replay'):
+        try:
+            latency = _service_values(args.latency, '--latency')
+            errors = _service_values(args.errors, '--errors')
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        faults = {
+            name: {key: value for key, value in (('latency', latency.get(name)), ('error_rate', errors.get(name))) if value is not None}
+            for name in SERVICES
+        }
+        faults = {name: fault for name, fault in faults.items() if fault}
+        seed_args = {'stores': args.stores, 'items': args.items, 'users': args.users, 'orders': args.orders}
+
+    if args.command == 'load':
+        from .runner import run_load
+        result = run_load(
+            args.scenario, args.duration, args.concurrency, faults, seed_args,
+            workers=args.workers, warmup=args.warmup, quiet=not args.verbose
+        )
+    elif args.command == 'replay':
+        from .replay import run_replay
+        result = run_replay(
+            args.log, args.speed, faults, seed_args,
+            workers=args.workers, max_in_flight=args.max_in_flight, limit=args.limit, quiet=not args.verbose
+        )
+    else:
+        from .serializers import run_serializers
+        result = run_serializers(min_time=args.min_time)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('kind') != result['kind']:
+            parser.error(f"{args.compare} holds a {baseline.get('kind')} result, not {result['kind']}")
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
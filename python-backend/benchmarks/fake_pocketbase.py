@@ -0,0 +1,276 @@
+"""In-memory stand-in for the parts of the PocketBase API the backend uses."""
+
+import base64
+import json
+import random
+import re
+import string
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Relation field -> collection it points at, used to expand records
+RELATIONS = {
+    'store': 'stores',
+    'store_item': 'store_items',
+    'user': 'users',
+    'order': 'orders',
+    'payment_method': 'payment_methods',
+}
+
+def new_id() -> str:
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=15))
+
+def now_string() -> str:
+    t = time.time()
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t)) + f".{int(t * 1000) % 1000:03d}Z"
+
+def make_token(record_id: str, ttl: int = 7 * 24 * 3600) -> str:
+    """An unsigned JWT-shaped token; the fake accepts any token, the backend only decodes it"""
+    def encode(data: Dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode({'id': record_id, 'exp': int(time.time()) + ttl})}.sig"
+
+# --- filters -----------------------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(?:(?P<str>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|(?P<op>&&|\|\||!=|>=|<=|!~|=|>|<|~|\(|\))|(?P<num>-?\d+(?:\.\d+)?)|(?P<ident>[A-Za-z_@][\w.@]*))')
+
+def _tokenize(text: str) -> List[tuple]:
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ValueError(f"Cannot parse filter near: {text[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'str':
+            value = value[1:-1]
+        elif kind == 'num':
+            value = float(value)
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+def compile_filter(text: Optional[str], resolve: Callable[[Dict, str], Any]) -> Callable[[Dict], bool]:
+    """
+    Compile a PocketBase filter expression into a predicate
+
+    Supports comparisons joined with &&, || and parentheses, which covers
+    every filter the backend builds. Fields that can't be resolved (e.g.
+    multi-hop back-relations) compare as true so the query still returns data.
+    """
+    if not text or not text.strip():
+        return lambda record: True
+    tokens = _tokenize(text)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None)
+
+    def take():
+        nonlocal position
+        token = tokens[position]
+        position += 1
+        return token
+
+    def parse_or():
+        left = parse_and()
+        while peek() == ('op', '||'):
+            take()
+            right = parse_and()
+            left = (lambda a, b: lambda r: a(r) or b(r))(left, right)
+        return left
+
+    def parse_and():
+        left = parse_atom()
+        while peek() == ('op', '&&'):
+            take()
+            right = parse_atom()
+            left = (lambda a, b: lambda r: a(r) and b(r))(left, right)
+        return left
+
+    def parse_atom():
+        if peek() == ('op', '('):
+            take()
+            inner = parse_or()
+            take()  # ')'
+            return inner
+        _, field = take()
+        _, op = take()
+        _, value = take()
+        return _comparison(field, op, value)
+
+    def _comparison(field, op, value):
+        def check(record):
+            actual = resolve(record, field)
+            if actual is _UNRESOLVED:
+                return True
+            if isinstance(actual, list):
+                return any(_compare(item, op, value) for item in actual) if actual else _compare('', op, value)
+            return _compare(actual, op, value)
+        return check
+
+    return parse_or()
+
+_UNRESOLVED = object()
+
+def _compare(actual: Any, op: str, value: Any) -> bool:
+    if actual is None:
+        actual = ''
+    if value in ('true', 'false'):
+        # Unset bool fields read as false
+        actual, value = bool(actual), value == 'true'
+    if isinstance(value, float) and not isinstance(actual, (int, float)):
+        try:
+            actual = float(actual)
+        except (TypeError, ValueError):
+            return False
+    if isinstance(actual, (int, float)) and not isinstance(value, float):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+    if op == '=':
+        return actual == value
+    if op == '!=':
+        return actual != value
+    if op == '~':
+        return str(value).lower() in str(actual).lower()
+    if op == '!~':
+        return str(value).lower() not in str(actual).lower()
+    try:
+        return {'>': actual > value, '>=': actual >= value, '<': actual < value, '<=': actual <= value}[op]
+    except TypeError:
+        return False
+
+class FakePocketBase:
+    """Collections of plain dict records with PocketBase list, filter and expand semantics"""
+
+    def __init__(self):
+        self.collections: Dict[str, Dict[str, Dict]] = {}
+        # (collection, relation field) -> related id -> ids of records pointing at it
+        self._refs: Dict[tuple, Dict[str, set]] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, collection: str, record: Dict, add: bool) -> None:
+        for field in RELATIONS:
+            value = record.get(field)
+            if isinstance(value, str) and value:
+                ids = self._refs.setdefault((collection, field), {}).setdefault(value, set())
+                (ids.add if add else ids.discard)(record['id'])
+
+    def insert(self, collection: str, data: Dict) -> Dict:
+        record = {'id': data.get('id') or new_id(), 'created': now_string(), 'updated': now_string(), **data}
+        record['collectionName'] = collection
+        with self._lock:
+            self.collections.setdefault(collection, {})[record['id']] = record
+            self._index(collection, record, True)
+        return record
+
+    def records(self, collection: str) -> List[Dict]:
+        with self._lock:
+            return list(self.collections.get(collection, {}).values())
+
+    def get(self, collection: str, record_id: str) -> Optional[Dict]:
+        return self.collections.get(collection, {}).get(record_id)
+
+    def exists(self, collection: str, record_id: str) -> bool:
+        return record_id in self.collections.get(collection, {})
+
+    def update(self, collection: str, record_id: str, data: Dict) -> Optional[Dict]:
+        with self._lock:
+            record = self.collections.get(collection, {}).get(record_id)
+            if record is None:
+                return None
+            self._index(collection, record, False)
+            for key, value in data.items():
+                # `field+` / `field-` number modifiers
+                if key[-1:] in ('+', '-') and isinstance(value, (int, float)):
+                    field = key[:-1]
+                    record[field] = (record.get(field) or 0) + (value if key[-1] == '+' else -value)
+                else:
+                    record[key] = value
+            self._index(collection, record, True)
+            record['updated'] = now_string()
+            return record
+
+    def delete(self, collection: str, record_id: str) -> bool:
+        with self._lock:
+            record = self.collections.get(collection, {}).pop(record_id, None)
+            if record is None:
+                return False
+            self._index(collection, record, False)
+            return True
+
+    def referencing(self, collection: str, field: str, record_id: str) -> List[Dict]:
+        """Records of a collection whose relation field points at record_id"""
+        with self._lock:
+            ids = list(self._refs.get((collection, field), {}).get(record_id, ()))
+            records = self.collections.get(collection, {})
+            return [records[i] for i in ids if i in records]
+
+    def _resolve(self, record: Dict, field: str) -> Any:
+        parts = field.split('.')
+        if len(parts) == 1:
+            # Unset fields read as empty, as in PocketBase
+            return record.get(field, '')
+        # One hop through a forward relation, e.g. store_item.store
+        if len(parts) == 2 and parts[0] in RELATIONS:
+            target = self.get(RELATIONS[parts[0]], record.get(parts[0]) or '')
+            return target.get(parts[1], '') if target else ''
+        return _UNRESOLVED
+
+    def _expand(self, record: Dict, spec: str) -> Dict:
+        record = dict(record)
+        tree: Dict[str, Any] = {}
+        for path in spec.split(','):
+            node = tree
+            for part in path.strip().split('.'):
+                node = node.setdefault(part, {})
+        return self._expand_tree(record, tree)
+
+    def _expand_tree(self, record: Dict, tree: Dict) -> Dict:
+        record = dict(record)
+        expand = {}
+        for field, children in tree.items():
+            if '_via_' in field:
+                collection, back_field = field.split('_via_', 1)
+                related = self.referencing(collection, back_field, record['id'])
+                expand[field] = [self._expand_tree(r, children) if children else r for r in related]
+            elif field in RELATIONS and record.get(field):
+                related = self.get(RELATIONS[field], record[field])
+                if related:
+                    expand[field] = self._expand_tree(related, children) if children else related
+        if expand:
+            record['expand'] = expand
+        return record
+
+    def list(self, collection: str, params: Dict[str, str]) -> Dict:
+        page = int(params.get('page', 1))
+        per_page = int(params.get('perPage', 30))
+        predicate = compile_filter(params.get('filter'), self._resolve)
+        rows = [r for r in self.records(collection) if predicate(r)]
+
+        for key in reversed([k.strip() for k in (params.get('sort') or '').split(',') if k.strip()]):
+            descending = key.startswith('-')
+            name = key.lstrip('-+')
+            rows.sort(key=lambda r: (r.get(name) is None, str(r.get(name, ''))), reverse=descending)
+
+        items = rows[(page - 1) * per_page:page * per_page]
+        if params.get('expand'):
+            items = [self._expand(item, params['expand']) for item in items]
+        total = -1 if params.get('skipTotal') in ('1', 'true') else len(rows)
+        return {
+            'page': page,
+            'perPage': per_page,
+            'totalItems': total,
+            'totalPages': -1 if total < 0 else max(1, -(-total // per_page)),
+            'items': items,
+        }
+
+    def view(self, collection: str, record_id: str, params: Dict[str, str]) -> Optional[Dict]:
+        record = self.get(collection, record_id)
+        if record and params.get('expand'):
+            record = self._expand(record, params['expand'])
+        return record
@@ -0,0 +1,312 @@
+"""
+Local stand-ins for PocketBase, Stripe, Uber Direct and Google Geocoding
+
+Run as `python -m benchmarks.fakes` (the runner does this for you). Every
+fake can be given a latency and an error rate, so load tests can show how
+the backend behaves when a dependency is slow or flaky.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from .fake_pocketbase import FakePocketBase, make_token
+from .seed import seed
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ('pocketbase', 'stripe', 'uber', 'google')
+
+class Fault:
+    """Latency and error injection for one fake service"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, jitter: float = 0.5):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+
+    async def apply(self) -> Optional[Response]:
+        """Sleep for the configured latency; returns an error response for failed calls"""
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            return JSONResponse({'code': 503, 'message': 'Injected failure', 'data': {}}, status_code=503)
+        return None
+
+def faulty(fault: Fault, handler):
+    async def wrapped(request: Request) -> Response:
+        return await fault.apply() or await handler(request)
+    return wrapped
+
+def _not_found(message: str = "The requested resource wasn't found.") -> JSONResponse:
+    return JSONResponse({'code': 404, 'message': message, 'data': {}}, status_code=404)
+
+def _id_not_unique() -> JSONResponse:
+    return JSONResponse({
+        'code': 400,
+        'message': 'Failed to create record.',
+        'data': {'id': {'code': 'validation_invalid_id', 'message': 'The model id is invalid or already exists.'}}
+    }, status_code=400)
+
+# --- PocketBase ----------------------------------------------------------------
+
+def pocketbase_app(db: FakePocketBase, fault: Fault) -> Starlette:
+    async def record_auth(request: Request) -> Response:
+        body = await request.json()
+        collection = request.path_params['collection']
+        if collection == '_superusers':
+            # The SDK's admin auth reads the record back as `admin`
+            admin = {'id': 'superuser00000', 'email': body.get('identity')}
+            return JSONResponse({'token': make_token(admin['id']), 'record': admin, 'admin': admin})
+        matches = [r for r in db.records(collection) if r.get('email') == body.get('identity')]
+        if not matches:
+            return JSONResponse({'code': 400, 'message': 'Failed to authenticate.', 'data': {}}, status_code=400)
+        return JSONResponse({'token': make_token(matches[0]['id']), 'record': matches[0]})
+
+    async def list_records(request: Request) -> Response:
+        return JSONResponse(db.list(request.path_params['collection'], dict(request.query_params)))
+
+    async def view_record(request: Request) -> Response:
+        record = db.view(request.path_params['collection'], request.path_params['id'], dict(request.query_params))
+        return JSONResponse(record) if record else _not_found()
+
+    def _id_taken(collection: str, data: Dict) -> bool:
+        return bool(data.get('id')) and db.exists(collection, data['id'])
+
+    async def create_record(request: Request) -> Response:
+        data = await request.json()
+        if _id_taken(request.path_params['collection'], data):
+            return _id_not_unique()
+        return JSONResponse(db.insert(request.path_params['collection'], data))
+
+    async def update_record(request: Request) -> Response:
+        record = db.update(request.path_params['collection'], request.path_params['id'], await request.json())
+        return JSONResponse(record) if record else _not_found()
+
+    async def delete_record(request: Request) -> Response:
+        if db.delete(request.path_params['collection'], request.path_params['id']):
+            return Response(status_code=204)
+        return _not_found()
+
+    async def batch(request: Request) -> Response:
+        entries = (await request.json()).get('requests', [])
+        # All or nothing, as PocketBase runs a batch in one transaction
+        for entry in entries:
+            parts = entry['url'].split('?')[0].strip('/').split('/')
+            if entry['method'] == 'POST' and _id_taken(parts[2], entry.get('body') or {}):
+                return JSONResponse({'code': 400, 'message': 'Batch transaction failed.', 'data': {}}, status_code=400)
+            if entry['method'] in ('PATCH', 'DELETE') and not db.exists(parts[2], parts[4]):
+                return JSONResponse({'code': 400, 'message': 'Batch transaction failed.', 'data': {}}, status_code=400)
+        results = []
+        for entry in entries:
+            parts = entry['url'].split('?')[0].strip('/').split('/')
+            collection = parts[2]
+            if entry['method'] == 'POST':
+                results.append({'status': 200, 'body': db.insert(collection, entry.get('body') or {})})
+            elif entry['method'] == 'PATCH':
+                record = db.update(collection, parts[4], entry.get('body') or {})
+                results.append({'status': 200 if record else 404, 'body': record or {}})
+            elif entry['method'] == 'DELETE':
+                results.append({'status': 204 if db.delete(collection, parts[4]) else 404, 'body': None})
+        return JSONResponse(results)
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({'code': 200, 'message': 'API is healthy.', 'data': {}})
+
+    return Starlette(routes=[
+        Route('/api/health', health),
+        Route('/api/collections/{collection}/auth-with-password', faulty(fault, record_auth), methods=['POST']),
+        Route('/api/collections/{collection}/records', faulty(fault, list_records), methods=['GET']),
+        Route('/api/collections/{collection}/records', faulty(fault, create_record), methods=['POST']),
+        Route('/api/collections/{collection}/records/{id}', faulty(fault, view_record), methods=['GET']),
+        Route('/api/collections/{collection}/records/{id}', faulty(fault, update_record), methods=['PATCH']),
+        Route('/api/collections/{collection}/records/{id}', faulty(fault, delete_record), methods=['DELETE']),
+        Route('/api/batch', faulty(fault, batch), methods=['POST']),
+    ])
+
+# --- Stripe --------------------------------------------------------------------
+
+def stripe_app(fault: Fault) -> Starlette:
+    intents: Dict[str, Dict] = {}
+
+    async def create_payment_intent(request: Request) -> Response:
+        form = dict(parse_qsl((await request.body()).decode()))
+        intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': int(form.get('amount', 0)),
+            'currency': form.get('currency', 'usd'),
+            'customer': form.get('customer'),
+            'payment_method': form.get('payment_method'),
+            'status': 'succeeded' if form.get('confirm') == 'true' else 'requires_confirmation',
+            'client_secret': f"{intent_id}_secret_{uuid.uuid4().hex[:12]}",
+            'created': int(time.time()),
+            'last_payment_error': None,
+        }
+        intents[intent_id] = intent
+        return JSONResponse(intent)
+
+    async def list_payment_intents(request: Request) -> Response:
+        params = request.query_params
+        limit = int(params.get('limit', 10))
+        rows = sorted(intents.values(), key=lambda pi: pi['created'], reverse=True)
+        if params.get('created[gte]'):
+            rows = [pi for pi in rows if pi['created'] >= int(params['created[gte]'])]
+        if params.get('created[lt]'):
+            rows = [pi for pi in rows if pi['created'] < int(params['created[lt]'])]
+        if params.get('starting_after'):
+            ids = [pi['id'] for pi in rows]
+            start = ids.index(params['starting_after']) + 1 if params['starting_after'] in ids else len(rows)
+            rows = rows[start:]
+        return JSONResponse({
+            'object': 'list',
+            'url': '/v1/payment_intents',
+            'data': rows[:limit],
+            'has_more': len(rows) > limit,
+        })
+
+    async def get_payment_intent(request: Request) -> Response:
+        intent = intents.get(request.path_params['id'])
+        if intent is None:
+            return JSONResponse({'error': {'type': 'invalid_request_error', 'message': 'No such payment_intent'}}, status_code=404)
+        return JSONResponse(intent)
+
+    async def create_setup_intent(request: Request) -> Response:
+        setup_id = f"seti_{uuid.uuid4().hex[:24]}"
+        return JSONResponse({
+            'id': setup_id,
+            'object': 'setup_intent',
+            'client_secret': f"{setup_id}_secret_{uuid.uuid4().hex[:12]}",
+            'status': 'requires_payment_method',
+        })
+
+    return Starlette(routes=[
+        Route('/v1/payment_intents', faulty(fault, create_payment_intent), methods=['POST']),
+        Route('/v1/payment_intents', faulty(fault, list_payment_intents), methods=['GET']),
+        Route('/v1/payment_intents/{id}', faulty(fault, get_payment_intent), methods=['GET']),
+        Route('/v1/setup_intents', faulty(fault, create_setup_intent), methods=['POST']),
+    ])
+
+# --- Uber Direct ---------------------------------------------------------------
+
+def uber_app(fault: Fault) -> Starlette:
+    async def token(request: Request) -> Response:
+        return JSONResponse({'access_token': f"uber-{uuid.uuid4().hex}", 'token_type': 'Bearer', 'expires_in': 2592000})
+
+    async def quote(request: Request) -> Response:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        duration = random.randint(25, 55)
+        return JSONResponse({
+            'kind': 'delivery_quote',
+            'id': f"dqt_{uuid.uuid4().hex[:22]}",
+            'created': now.isoformat(),
+            'expires': (now + datetime.timedelta(minutes=15)).isoformat(),
+            'fee': random.randint(499, 999),
+            'currency': 'usd',
+            'currency_type': 'USD',
+            'dropoff_eta': (now + datetime.timedelta(minutes=duration)).isoformat(),
+            'duration': duration,
+            'pickup_duration': random.randint(5, 15),
+        })
+
+    async def create_delivery(request: Request) -> Response:
+        delivery_id = f"del_{uuid.uuid4().hex[:22]}"
+        return JSONResponse({
+            'kind': 'delivery',
+            'id': delivery_id,
+            'status': 'pending',
+            'fee': random.randint(499, 999),
+            'currency': 'usd',
+            'tracking_url': f"https://delivery.uber.com/orders/{delivery_id}",
+        })
+
+    async def get_delivery(request: Request) -> Response:
+        return JSONResponse({'kind': 'delivery', 'id': request.path_params['id'], 'status': 'pickup'})
+
+    async def cancel_delivery(request: Request) -> Response:
+        return JSONResponse({'kind': 'delivery', 'id': request.path_params['id'], 'status': 'canceled'})
+
+    return Starlette(routes=[
+        Route('/oauth/v2/token', faulty(fault, token), methods=['POST']),
+        Route('/v1/customers/{customer}/delivery_quotes', faulty(fault, quote), methods=['POST']),
+        Route('/v1/customers/{customer}/deliveries', faulty(fault, create_delivery), methods=['POST']),
+        Route('/v1/customers/{customer}/deliveries/{id}', faulty(fault, get_delivery), methods=['GET']),
+        Route('/v1/customers/{customer}/deliveries/{id}/cancel', faulty(fault, cancel_delivery), methods=['POST']),
+    ])
+
+# --- Google Geocoding ----------------------------------------------------------
+
+def google_app(fault: Fault) -> Starlette:
+    async def geocode(request: Request) -> Response:
+        address = request.query_params.get('address', '')
+        # Deterministic per address, scattered around Astoria
+        rng = random.Random(address)
+        return JSONResponse({
+            'status': 'OK',
+            'results': [{
+                'formatted_address': address,
+                'geometry': {'location': {
+                    'lat': 40.7644 + rng.uniform(-0.03, 0.03),
+                    'lng': -73.9235 + rng.uniform(-0.03, 0.03),
+                }},
+            }],
+        })
+
+    return Starlette(routes=[
+        Route('/maps/api/geocode/json', faulty(fault, geocode), methods=['GET']),
+    ])
+
+# --- Entry point ---------------------------------------------------------------
+
+def build_apps(faults: Dict[str, Fault], db: FakePocketBase) -> Dict[str, Starlette]:
+    return {
+        'pocketbase': pocketbase_app(db, faults['pocketbase']),
+        'stripe': stripe_app(faults['stripe']),
+        'uber': uber_app(faults['uber']),
+        'google': google_app(faults['google']),
+    }
+
+async def serve(ports: Dict[str, int], faults: Dict[str, Fault], db: FakePocketBase) -> None:
+    apps = build_apps(faults, db)
+    servers = [
+        uvicorn.Server(uvicorn.Config(apps[name], host='127.0.0.1', port=ports[name], log_level='warning', access_log=False))
+        for name in SERVICES
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve fake LocalMart dependencies")
+    parser.add_argument('--ports', required=True, help='JSON object of service name to port')
+    parser.add_argument('--faults', default='{}', help='JSON object of service name to {"latency": s, "error_rate": p}')
+    parser.add_argument('--stores', type=int, default=20)
+    parser.add_argument('--items', type=int, default=200, help='items per store')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(args.seed)
+    db = FakePocketBase()
+    seed(db, stores=args.stores, items_per_store=args.items, users=args.users, orders=args.orders)
+
+    fault_config = json.loads(args.faults)
+    faults = {name: Fault(**fault_config.get(name, {})) for name in SERVICES}
+    asyncio.run(serve(json.loads(args.ports), faults, db))
+
+if __name__ == '__main__':
+    main()
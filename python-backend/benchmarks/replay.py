@@ -0,0 +1,272 @@
+"""
+Replay a recorded traffic log against a local backend and the fakes
+
+The log is written by localmart_backend/traffic_recording.py. Requests are
+sent open-loop at their recorded offsets (divided by --speed), so a slower
+backend sees the same arrival pattern instead of a gentler one. Hashed ids
+are mapped onto seeded records consistently: the same hash always becomes
+the same store, order or user, which keeps cache hit patterns realistic.
+"""
+
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from localmart_backend.traffic_recording import PLAIN_QUERY_PARAMS
+
+from .runner import provenance, report, stack
+from .scenarios import (
+    WEBHOOK_SECRET, Fixture, Recorder, Session, address_of, delivery_start, delivery_windows,
+    order_request, payment_event, sign_webhook
+)
+
+# Routes that need a store or global admin; they are replayed as the seeded admin
+ADMIN_ROUTES = {
+    ('GET', '/api/v0/orders'),
+    ('GET', '/api/v0/orders/export'),
+    ('PATCH', '/api/v0/orders/{order_id}/status'),
+    ('GET', '/api/v0/stores/{store_id}/orders'),
+    ('GET', '/api/v0/stores/{store_id}/stats'),
+    ('GET', '/api/v0/stores/{store_id}/roles'),
+    ('POST', '/api/v0/stores/{store_id}/dispatch'),
+    ('POST', '/api/v0/stores/{store_id}/geocode'),
+    ('POST', '/api/v0/stores/{store_id}/items'),
+    ('PATCH', '/api/v0/stores/{store_id}/items'),
+    ('POST', '/api/v0/stores/{store_id}/items/import'),
+    ('PATCH', '/api/v0/stores/{store_id}/items/{item_id}'),
+    ('DELETE', '/api/v0/stores/{store_id}/items/{item_id}'),
+    ('POST', '/api/v0/payment/reconcile'),
+}
+
+def load_log(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries[:limit] if limit else entries
+
+def _length(shape: Any, default: int = 1) -> int:
+    if isinstance(shape, list):
+        return len(shape)
+    return shape if isinstance(shape, int) else default
+
+class Mapper:
+    """Consistent mapping from recorded hashes to seeded records"""
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+
+    @staticmethod
+    def pick(records: List[Dict], digest: Optional[str]) -> Dict:
+        if not digest:
+            return random.choice(records)
+        return records[int(digest, 16) % len(records)]
+
+    def store(self, digest: Optional[str]) -> Dict:
+        return self.pick(self.fixture.stores, digest)
+
+    def item(self, store: Dict, digest: Optional[str]) -> Dict:
+        return self.pick(self.fixture.items[store['id']], digest)
+
+    def order(self, digest: Optional[str]) -> Dict:
+        return self.pick(self.fixture.orders, digest)
+
+    def customer(self, digest: Optional[str]) -> Dict:
+        return self.pick(self.fixture.customers, digest)
+
+    def path(self, route: str, params: Dict[str, str]) -> Tuple[str, Dict, Optional[Dict]]:
+        """The route with seeded ids filled in, plus the store and order it refers to"""
+        store = self.store(params.get('store_id'))
+        order = self.order(params['order_id']) if 'order_id' in params else None
+        values = {'store_id': store['id']}
+        if 'item_id' in params:
+            values['item_id'] = self.item(store, params['item_id'])['id']
+        if order is not None:
+            values['order_id'] = order['id']
+        if 'card_id' in params:
+            values['card_id'] = self.fixture.payment_methods[self.customer(params['card_id'])['id']]
+        for name, value in params.items():
+            values.setdefault(name, value)
+        return route.format(**values), store, order
+
+# Body builders: (mapper, entry, store, user) -> request kwargs
+Builder = Callable[[Mapper, Dict, Dict, Dict], Dict[str, Any]]
+
+def _order(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    shape = entry.get('j') or {}
+    store = mapper.store(shape.get('store_id'))
+    lines = shape.get('items') if isinstance(shape.get('items'), list) else [{}]
+    items = [mapper.item(store, line.get('store_item_id') if isinstance(line, dict) else None) for line in lines] or [mapper.item(store, None)]
+    quantities = [random.randint(1, 3) for _ in items]
+    return {'json': order_request(mapper.fixture, user, store, items, quantities, delivery_start())}
+
+def _quote(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    shape = entry.get('j') or {}
+    store = mapper.store(shape.get('store_id'))
+    return {'json': {
+        'store_id': store['id'],
+        'item_id': mapper.item(store, shape.get('item_id'))['id'],
+        'delivery_address': address_of(user),
+    }}
+
+def _window_quotes(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    shape = entry.get('j') or {}
+    return {'json': {
+        'store_id': mapper.store(shape.get('store_id'))['id'],
+        'delivery_address': address_of(user),
+        'windows': delivery_windows(delivery_start(), max(1, _length(shape.get('windows'), 4))),
+        'manifest_value': 40,
+    }}
+
+def _store_ids(mapper: Mapper, shape: Any) -> Optional[List[str]]:
+    if not isinstance(shape, list):
+        return None
+    return [mapper.store(digest if isinstance(digest, str) else None)['id'] for digest in shape]
+
+def _eligibility(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    shape = entry.get('j') or {}
+    body: Dict[str, Any] = {'open_now': shape.get('open_now') is True}
+    if 'addresses' in shape:
+        body['store_id'] = mapper.store(shape.get('store_id'))['id']
+        body['addresses'] = [address_of(mapper.customer(None)) for _ in range(_length(shape['addresses']))]
+    else:
+        body['address'] = address_of(user)
+        body['store_ids'] = _store_ids(mapper, shape.get('store_ids'))
+    return {'json': body}
+
+def _estimates(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    shape = entry.get('j') or {}
+    return {'json': {'address': address_of(user), 'store_ids': _store_ids(mapper, shape.get('store_ids')), 'manifest_value': 40}}
+
+def _webhook(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    payload = payment_event(mapper.order(None))
+    return {'content': payload, 'headers': {
+        'Content-Type': 'application/json',
+        'Stripe-Signature': sign_webhook(payload, WEBHOOK_SECRET),
+    }}
+
+def _login(mapper: Mapper, entry: Dict, store: Dict, user: Dict) -> Dict[str, Any]:
+    return {'json': {'email': user['email'], 'password': 'localmart-bench'}}
+
+BUILDERS: Dict[Tuple[str, str], Builder] = {
+    ('POST', '/api/v0/orders'): _order,
+    ('POST', '/api/v0/delivery/quote'): _quote,
+    ('POST', '/api/v0/delivery/quote/windows'): _window_quotes,
+    ('POST', '/api/v0/delivery/eligibility'): _eligibility,
+    ('POST', '/api/v0/delivery/estimates'): _estimates,
+    ('POST', '/api/v0/webhooks/stripe'): _webhook,
+    ('POST', '/api/v0/auth/login'): _login,
+}
+
+def build_request(mapper: Mapper, entry: Dict) -> Optional[Dict[str, Any]]:
+    """Arguments for Session.call reproducing a recorded request, or None if it can't be rebuilt"""
+    method, route = entry['m'], entry['r']
+    if route == 'unmatched':
+        return None
+    url, store, order = mapper.path(route, entry.get('p') or {})
+    user = mapper.customer(entry.get('u'))
+    if order is not None:
+        # The recorded caller could read the order, so replay it as the order's owner
+        user = next((u for u in mapper.fixture.customers if u['id'] == order['user']), user)
+
+    kwargs: Dict[str, Any] = {}
+    query = {name: value for name, value in (entry.get('q') or {}).items() if name in PLAIN_QUERY_PARAMS}
+    if query:
+        kwargs['params'] = query
+    if entry.get('j') is not None or (method, route) in BUILDERS:
+        builder = BUILDERS.get((method, route))
+        if builder is None:
+            return None
+        kwargs.update(builder(mapper, entry, store, user))
+
+    if (method, route) in ADMIN_ROUTES:
+        kwargs['token'] = mapper.fixture.tokens[mapper.fixture.admin['id']]
+    elif entry.get('a') == 'user':
+        kwargs['token'] = mapper.fixture.tokens[user['id']]
+    return {'route': route, 'method': method, 'url': url, **kwargs}
+
+async def replay(base_url: str, fixture: Fixture, entries: List[Dict], speed: float, max_in_flight: int) -> Dict:
+    recorder = Recorder()
+    mapper = Mapper(fixture)
+    skipped: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        session = Session(client, fixture, recorder)
+        in_flight = asyncio.Semaphore(max_in_flight)
+
+        async def send(call: Dict[str, Any]) -> None:
+            async with in_flight:
+                await session.call(**call)
+
+        first = entries[0]['ts'] if entries else 0
+        started = time.perf_counter()
+        tasks = []
+        for entry in entries:
+            call = build_request(mapper, entry)
+            if call is None:
+                key = f"{entry['m']} {entry['r']}"
+                skipped[key] = skipped.get(key, 0) + 1
+                continue
+            delay = (entry['ts'] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(call)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    result = report(recorder, elapsed)
+    result['skipped'] = skipped
+    return result
+
+def recorded_summary(entries: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Latencies the recording instance saw, for reference next to the replayed ones"""
+    by_route: Dict[str, List[float]] = {}
+    for entry in entries:
+        by_route.setdefault(f"{entry['m']} {entry['r']}", []).append(entry.get('ms', 0))
+    summary = {}
+    for route, values in sorted(by_route.items()):
+        values.sort()
+        summary[route] = {
+            'requests': len(values),
+            'p50_ms': values[len(values) // 2],
+            'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))],
+        }
+    return summary
+
+def run_replay(
+    path: str,
+    speed: float,
+    faults: Dict[str, Dict[str, float]],
+    seed_args: Dict[str, int],
+    workers: int = 1,
+    max_in_flight: int = 256,
+    limit: Optional[int] = None,
+    quiet: bool = True
+) -> Dict:
+    entries = load_log(path, limit)
+    if not entries:
+        raise ValueError(f"{path} holds no requests")
+    with stack(faults, seed_args, workers=workers, quiet=quiet) as urls:
+        fixture = asyncio.run(Fixture.load(urls['pocketbase']))
+        result = asyncio.run(replay(urls['backend'], fixture, entries, speed, max_in_flight))
+
+    return {
+        'kind': 'load',
+        **provenance(),
+        'scenario': 'replay',
+        'log': path,
+        'speed': speed,
+        'recorded_seconds': round(entries[-1]['ts'] - entries[0]['ts'], 2),
+        'workers': workers,
+        'faults': faults,
+        'seed': seed_args,
+        'recorded': recorded_summary(entries),
+        **result,
+    }
@@ -0,0 +1,205 @@
+"""Start the fakes and the backend, drive a scenario against them and summarise the results."""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from .fakes import SERVICES
+from .scenarios import MIXED_WEIGHTS, SCENARIOS, WEBHOOK_SECRET, Fixture, Recorder, Session
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def git_commit() -> Optional[str]:
+    """The commit being measured, marked -dirty when the tree has local changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', 'localmart_backend'], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+def provenance() -> Dict[str, Optional[str]]:
+    """What a result was measured on, for comparing runs"""
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+    }
+
+def _stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+@contextlib.contextmanager
+def stack(faults: Dict[str, Dict[str, float]], seed_args: Dict[str, int], workers: int = 1, quiet: bool = True) -> Iterator[Dict[str, str]]:
+    """Run the fake dependencies and a backend wired to them; yields their base URLs"""
+    ports = {name: free_port() for name in SERVICES}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    output = subprocess.DEVNULL if quiet else None
+
+    fakes = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fakes', '--ports', json.dumps(ports), '--faults', json.dumps(faults)]
+        + [f"--{name}={value}" for name, value in seed_args.items()],
+        cwd=BACKEND_DIR, stdout=output, stderr=output
+    )
+    backend = None
+    with tempfile.TemporaryDirectory(prefix='localmart-bench-') as data_dir:
+        try:
+            wait_for(f"{urls['pocketbase']}/api/health", fakes)
+
+            backend_port = free_port()
+            env = {
+                **os.environ,
+                'POCKETBASE_URL': urls['pocketbase'],
+                'POCKETBASE_ADMIN_EMAIL': 'admin@localmart.test',
+                'POCKETBASE_ADMIN_PASSWORD': 'localmart-bench',
+                'STRIPE_SECRET_KEY': 'sk_test_localmart_bench',
+                'STRIPE_WEBHOOK_SECRET': WEBHOOK_SECRET,
+                'LOCALMART_STRIPE_API_BASE': urls['stripe'],
+                'LOCALMART_UBER_API_BASE': f"{urls['uber']}/v1",
+                'LOCALMART_UBER_AUTH_URL': f"{urls['uber']}/oauth/v2/token",
+                'LOCALMART_UBER_DIRECT_CLIENT_ID': 'bench',
+                'LOCALMART_UBER_DIRECT_CLIENT_SECRET': 'bench',
+                'LOCALMART_UBER_DIRECT_CUSTOMER_ID': 'bench',
+                'LOCALMART_GOOGLE_GEOCODE_URL': f"{urls['google']}/maps/api/geocode/json",
+                'GOOGLE_MAPS_API_KEY': 'bench',
+                'LOCALMART_DATA_DIR': data_dir,
+                # Sampling profiler overhead would skew the numbers
+                'LOCALMART_PROFILE_SAMPLE_RATE': '0',
+                # A handful of seeded users drive all the load; per-user limits would cap the benchmark itself
+                'LOCALMART_RATE_LIMIT_ENABLED': os.environ.get('LOCALMART_RATE_LIMIT_ENABLED', 'false'),
+                'LOCALMART_HOST': '127.0.0.1',
+                'PORT': str(backend_port),
+                'LOCALMART_WORKERS': str(workers),
+            }
+            # The production entry point, so worker, loop and parser choices match deployments
+            backend = subprocess.Popen(
+                [sys.executable, '-m', 'localmart_backend.serve'],
+                cwd=BACKEND_DIR, env=env, stdout=output, stderr=output
+            )
+            urls['backend'] = f"http://127.0.0.1:{backend_port}"
+            wait_for(f"{urls['backend']}/readyz", backend)
+            yield urls
+        finally:
+            if backend is not None:
+                _stop(backend)
+            _stop(fakes)
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-fraction * len(sorted_values) // 1)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarise(latencies: List[float], statuses: Dict[str, int], duration: float) -> Dict:
+    values = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'rps': round(len(values) / duration, 2),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+def report(recorder: Recorder, elapsed: float) -> Dict:
+    """Per-route and overall summaries of everything a recorder saw"""
+    routes = {
+        route: summarise(recorder.latencies[route], recorder.statuses[route], elapsed)
+        for route in sorted(recorder.latencies)
+    }
+    everything = [value for values in recorder.latencies.values() for value in values]
+    totals: Dict[str, int] = {}
+    for statuses in recorder.statuses.values():
+        for status, count in statuses.items():
+            totals[status] = totals.get(status, 0) + count
+    return {'elapsed_seconds': round(elapsed, 2), 'routes': routes, 'total': summarise(everything, totals, elapsed)}
+
+async def drive(base_url: str, fixture: Fixture, scenario: str, duration: float, concurrency: int) -> Dict:
+    """Run virtual users against the backend for a fixed time"""
+    recorder = Recorder()
+    if scenario == 'mixed':
+        names, weights = zip(*MIXED_WEIGHTS.items())
+    else:
+        names, weights = (scenario,), (1,)
+
+    limits = httpx.Limits(max_connections=concurrency * 4, max_keepalive_connections=concurrency * 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        session = Session(client, fixture, recorder)
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def virtual_user() -> None:
+            while time.perf_counter() < deadline:
+                await SCENARIOS[random.choices(names, weights)[0]](session)
+
+        await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return report(recorder, elapsed)
+
+def run_load(
+    scenario: str,
+    duration: float,
+    concurrency: int,
+    faults: Dict[str, Dict[str, float]],
+    seed_args: Dict[str, int],
+    workers: int = 1,
+    warmup: float = 2,
+    quiet: bool = True
+) -> Dict:
+    with stack(faults, seed_args, workers=workers, quiet=quiet) as urls:
+        fixture = asyncio.run(Fixture.load(urls['pocketbase']))
+        if warmup:
+            # Fill caches and connection pools before measuring
+            asyncio.run(drive(urls['backend'], fixture, scenario, warmup, concurrency))
+        result = asyncio.run(drive(urls['backend'], fixture, scenario, duration, concurrency))
+
+    return {
+        'kind': 'load',
+        **provenance(),
+        'scenario': scenario,
+        'duration_seconds': duration,
+        'concurrency': concurrency,
+        'workers': workers,
+        'faults': faults,
+        'seed': seed_args,
+        **result,
+    }
@@ -0,0 +1,245 @@
+"""
+Scripted user journeys driven against a running backend
+
+Each scenario is one iteration of a virtual user's loop. Requests are
+recorded under their route template so results group the way the
+backend's own http metrics do.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from localmart_backend.config import Config
+from localmart_backend.pricing import CENT, tax_rate_for_zip, to_money
+
+from .fake_pocketbase import make_token
+
+# Webhook signing secret the runner gives the backend it starts
+WEBHOOK_SECRET = 'whsec_localmart_bench'
+
+class Fixture:
+    """Seeded records the scenarios pick from, read back from the fake PocketBase"""
+
+    def __init__(self, stores: List[Dict], items: Dict[str, List[Dict]], users: List[Dict],
+                 payment_methods: Dict[str, str], orders: List[Dict]):
+        self.stores = stores
+        self.items = items
+        self.admin = next(user for user in users if 'admin' in (user.get('roles') or []))
+        self.customers = [user for user in users if user is not self.admin]
+        self.payment_methods = payment_methods
+        self.orders = orders
+        self.tokens = {user['id']: make_token(user['id']) for user in users}
+
+    @classmethod
+    async def load(cls, pocketbase_url: str) -> 'Fixture':
+        async with httpx.AsyncClient(base_url=pocketbase_url, timeout=30) as client:
+            async def every(collection: str, **params) -> List[Dict]:
+                response = await client.get(f'/api/collections/{collection}/records', params={'perPage': 100000, **params})
+                response.raise_for_status()
+                return response.json()['items']
+
+            stores = await every('stores')
+            items: Dict[str, List[Dict]] = {}
+            for item in await every('store_items'):
+                items.setdefault(item['store'], []).append(item)
+            users = await every('users')
+            payment_methods = {pm['user']: pm['id'] for pm in await every('payment_methods')}
+            orders = await every('orders')
+        return cls(stores, items, users, payment_methods, orders)
+
+class Recorder:
+    """Latencies and statuses of every request, grouped by route"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, status: str, seconds: float) -> None:
+        self.latencies.setdefault(route, []).append(seconds)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+
+class Session:
+    """One virtual user's view of the backend"""
+
+    def __init__(self, client: httpx.AsyncClient, fixture: Fixture, recorder: Recorder):
+        self.client = client
+        self.fixture = fixture
+        self.recorder = recorder
+
+    async def call(self, route: str, method: str, url: str, token: Optional[str] = None, **kwargs) -> Optional[httpx.Response]:
+        if token:
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'Authorization': f'Bearer {token}'}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(f'{method} {route}', type(e).__name__, time.perf_counter() - started)
+            return None
+        self.recorder.record(f'{method} {route}', str(response.status_code), time.perf_counter() - started)
+        return response
+
+def address_of(user: Dict) -> Dict[str, Any]:
+    return {
+        'street_address': [user.get('street_1', '')],
+        'city': user.get('city', 'Astoria'),
+        'state': user.get('state', 'NY'),
+        'zip_code': user.get('zip', '11103'),
+        'country': 'US',
+        'latitude': user['latitude'],
+        'longitude': user['longitude'],
+    }
+
+def cart_totals(items: List[Dict], quantities: List[int], zip_code: str) -> Dict[str, float]:
+    """The totals the frontend would send, computed the way the backend prices carts"""
+    subtotal = sum((to_money(item['price']) * quantity for item, quantity in zip(items, quantities)), Decimal('0.00'))
+    tax = (subtotal * tax_rate_for_zip(zip_code)).quantize(CENT)
+    delivery_fee = to_money(Config.DELIVERY_FEE)
+    return {
+        'subtotal_amount': float(subtotal),
+        'tax_amount': float(tax),
+        'delivery_fee': float(delivery_fee),
+        'total_amount': float(subtotal + tax + delivery_fee),
+    }
+
+def delivery_start() -> datetime.datetime:
+    """The start of a random delivery window tomorrow"""
+    return (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)).replace(
+        hour=random.randint(14, 23), minute=0, second=0, microsecond=0
+    )
+
+def delivery_windows(end: datetime.datetime, count: int) -> List[Dict[str, str]]:
+    """Consecutive one-hour windows ending at `end`"""
+    return [
+        {'start': (end - datetime.timedelta(hours=h + 1)).isoformat(), 'end': (end - datetime.timedelta(hours=h)).isoformat()}
+        for h in reversed(range(count))
+    ]
+
+def order_request(fixture: Fixture, user: Dict, store: Dict, items: List[Dict], quantities: List[int], start: datetime.datetime) -> Dict[str, Any]:
+    """A checkout body with the totals the frontend would compute"""
+    address = address_of(user)
+    return {
+        'token': fixture.tokens[user['id']],
+        'user_id': user['id'],
+        'store_id': store['id'],
+        'payment_method_id': fixture.payment_methods[user['id']],
+        'delivery_address': address,
+        'items': [
+            {'store_item_id': item['id'], 'quantity': quantity, 'price': item['price']}
+            for item, quantity in zip(items, quantities)
+        ],
+        'scheduled_delivery_start': start.isoformat(),
+        'scheduled_delivery_end': (start + datetime.timedelta(hours=1)).isoformat(),
+        **cart_totals(items, quantities, address['zip_code']),
+    }
+
+async def browse(session: Session) -> None:
+    """Anonymous shopper: store list, a store page, its items and delivery checks"""
+    fixture = session.fixture
+    store = random.choice(fixture.stores)
+    user = random.choice(fixture.customers)
+    await session.call('/api/v0/stores', 'GET', '/api/v0/stores')
+    await session.call('/api/v0/stores/{store_id}', 'GET', f"/api/v0/stores/{store['id']}")
+    await session.call('/api/v0/stores/{store_id}/items', 'GET', f"/api/v0/stores/{store['id']}/items")
+    await session.call('/api/v0/delivery/eligibility', 'POST', '/api/v0/delivery/eligibility', json={
+        'address': address_of(user), 'open_now': True
+    })
+    await session.call('/api/v0/delivery/estimates', 'POST', '/api/v0/delivery/estimates', json={
+        'address': address_of(user), 'manifest_value': 40
+    })
+
+async def checkout(session: Session) -> None:
+    """Signed-in customer: quote, delivery windows and order creation"""
+    fixture = session.fixture
+    store = random.choice(fixture.stores)
+    user = random.choice(fixture.customers)
+    token = fixture.tokens[user['id']]
+    items = random.sample(fixture.items[store['id']], k=random.randint(1, 4))
+    quantities = [random.randint(1, 3) for _ in items]
+    address = address_of(user)
+
+    await session.call('/api/v0/stores/{store_id}/items', 'GET', f"/api/v0/stores/{store['id']}/items")
+    await session.call('/api/v0/delivery/quote', 'POST', '/api/v0/delivery/quote', json={
+        'store_id': store['id'], 'item_id': items[0]['id'], 'delivery_address': address
+    })
+
+    start = delivery_start()
+    if random.random() < 0.3:
+        await session.call('/api/v0/delivery/quote/windows', 'POST', '/api/v0/delivery/quote/windows', json={
+            'store_id': store['id'], 'delivery_address': address, 'windows': delivery_windows(start, 4), 'manifest_value': 40
+        })
+
+    await session.call('/api/v0/orders', 'POST', '/api/v0/orders', json=order_request(fixture, user, store, items, quantities, start))
+    await session.call('/api/v0/user/orders', 'GET', '/api/v0/user/orders', token=token)
+
+async def dashboard(session: Session) -> None:
+    """Store admin polling orders, stats and one order's timeline"""
+    fixture = session.fixture
+    token = fixture.tokens[fixture.admin['id']]
+    store = random.choice(fixture.stores)
+    order = random.choice(fixture.orders)
+    await session.call('/api/v0/stores/{store_id}/orders', 'GET', f"/api/v0/stores/{store['id']}/orders", token=token)
+    await session.call('/api/v0/stores/{store_id}/stats', 'GET', f"/api/v0/stores/{store['id']}/stats", token=token)
+    await session.call('/api/v0/orders/{order_id}', 'GET', f"/api/v0/orders/{order['id']}", token=token)
+    await session.call('/api/v0/orders/{order_id}/timeline', 'GET', f"/api/v0/orders/{order['id']}/timeline", token=token)
+
+def sign_webhook(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """A Stripe-Signature header for a payload"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def payment_event(order: Dict) -> bytes:
+    """A Stripe payment_intent event for a seeded order, as Stripe would send it"""
+    event_type = random.choice(['payment_intent.succeeded', 'payment_intent.succeeded', 'payment_intent.payment_failed'])
+    return json.dumps({
+        'id': f"evt_{uuid.uuid4().hex[:24]}",
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {'object': {
+            'id': order['stripe_payment_intent_id'],
+            'object': 'payment_intent',
+            'status': 'succeeded' if event_type.endswith('succeeded') else 'requires_payment_method',
+        }},
+    }).encode()
+
+async def webhook_storm(session: Session, burst: int = 20, duplicate_rate: float = 0.1) -> None:
+    """A burst of concurrent payment events, some of them redelivered"""
+    fixture = session.fixture
+    events = []
+    for _ in range(burst):
+        if events and random.random() < duplicate_rate:
+            events.append(random.choice(events))
+        else:
+            events.append(payment_event(random.choice(fixture.orders)))
+
+    await asyncio.gather(*(
+        session.call('/api/v0/webhooks/stripe', 'POST', '/api/v0/webhooks/stripe', content=payload, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_webhook(payload, WEBHOOK_SECRET),
+        })
+        for payload in events
+    ))
+
+Scenario = Callable[[Session], Awaitable[None]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    'browse': browse,
+    'checkout': checkout,
+    'dashboard': dashboard,
+    'webhooks': webhook_storm,
+}
+
+# Share of iterations per scenario in the mixed workload
+MIXED_WEIGHTS = {'browse': 60, 'checkout': 10, 'dashboard': 20, 'webhooks': 10}
@@ -0,0 +1,125 @@
+"""Synthetic stores, items, users and orders for the fake PocketBase."""
+
+import datetime
+import random
+from typing import Dict
+
+from .fake_pocketbase import FakePocketBase
+
+# Stores and customers are scattered around Astoria, inside each other's delivery radius
+CENTER = (40.7644, -73.9235)
+STREETS = ['Steinway St', '30th Ave', 'Broadway', 'Ditmars Blvd', '31st St', '36th Ave', 'Astoria Blvd']
+PRODUCTS = ['Milk', 'Eggs', 'Bread', 'Coffee', 'Apples', 'Rice', 'Olive Oil', 'Feta', 'Yogurt', 'Pasta', 'Tomatoes', 'Honey']
+HOURS = {day: '07:00-23:00' for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')}
+
+# Password for every seeded user; the fake accepts any password anyway
+PASSWORD = 'localmart-bench'
+
+def _near_center(spread: float = 0.015) -> Dict[str, str]:
+    # PocketBase stores coordinates as text
+    return {
+        'latitude': f"{CENTER[0] + random.uniform(-spread, spread):.6f}",
+        'longitude': f"{CENTER[1] + random.uniform(-spread, spread):.6f}",
+    }
+
+def _timestamp(moment: datetime.datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+def seed(db: FakePocketBase, stores: int = 20, items_per_store: int = 200, users: int = 100, orders: int = 500) -> None:
+    store_ids, items_by_store = [], {}
+    for index in range(stores):
+        store = db.insert('stores', {
+            'name': f"Bench Market {index + 1}",
+            'street_1': f"{random.randint(10, 99)}-{random.randint(10, 99)} {random.choice(STREETS)}",
+            'city': 'Astoria',
+            'state': 'NY',
+            'zip': '11103',
+            'phone': '718-555-0100',
+            'email': f"store{index + 1}@localmart.test",
+            'hours': HOURS,
+            'delivery_radius_km': 5,
+            # Checkout load shouldn't be limited by delivery window capacity
+            'delivery_slot_capacity': 1000000,
+            **_near_center(),
+        })
+        store_ids.append(store['id'])
+        items_by_store[store['id']] = [
+            db.insert('store_items', {
+                'store': store['id'],
+                'name': f"{random.choice(PRODUCTS)} #{item}",
+                'description': 'Seeded for load tests',
+                'sku': f"SKU-{index:03d}-{item:05d}",
+                'price': round(random.uniform(0.99, 29.99), 2),
+            })
+            for item in range(items_per_store)
+        ]
+
+    user_records = []
+    for index in range(users + 1):
+        is_admin = index == 0
+        user = db.insert('users', {
+            'email': 'admin@localmart.test' if is_admin else f"user{index}@localmart.test",
+            'first_name': 'Admin' if is_admin else 'Bench',
+            'last_name': 'User' if is_admin else str(index),
+            'roles': ['admin'] if is_admin else [],
+            'phone_number': '718-555-0199',
+            'street_1': f"{random.randint(10, 99)}-{random.randint(10, 99)} {random.choice(STREETS)}",
+            'city': 'Astoria',
+            'state': 'NY',
+            'zip': '11103',
+            **_near_center(),
+        })
+        db.insert('payment_methods', {
+            'user': user['id'],
+            'stripe_payment_method_id': f"pm_bench{index:08d}",
+            'last4': '4242',
+            'brand': 'visa',
+            'exp_month': 12,
+            'exp_year': 2030,
+            'is_default': True,
+        })
+        db.insert('stripe_customers', {'user': user['id'], 'stripe_customer_id': f"cus_bench{index:08d}"})
+        user_records.append(user)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for index in range(orders):
+        user = random.choice(user_records[1:] or user_records)
+        store_id = random.choice(store_ids)
+        lines = random.sample(items_by_store[store_id], k=min(len(items_by_store[store_id]), random.randint(1, 5)))
+        created = now - datetime.timedelta(minutes=random.randint(1, 30 * 24 * 60))
+        subtotal = 0.0
+        quantities = [random.randint(1, 3) for _ in lines]
+        for item, quantity in zip(lines, quantities):
+            subtotal += item['price'] * quantity
+        tax = round(subtotal * 0.08875, 2)
+        order = db.insert('orders', {
+            'user': user['id'],
+            'store': store_id,
+            'status': random.choice(['pending', 'confirmed', 'delivered', 'delivered', 'delivered']),
+            'payment_status': 'succeeded',
+            'stripe_payment_intent_id': f"pi_bench{index:016d}",
+            'subtotal_amount': round(subtotal, 2),
+            'tax_amount': tax,
+            'delivery_fee': 5.99,
+            'total_amount': round(subtotal + tax + 5.99, 2),
+            'delivery_address': {
+                'street_address': [user['street_1']],
+                'city': 'Astoria',
+                'state': 'NY',
+                'zip_code': '11103',
+                'country': 'US',
+                'latitude': user['latitude'],
+                'longitude': user['longitude'],
+            },
+            'uber_delivery_id': '',
+            'created': _timestamp(created),
+            'updated': _timestamp(created),
+        })
+        for item, quantity in zip(lines, quantities):
+            db.insert('order_items', {
+                'order': order['id'],
+                'store_item': item['id'],
+                'quantity': quantity,
+                'price_at_time': item['price'],
+                'total_price': round(item['price'] * quantity, 2),
+            })
@@ -0,0 +1,59 @@
+"""Microbenchmarks for api/serializers.py on realistic PocketBase records."""
+
+import random
+import timeit
+from typing import Dict, List
+
+from pocketbase.models.record import Record
+
+from localmart_backend.api import serializers
+
+from .fake_pocketbase import FakePocketBase
+from .runner import provenance
+from .seed import seed
+
+ORDER_EXPAND = 'order_items_via_order.store_item.store'
+
+def _records() -> Dict[str, List[Record]]:
+    random.seed(1)
+    db = FakePocketBase()
+    seed(db, stores=5, items_per_store=50, users=20, orders=200)
+    orders = [db._expand(order, ORDER_EXPAND) for order in db.records('orders')]
+    return {
+        'store': [Record(store) for store in db.records('stores')],
+        'store_item': [Record(item) for item in db.records('store_items')],
+        'order': [Record(order) for order in orders],
+        'user': [Record(user) for user in db.records('users')],
+        'payment_method': [Record(pm) for pm in db.records('payment_methods')],
+    }
+
+# Benchmark name -> (serializer, kind of record it is given)
+CASES = {
+    'serialize_store': (serializers.serialize_store, 'store'),
+    'serialize_store_item': (serializers.serialize_store_item, 'store_item'),
+    'serialize_order': (serializers.serialize_order, 'order'),
+    'serialize_user': (serializers.serialize_user, 'user'),
+    'serialize_user_profile': (serializers.serialize_user_profile, 'user'),
+    'serialize_payment_method': (serializers.serialize_payment_method, 'payment_method'),
+}
+
+def run_serializers(min_time: float = 0.5, repeat: int = 5) -> Dict:
+    """Per-record cost of each serializer, best of several timed runs"""
+    records = _records()
+    results = {}
+    for name, (function, kind) in CASES.items():
+        rows = records[kind]
+        timer = timeit.Timer(lambda: [function(row) for row in rows])
+        loops, elapsed = timer.autorange()
+        loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+        per_record = min(timer.repeat(repeat=repeat, number=loops)) / loops / len(rows)
+        results[name] = {
+            'records': len(rows),
+            'us_per_record': round(per_record * 1e6, 3),
+            'records_per_second': round(1 / per_record),
+        }
+    return {
+        'kind': 'serializers',
+        **provenance(),
+        'benchmarks': results,
+    }
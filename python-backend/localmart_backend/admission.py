@@ -0,0 +1,197 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import FrozenSet, List, Optional, Pattern, Tuple
+from fastapi.responses import JSONResponse
+from . import metrics
+from .config import Config
+from .profiling import loop_monitor
+from .traffic_recording import token_subject
+
+admission_rejections = metrics.registry.register(metrics.Counter(
+    'localmart_admission_rejections_total',
+    'Requests turned away before reaching a handler, by route class and reason',
+    ('route_class', 'reason')
+))
+requests_in_flight = metrics.registry.register(metrics.Gauge(
+    'localmart_requests_in_flight',
+    'API requests currently being handled by this worker'
+))
+
+# (requests per minute, burst)
+Limit = Tuple[float, float]
+
+class RouteClass:
+    """A group of routes sharing rate limits and a shedding priority"""
+
+    def __init__(
+        self,
+        name: str,
+        methods: FrozenSet[str],
+        pattern: str,
+        per_user: Optional[Limit],
+        per_ip: Optional[Limit],
+        sheddable: bool
+    ):
+        self.name = name
+        self.methods = methods
+        self.pattern: Pattern = re.compile(pattern)
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.sheddable = sheddable
+
+    def matches(self, method: str, path: str) -> bool:
+        return (not self.methods or method in self.methods) and self.pattern.fullmatch(path) is not None
+
+ANY: FrozenSet[str] = frozenset()
+
+# First match wins. Webhooks come from Stripe's few IPs and are never limited
+# or shed; checkout and payment methods are limited per user but never shed. Quotes fan out to
+# Uber and order history runs deep expanded queries, so both are limited
+# tightly and are the first to go under load. Payment reconciliation pages
+# through Stripe for a whole date range; it is an admin job that can wait,
+# so it gets a handful of calls a minute and is shed like the others.
+ROUTE_CLASSES: List[RouteClass] = [
+    RouteClass('webhooks', frozenset({'POST'}), r'/api/v0/webhooks/.+', None, None, False),
+    RouteClass('checkout', frozenset({'POST'}), r'/api/v0/orders', (20, 10), (60, 20), False),
+    RouteClass('reconcile', frozenset({'POST'}), r'/api/v0/payment/reconcile', (2, 2), (6, 3), True),
+    RouteClass('payment', ANY, r'/api/v0/payment/.+', (30, 10), (90, 30), False),
+    RouteClass('auth', frozenset({'POST'}), r'/(login|signup)', None, (20, 10), False),
+    RouteClass('quotes', frozenset({'POST'}), r'/api/v0/delivery/quote(/windows)?', (30, 10), (120, 30), True),
+    RouteClass(
+        'order_history', frozenset({'GET'}),
+        r'/api/v0/(user/orders|orders|orders/export|stores/[^/]+/(orders|stats))',
+        (60, 20), (240, 60), True
+    ),
+    RouteClass('api', ANY, r'/api/.+', (600, 100), (1200, 200), False),
+]
+
+def route_class(method: str, path: str) -> Optional[RouteClass]:
+    """The class a request belongs to, or None for paths outside the API (health checks, metrics)"""
+    for candidate in ROUTE_CLASSES:
+        if candidate.matches(method, path):
+            return candidate
+    return None
+
+class RateLimiter:
+    """
+    Token buckets keyed by route class and caller
+
+    Each bucket refills at its limit's rate up to its burst. Buckets live in
+    this worker's memory, so limits apply per worker process; the least
+    recently used are dropped past maxsize, which only ever resets a caller
+    to a full bucket. Only touched from the event loop, so there is no lock.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: 'OrderedDict[Tuple[str, str], Tuple[float, float]]' = OrderedDict()
+
+    def take(self, key: Tuple[str, str], limit: Limit) -> float:
+        """Take a token; returns 0 if one was available, otherwise seconds until there will be one"""
+        per_minute, burst = limit
+        rate = per_minute / 60
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+class AdmissionController:
+    """
+    Rate limits callers and sheds low-priority work when the worker is overloaded
+
+    Per-user buckets key on the user id in the bearer token, read without
+    verifying it (the handler still does), so a forged id only moves the
+    caller onto a fresh user bucket; the per-IP bucket applies regardless.
+    Sheddable routes get a 503 while this worker has more than max_in_flight
+    requests open, or while its event loop has stayed more than max_loop_lag
+    behind for the whole of the last lag_window seconds, so capacity is left
+    for browsing, checkout and webhooks. Handlers make blocking PocketBase
+    calls on the loop, so single lag samples spike under ordinary traffic;
+    only lag that persists means the worker is overloaded.
+    """
+
+    def __init__(
+        self,
+        rate_limits: bool = Config.RATE_LIMIT_ENABLED,
+        max_in_flight: int = Config.SHED_MAX_IN_FLIGHT,
+        max_loop_lag: float = Config.SHED_MAX_LOOP_LAG_SECONDS,
+        lag_window: float = Config.SHED_LAG_WINDOW_SECONDS
+    ):
+        self.rate_limits = rate_limits
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag = max_loop_lag
+        self.lag_window = lag_window
+        self.limiter = RateLimiter()
+        self.in_flight = 0
+
+    def overloaded(self) -> bool:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return True
+        return bool(self.max_loop_lag) and loop_monitor.sustained_lag(self.lag_window) >= self.max_loop_lag
+
+    def rate_limit_wait(self, request, klass: RouteClass) -> float:
+        """Seconds the caller must wait before this request would be allowed, or 0"""
+        if klass.per_user:
+            user = token_subject(request.headers.get('authorization'))
+            if user:
+                wait = self.limiter.take((klass.name, f'user:{user}'), klass.per_user)
+                # Refused already: don't spend a token from the IP's bucket too,
+                # or one noisy user would use up the limit of everyone behind their IP
+                if wait:
+                    return wait
+        if klass.per_ip and request.client is not None:
+            return self.limiter.take((klass.name, f'ip:{request.client.host}'), klass.per_ip)
+        return 0.0
+
+    def _enter(self) -> None:
+        self.in_flight += 1
+        requests_in_flight.set(value=self.in_flight)
+
+    def _exit(self) -> None:
+        self.in_flight -= 1
+        requests_in_flight.set(value=self.in_flight)
+
+    async def admit(self, request, call_next):
+        klass = route_class(request.method, request.url.path)
+        if klass is None:
+            return await call_next(request)
+
+        if klass.sheddable and self.overloaded():
+            admission_rejections.inc(klass.name, 'shed')
+            return JSONResponse(
+                {'detail': "The server is busy, please try again shortly"},
+                status_code=503,
+                headers={'Retry-After': '1'}
+            )
+
+        if self.rate_limits:
+            wait = self.rate_limit_wait(request, klass)
+            if wait:
+                admission_rejections.inc(klass.name, 'rate_limited')
+                return JSONResponse(
+                    {'detail': "Too many requests, please slow down"},
+                    status_code=429,
+                    headers={'Retry-After': str(math.ceil(wait))}
+                )
+
+        self._enter()
+        try:
+            return await call_next(request)
+        finally:
+            self._exit()
+
+admission_controller = AdmissionController()
+
+async def admission_middleware(request, call_next):
+    """Rate limit and shed API requests before any handler work starts"""
+    return await admission_controller.admit(request, call_next)
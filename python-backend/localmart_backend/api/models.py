@@ -1,6 +1,7 @@
 """Pydantic models for the API routes."""
 
-from typing import Dict, Optional
+import datetime
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 class UserLogin(BaseModel):
@@ -19,7 +20,51 @@ class DeliveryQuoteRequest(BaseModel):
     item_id: str
     delivery_address: Dict
 
+class DeliveryWindow(BaseModel):
+    start: datetime.datetime
+    end: datetime.datetime
+
+class DeliveryWindowQuoteRequest(BaseModel):
+    """Quotes for one store and dropoff across several candidate delivery windows."""
+    store_id: str
+    delivery_address: Dict
+    windows: List[DeliveryWindow]
+    manifest_value: float = 0
+
+class DeliveryEligibilityRequest(BaseModel):
+    """Either one address against many stores, or many addresses against one store."""
+    store_id: Optional[str] = None
+    store_ids: Optional[List[str]] = None
+    address: Optional[Dict] = None
+    addresses: Optional[List[Dict]] = None
+    open_now: bool = False
+    open_at: Optional[datetime.datetime] = None
+
+class DeliveryEstimateRequest(BaseModel):
+    """Estimated fee and ETA from every candidate store to one address."""
+    address: Optional[Dict] = None
+    store_ids: Optional[List[str]] = None
+    manifest_value: float = 0
+    at: Optional[datetime.datetime] = None
+
+class CartPriceRequest(BaseModel):
+    """Cart lines to price, with the delivery address that decides the tax rate."""
+    store_id: str
+    items: List[Dict]
+    delivery_address: Optional[Dict] = None
+
 class StoreItem(BaseModel):
     name: str
     price: float
-    description: Optional[str] = None 
\ No newline at end of file
+    description: Optional[str] = None
+    sku: Optional[str] = None
+
+class StoreItemPatch(BaseModel):
+    """Changed fields for one store item; omitted or null fields are left as they are."""
+    name: Optional[str] = None
+    price: Optional[float] = None
+    description: Optional[str] = None
+    sku: Optional[str] = None
+
+class StoreItemDeltaRequest(BaseModel):
+    patches: Dict[str, StoreItemPatch]
@@ -1,16 +1,33 @@
 """Order-related routes for the LocalMart API."""
 
-from fastapi import APIRouter, Request, HTTPException
-from typing import Dict, List, Set
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional, Set
 import datetime
 import logging
+import httpx
 import stripe
+from pocketbase.utils import ClientResponseError
 
 from ..pocketbase import create_client as pb, create_admin_client as pb_admin
-from ..api.models import DeliveryQuoteRequest
+from ..api.models import DeliveryQuoteRequest, DeliveryWindowQuoteRequest, DeliveryEligibilityRequest, DeliveryEstimateRequest, CartPriceRequest
 from ..uber_direct import UberDirectClient
 from ..config import Config
-from ..api.utils import get_token_from_request, decode_jwt
+from ..catalog import catalog
+from ..delivery_zones import coordinates_of, haversine_km, is_eligible, check_stores
+from ..delivery_estimates import quote_log, delivery_estimator
+from ..store_hours import open_filter_time
+from ..webhook_queue import payment_intent_index
+from ..sales_rollups import sales_rollups, store_day
+from ..delivery_slots import slot_book, SlotFullError
+from ..pricing import price_cart, PricingError
+from ..delivery_batching import plan_batches, claim_orders, dispatch_batches, delivery_window_times
+from ..order_cache import order_cache, ORDER_EXPAND
+from ..profiling import phase
+from ..deadlines import iterate_without_deadline, without_deadline
+from ..status_history import status_history
+from ..order_export import EXPORT_FORMATS, export_orders, parquet_available
+from ..api.utils import get_token_from_request, decode_jwt, require_store_admin, get_verified_user
 from ..api.serializers import serialize_order
 
 # Initialize Uber Direct client
@@ -23,16 +40,121 @@ uber_client = UberDirectClient(
     client_secret=UBER_CLIENT_SECRET
 )
 
+# Most windows quoted in one price curve request
+MAX_QUOTE_WINDOWS = 24
+
 # Track active deliveries
 active_deliveries: Set[str] = set()
 
 router = APIRouter(tags=["orders"])
 logger = logging.getLogger(__name__)
 
+def ensure_deliverable(store_id: str, delivery_address: Dict, user=None) -> None:
+    """Reject addresses outside the store's delivery zone before any external call"""
+    point = coordinates_of(delivery_address) or coordinates_of(user)
+    if not is_eligible(catalog.zone(store_id), point):
+        raise HTTPException(
+            status_code=400,
+            detail="This store does not deliver to the selected address"
+        )
+
+def log_quote(store, delivery_address: Dict, quoted_at: datetime.datetime, manifest_cents: int, quote_data: Dict, background_tasks: BackgroundTasks) -> None:
+    """Record a successful quote for calibrating the local estimator"""
+    origin, dropoff = coordinates_of(store), coordinates_of(delivery_address)
+    if not (origin and dropoff) or quote_data.get('fee') is None or quote_data.get('cached'):
+        return
+    eta_minutes = None
+    if quote_data.get('dropoff_eta'):
+        try:
+            eta = datetime.datetime.fromisoformat(quote_data['dropoff_eta'].replace('Z', '+00:00'))
+            eta_minutes = (eta - quoted_at).total_seconds() / 60
+        except ValueError:
+            pass
+    background_tasks.add_task(
+        without_deadline(quote_log.record),
+        haversine_km(*origin, *dropoff),
+        quoted_at,
+        manifest_cents,
+        int(quote_data['fee']),
+        eta_minutes
+    )
+
+def reserve_delivery_slot(store_id: str, start, end) -> Optional[List[int]]:
+    """Hold capacity in a scheduled delivery window, if one was requested"""
+    if not (start and end):
+        return None
+    try:
+        return slot_book.reserve(store_id, start, end)
+    except SlotFullError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid delivery window: {str(e)}")
+
+def resolve_point(address: Optional[Dict], request: Request):
+    """Coordinates of an address, falling back to the signed-in user's geocoded address"""
+    point = coordinates_of(address)
+    if point is None and request.headers.get('authorization'):
+        token = get_token_from_request(request)
+        point = coordinates_of(pb(token).get_user_from_token(token))
+    if point is None:
+        raise HTTPException(status_code=400, detail="Address must include latitude and longitude")
+    return point
+
+@router.post("/api/v0/delivery/eligibility", response_model=Dict)
+async def check_delivery_eligibility(body: DeliveryEligibilityRequest, request: Request):
+    """Check one address against many stores, or many addresses against one store"""
+    if body.addresses is not None:
+        if not body.store_id:
+            raise HTTPException(status_code=400, detail="store_id is required when checking multiple addresses")
+
+        zone = catalog.zone(body.store_id)
+        points = [coordinates_of(address) for address in body.addresses]
+        flags = zone.contains_many(points) if zone else [None] * len(points)
+        return {
+            'store_id': body.store_id,
+            'results': [
+                {'index': index, 'eligible': flag is not False}
+                for index, flag in enumerate(flags)
+            ]
+        }
+
+    point = resolve_point(body.address, request)
+    store_ids = body.store_ids or ([body.store_id] if body.store_id else None)
+    results = check_stores(catalog.zones(store_ids), point)
+
+    when = open_filter_time(body.open_now, body.open_at)
+    if when is not None:
+        results = [r for r in results if catalog.is_open(r['store_id'], when)]
+
+    return {
+        'latitude': point[0],
+        'longitude': point[1],
+        'results': results
+    }
+
+@router.post("/api/v0/delivery/estimates", response_model=Dict)
+async def get_delivery_estimates(body: DeliveryEstimateRequest, request: Request):
+    """Estimated delivery fee and ETA from every candidate store, without calling Uber"""
+    point = resolve_point(body.address, request)
+    when = body.at or datetime.datetime.now(datetime.timezone.utc)
+    estimates = delivery_estimator.estimate_many(
+        catalog.zones(body.store_ids),
+        point,
+        int(round(body.manifest_value * 100)),
+        when
+    )
+    return {
+        'currency': 'usd',
+        'calibration_samples': delivery_estimator.samples,
+        'estimates': estimates
+    }
+
 @router.post("/api/v0/delivery/quote", response_model=Dict)
-async def get_delivery_quote(request: DeliveryQuoteRequest):
+async def get_delivery_quote(request: DeliveryQuoteRequest, background_tasks: BackgroundTasks):
     """Get a delivery quote from Uber Direct"""
     try:
+        ensure_deliverable(request.store_id, request.delivery_address)
+
         # Get store details
         store = pb().get_one('stores', request.store_id)
 
@@ -66,13 +188,17 @@ async def get_delivery_quote(request: DeliveryQuoteRequest):
             dropoff_deadline=dropoff_deadline,
             item_price_cents=item_price_cents
         )
+        log_quote(store, request.delivery_address, now, item_price_cents, quote_data, background_tasks)
 
         return {
             'fee': quote_data['fee'],
             'currency': quote_data['currency'],
-            'estimated_delivery_time': quote_data['dropoff_eta']
+            'estimated_delivery_time': quote_data['dropoff_eta'],
+            'cached': quote_data.get('cached', False)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Delivery quote error: {str(e)}")
         raise HTTPException(
@@ -80,13 +206,133 @@ async def get_delivery_quote(request: DeliveryQuoteRequest):
             detail=f"Failed to get delivery quote: {str(e)}"
         )
 
+@router.post("/api/v0/delivery/quote/windows", response_model=Dict)
+async def get_delivery_window_quotes(request: DeliveryWindowQuoteRequest):
+    """Fee and ETA curve across candidate delivery windows, quoted concurrently"""
+    if not request.windows:
+        raise HTTPException(status_code=400, detail="At least one window is required")
+    if len(request.windows) > MAX_QUOTE_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_WINDOWS} windows can be quoted at once")
+    if any(window.end <= window.start for window in request.windows):
+        raise HTTPException(status_code=400, detail="Each window must end after it starts")
+
+    try:
+        ensure_deliverable(request.store_id, request.delivery_address)
+
+        store = catalog.get_store(request.store_id) or pb().get_one('stores', request.store_id)
+        pickup_address = {
+            'street_address': [store.street_1],
+            'city': store.city,
+            'state': store.state,
+            'zip_code': store.zip,
+            'country': 'US'
+        }
+
+        windows = sorted(request.windows, key=lambda window: window.start)
+        quotes = await uber_client.get_delivery_quotes(
+            pickup_address=pickup_address,
+            dropoff_address=request.delivery_address,
+            windows=[delivery_window_times(window.start, window.end) for window in windows],
+            item_price_cents=int(round(request.manifest_value * 100))
+        )
+
+        curve = []
+        for window, quote in zip(windows, quotes):
+            point = {'start': window.start.isoformat(), 'end': window.end.isoformat()}
+            if isinstance(quote, Exception):
+                logger.warning(f"Delivery quote failed for window {point['start']}: {str(quote)}")
+                point['error'] = 'Quote unavailable'
+            else:
+                point.update({
+                    'fee': quote['fee'],
+                    'currency': quote['currency'],
+                    'estimated_delivery_time': quote['dropoff_eta'],
+                    'cached': quote.get('cached', False)
+                })
+            curve.append(point)
+
+        return {'store_id': request.store_id, 'windows': curve}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Delivery window quote error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get delivery quotes: {str(e)}"
+        )
+
+@router.get("/api/v0/stores/{store_id}/delivery-slots", response_model=Dict)
+async def get_delivery_slots(
+    store_id: str,
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to"),
+    only_open: bool = False
+):
+    """Booked and remaining scheduled delivery capacity for a store over a time range"""
+    start = start or datetime.datetime.now(datetime.timezone.utc)
+    end = end or start + datetime.timedelta(days=2)
+    if end - start > datetime.timedelta(days=14):
+        raise HTTPException(status_code=400, detail="Range must not exceed 14 days")
+
+    try:
+        slots = slot_book.availability(store_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching delivery slots: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch delivery slots: {str(e)}"
+        )
+
+    if only_open:
+        slots = [slot for slot in slots if slot['available'] > 0]
+    return {'store_id': store_id, 'slots': slots}
+
+@router.post("/api/v0/orders/price", response_model=Dict)
+async def price_order(request: CartPriceRequest):
+    """
+    Price a cart the way checkout will
+
+    Clients should show and submit these amounts rather than computing their
+    own, since tax depends on the delivery ZIP.
+    """
+    try:
+        return price_cart(request.store_id, request.items, request.delivery_address).summary()
+    except PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error pricing cart: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to price cart: {str(e)}"
+        )
+
 @router.post("/api/v0/orders", response_model=Dict)
-async def create_order(request: Dict, req: Request):
+async def create_order(request: Dict, req: Request, background_tasks: BackgroundTasks):
     """Create a new order with basic status tracking"""
     token = request.get('token')
     user = pb(token).get_user_from_token(token)
+    slot_buckets = None
 
     try:
+        ensure_deliverable(request['store_id'], request['delivery_address'], user)
+
+        # Price the cart from stored prices; never trust the amounts sent by the client
+        try:
+            cart = price_cart(request['store_id'], request.get('items') or [], request['delivery_address'])
+            cart.check_client_totals(request)
+        except PricingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Hold the delivery window before charging the card
+        slot_buckets = reserve_delivery_slot(
+            request['store_id'],
+            request.get('scheduled_delivery_start'),
+            request.get('scheduled_delivery_end')
+        )
+
         # Get the payment method within the user's auth context
         payment_method = pb(token).get_one('payment_methods', request['payment_method_id'])
         if not payment_method:
@@ -104,7 +350,7 @@ async def create_order(request: Dict, req: Request):
 
         # Create a payment intent
         payment_intent = stripe.PaymentIntent.create(
-            amount=int(request['total_amount'] * 100),  # Convert to cents
+            amount=cart.total_cents,
             currency='usd',
             customer=stripe_customer_id,
             payment_method=payment_method.stripe_payment_method_id,
@@ -120,10 +366,10 @@ async def create_order(request: Dict, req: Request):
             'payment_status': 'pending',  # Initial payment status
             'payment_method': payment_method.id,  # Link to payment method
             'stripe_payment_intent_id': payment_intent.id,
-            'subtotal_amount': request['subtotal_amount'],
-            'tax_amount': request['tax_amount'],
-            'delivery_fee': request['delivery_fee'],
-            'total_amount': request['total_amount'],
+            'subtotal_amount': float(cart.subtotal),
+            'tax_amount': float(cart.tax),
+            'delivery_fee': float(cart.delivery_fee),
+            'total_amount': float(cart.total),
             'delivery_address': {
                 **request['delivery_address'],
                 'customer_name': f"{user.first_name} {user.last_name}".strip(),
@@ -142,17 +388,37 @@ async def create_order(request: Dict, req: Request):
             order_data['scheduled_delivery_end'] = request['scheduled_delivery_end']
 
         order = pb(token).create('orders', order_data)
+        payment_intent_index.remember(payment_intent.id, order.id)
+        status_history.record(order.id, 'status', 'pending', source='checkout')
+        status_history.record(order.id, 'payment_status', 'pending', source='checkout')
+
+        # The order now owns its delivery slot
+        if slot_buckets:
+            slot_book.assign(order.id, request['store_id'], slot_buckets)
+            slot_buckets = None
 
         # Create order items
-        for item in request['items']:
+        for line in cart.lines:
             pb(token).create('order_items', {
                 'order': order.id,
-                'store_item': item['store_item_id'],
-                'quantity': item['quantity'],
-                'price_at_time': item['price'],
-                'total_price': item['price'] * item['quantity']
+                'store_item': line['store_item_id'],
+                'quantity': line['quantity'],
+                'price_at_time': float(line['unit_price']),
+                'total_price': float(line['total_price'])
             })
 
+        # Add the order to the store's daily sales rollup after responding
+        background_tasks.add_task(
+            without_deadline(sales_rollups.record_order),
+            order.id,
+            request['store_id'],
+            order.created,
+            order_data['subtotal_amount'],
+            order_data['tax_amount'],
+            order_data['delivery_fee'],
+            [{'store_item': line['store_item_id'], 'quantity': line['quantity']} for line in cart.lines]
+        )
+
         return {
             'order_id': order.id,
             'status': 'pending',
@@ -160,6 +426,8 @@ async def create_order(request: Dict, req: Request):
             'message': 'Order created successfully'
         }
 
+    except HTTPException:
+        raise
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error creating order: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -169,6 +437,10 @@ async def create_order(request: Dict, req: Request):
             status_code=500,
             detail=f"Failed to create order: {str(e)}"
         )
+    finally:
+        # A checkout that failed before creating the order gives its slot back
+        if slot_buckets:
+            slot_book.release(request['store_id'], slot_buckets)
 
 
 @router.get("/api/v0/orders", response_model=List[Dict])
@@ -191,9 +463,8 @@ async def get_all_orders(request: Request):
     )
 
     # Format orders for response
-    formatted_orders = []
-    for order in orders.items:
-        formatted_orders.append(serialize_order(order))
+    with phase('serialize'):
+        formatted_orders = [serialize_order(order) for order in orders.items]
 
     return formatted_orders
 
@@ -215,14 +486,121 @@ async def get_user_orders(request: Request):
     )
 
     # Format orders for response
-    formatted_orders = []
-    for order in orders.items:
-        formatted_orders.append(serialize_order(order))
+    with phase('serialize'):
+        formatted_orders = [serialize_order(order) for order in orders.items]
 
     return formatted_orders
 
+@router.get("/api/v0/orders/export")
+async def export_order_data(
+    request: Request,
+    start: datetime.date = Query(..., alias="from"),
+    end: datetime.date = Query(..., alias="to"),
+    format: str = "csv",
+    gzip: bool = True
+):
+    """
+    Stream every order and line item created between two dates (admin only)
+
+    Days are UTC and both ends are inclusive. CSV has one row per line item,
+    NDJSON one object per order with its items. Parquet needs pyarrow.
+    """
+    token = get_token_from_request(request)
+    user = pb(token).get_user_from_token(token)
+    if not user or 'admin' not in (getattr(user, 'roles', []) or []):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == 'parquet' and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    start_at = datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc)
+    end_at = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time(), datetime.timezone.utc)
+    compressed = gzip and format != 'parquet'
+
+    filename = f"orders-{start.isoformat()}-{end.isoformat()}.{format}" + ('.gz' if compressed else '')
+    media_types = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+    # A sync generator, so Starlette pulls each page from PocketBase in the
+    # threadpool; the body outlives the handler, and with it the request deadline
+    return StreamingResponse(
+        iterate_without_deadline(export_orders(pb_admin(), start_at, end_at, format, gzip=compressed)),
+        media_type='application/gzip' if compressed else media_types[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def load_order_for_user(order_id: str, token: str):
+    """An order with its items, raising 404 unless the caller may see it"""
+    user = get_verified_user(token)
+
+    order = order_cache.get(order_id)
+    if order is None:
+        # Loaded with the caller's token, so PocketBase's access rules apply on a miss
+        try:
+            order = pb(token).get_one('orders', order_id, query_params={"expand": ORDER_EXPAND})
+        except ClientResponseError as e:
+            # Missing, or hidden by the access rules; any other error is PocketBase failing
+            if e.status in (403, 404):
+                raise HTTPException(status_code=404, detail="Order not found")
+            logger.error(f"Error loading order {order_id}: {str(e)}")
+            raise HTTPException(status_code=502, detail="Failed to load order")
+        except (httpx.TransportError, ConnectionError) as e:
+            # Unreachable, timed out, or its circuit is open
+            logger.error(f"Error loading order {order_id}: {str(e)}")
+            raise HTTPException(status_code=503, detail="Orders are temporarily unavailable")
+        order_cache.set(order_id, order)
+
+    # Cache hits are only served to the owner or an admin of the order's store
+    if order.user != user.id and 'admin' not in (getattr(user, 'roles', []) or []):
+        try:
+            require_store_admin(token, order.store)
+        except HTTPException:
+            raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@router.get("/api/v0/orders/{order_id}", response_model=Dict)
+async def get_order(order_id: str, request: Request, include: Optional[str] = None):
+    """Get a single order with its items (owner, store admin or global admin)"""
+    token = get_token_from_request(request)
+
+    try:
+        order = load_order_for_user(order_id, token)
+        with phase('serialize'):
+            result = serialize_order(order)
+        if include and 'timeline' in include.split(','):
+            result['timeline'] = status_history.timeline(order_id)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching order {order_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch order: {str(e)}"
+        )
+
+@router.get("/api/v0/orders/{order_id}/timeline", response_model=Dict)
+async def get_order_timeline(order_id: str, request: Request):
+    """Every status and payment status change of an order, oldest first"""
+    token = get_token_from_request(request)
+
+    try:
+        load_order_for_user(order_id, token)
+        return {'order_id': order_id, 'timeline': status_history.timeline(order_id)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching order timeline {order_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch order timeline: {str(e)}"
+        )
+
 @router.patch("/api/v0/orders/{order_id}/status", response_model=Dict)
-async def update_order_status(order_id: str, request: Request):
+async def update_order_status(order_id: str, request: Request, background_tasks: BackgroundTasks):
     """Update the status of an order"""
     token = get_token_from_request(request)
     
@@ -244,25 +622,43 @@ async def update_order_status(order_id: str, request: Request):
         )
 
     try:
-        data = {
-            'status': status,
-            'updated': datetime.datetime.now(datetime.timezone.utc).isoformat()
-        }
-        
-        # Update the order
-        pb(token).update('orders', order_id, data)
-        
-        # Get the updated order with expanded items
-        updated_order = pb(token).get_one(
+        # Get the order with expanded items, which also gives us the previous status
+        order = pb(token).get_one(
             'orders',
             order_id,
             query_params={
                 "expand": "order_items_via_order.store_item,order_items_via_order.store_item.store"
             }
         )
+        previous_status = order.status
 
-        # Format the order for response using the serializer
-        return serialize_order(updated_order)
+        data = {
+            'status': status,
+            'updated': datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+        
+        # Update the order
+        pb(token).update('orders', order_id, data)
+        order_cache.delete(order_id)
+        status_history.record(order_id, 'status', status, previous_status, source=f"user:{decode_jwt(token).get('id')}")
+
+        # Take cancelled orders out of the store's sales rollup and delivery
+        # slots (and put reinstated ones back)
+        start = getattr(order, 'scheduled_delivery_start', None)
+        end = getattr(order, 'scheduled_delivery_end', None)
+        if status == 'cancelled' and previous_status != 'cancelled':
+            background_tasks.add_task(without_deadline(sales_rollups.record_order_record), order, -1)
+            slot_book.release_order(order_id, order.store, start, end)
+        elif previous_status == 'cancelled' and status != 'cancelled':
+            background_tasks.add_task(without_deadline(sales_rollups.record_order_record), order, 1)
+            if start and end:
+                slot_book.assign(order_id, order.store, slot_book.reserve(order.store, start, end, force=True))
+
+        # Format the order for response using the serializer; records are
+        # never modified in place, since reads may share them
+        result = serialize_order(order)
+        result['status'] = status
+        return result
     except Exception as e:
         logger.error(f"Error updating order status: {str(e)}")
         raise HTTPException(
@@ -308,9 +704,8 @@ async def get_store_orders(store_id: str, request: Request):
         )
 
         # Format orders for response
-        formatted_orders = []
-        for order in orders.items:
-            formatted_orders.append(serialize_order(order))
+        with phase('serialize'):
+            formatted_orders = [serialize_order(order) for order in orders.items]
 
         return formatted_orders
     except HTTPException:
@@ -321,3 +716,103 @@ async def get_store_orders(store_id: str, request: Request):
             status_code=500,
             detail=f"Failed to fetch store orders: {str(e)}"
         )
+
+async def dispatch_in_background(client, batches: List) -> None:
+    """Book the claimed orders' couriers after the dispatch request has been answered"""
+    try:
+        await dispatch_batches(uber_client, client, batches)
+    finally:
+        order_cache.delete(*(order_id for batch in batches for order_id in batch.order_ids))
+
+@router.post("/api/v0/stores/{store_id}/dispatch", response_model=Dict)
+async def dispatch_store_orders(store_id: str, request: Request, background_tasks: BackgroundTasks, dry_run: bool = False):
+    """
+    Dispatch a store's confirmed, undispatched orders to Uber Direct
+
+    Each order gets its own Uber delivery and fee. Orders in the same
+    delivery window with nearby dropoffs are batched onto shared pickup and
+    dropoff times so Uber can pool them onto one courier; a batch does not
+    save Uber calls or fees. Orders are claimed before anything is booked,
+    so a concurrent dispatch skips them, and the deliveries are then booked
+    in the background; each order's uber_delivery_id is set as its delivery
+    is created (requires store admin role). With dry_run, only the planned
+    batches are returned and nothing is claimed.
+    """
+    token = get_token_from_request(request)
+    require_store_admin(token, store_id, detail="You don't have permission to dispatch this store's orders")
+
+    try:
+        client = pb_admin()
+        store = client.get_one('stores', store_id)
+        orders = client.get_full_list(
+            'orders',
+            query_params={
+                "filter": f'store = "{store_id}" && status = "confirmed" && uber_delivery_id = ""',
+                "sort": "scheduled_delivery_start,created",
+                "expand": "order_items_via_order.store_item"
+            }
+        )
+
+        if dry_run:
+            batches = plan_batches(store, orders)
+            return {
+                'store_id': store_id,
+                'orders': len(orders),
+                'batches': len(batches),
+                'planned': [{'order_ids': batch.order_ids} for batch in batches]
+            }
+
+        claimed = claim_orders(client, orders)
+        batches = plan_batches(store, claimed)
+        if batches:
+            background_tasks.add_task(without_deadline(dispatch_in_background), client, batches)
+        return {
+            'store_id': store_id,
+            'orders': len(orders),
+            'claimed': len(claimed),
+            'skipped': [order.id for order in orders if order not in claimed],
+            'batches': len(batches),
+            'dispatching': [{'order_ids': batch.order_ids} for batch in batches]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error dispatching store orders: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to dispatch store orders: {str(e)}"
+        )
+
+@router.get("/api/v0/stores/{store_id}/stats", response_model=Dict)
+async def get_store_stats(
+    store_id: str,
+    request: Request,
+    start: Optional[datetime.date] = Query(None, alias="from"),
+    end: Optional[datetime.date] = Query(None, alias="to")
+):
+    """Sales totals for a store over a day range (requires store admin role)"""
+    token = get_token_from_request(request)
+    require_store_admin(token, store_id, detail="You don't have permission to view this store's stats")
+
+    end_day = end.isoformat() if end else store_day(datetime.datetime.now(datetime.timezone.utc))
+    start_day = start.isoformat() if start else (
+        datetime.date.fromisoformat(end_day) - datetime.timedelta(days=29)
+    ).isoformat()
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    try:
+        stats = sales_rollups.stats(store_id, start_day, end_day)
+    except Exception as e:
+        logger.error(f"Error fetching store stats: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch store stats: {str(e)}"
+        )
+
+    # Attach names to the best sellers from the cached catalog
+    for entry in stats['top_items']:
+        item = catalog.store_item(store_id, entry['store_item'])
+        entry['name'] = getattr(item, 'name', None)
+
+    return {'store_id': store_id, 'from': start_day, 'to': end_day, **stats}
@@ -1,7 +1,9 @@
 """Payment-related routes for the LocalMart API."""
 
-from fastapi import APIRouter, Request, HTTPException, Header
+from fastapi import APIRouter, Request, HTTPException, Header, Query
 from typing import Dict, List
+import asyncio
+import datetime
 import stripe
 import json
 import logging
@@ -10,12 +12,16 @@ from ..pocketbase import create_client as pb, create_admin_client as pb_admin
 from ..api.utils import get_token_from_request
 from ..config import Config
 from ..api.serializers import serialize_payment_method
+from ..webhook_queue import webhook_queue, webhook_worker, PAYMENT_STATUS_BY_EVENT
+from ..reconciliation import reconcile_payments
+from ..deadlines import without_deadline
+from ..stripe_client import configure_stripe
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 
 # Initialize Stripe
-stripe.api_key = Config.STRIPE_SECRET_KEY
+configure_stripe()
 
 # Initialize Stripe webhook secret
 STRIPE_WEBHOOK_SECRET = Config.STRIPE_WEBHOOK_SECRET
@@ -119,10 +125,10 @@ async def save_payment_method(payment_data: dict, request: Request):
         return {"status": "success"}
 
     except stripe.error.StripeError as e:
-        print(f"Stripe error: {str(e)}")
+        logger.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error saving payment method: {str(e)}")
+        logger.error(f"Error saving payment method: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save payment method")
 
 @router.get("/api/v0/payment/cards")
@@ -146,7 +152,7 @@ async def get_payment_methods(request: Request):
         return serialized_cards
 
     except Exception as e:
-        print(f"Error fetching payment methods: {str(e)}")
+        logger.error(f"Error fetching payment methods: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch payment methods")
 
 @router.delete("/api/v0/payment/cards/{card_id}")
@@ -172,10 +178,10 @@ async def delete_payment_method(card_id: str, request: Request):
         return {"status": "success"}
 
     except stripe.error.StripeError as e:
-        print(f"Stripe error: {str(e)}")
+        logger.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error deleting payment method: {str(e)}")
+        logger.error(f"Error deleting payment method: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to delete payment method")
 
 @router.post("/api/v0/webhooks/stripe")
@@ -205,57 +211,46 @@ async def stripe_webhook(request: Request):
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-    # Handle specific event types
-    if event['type'] == 'payment_intent.succeeded':
+    # Queue the events we act on and ack right away; the webhook worker
+    # dedupes them by event id and applies the order updates in batches
+    if event['type'] in PAYMENT_STATUS_BY_EVENT:
         payment_intent = event['data']['object']
-        # Update order payment status to succeeded
-        try:
-            logger.info(f"Processing payment_intent.succeeded for intent {payment_intent['id']}")
-            orders = pb_admin().get_list(
-                'orders',
-                query_params={
-                    "filter": f'stripe_payment_intent_id = "{payment_intent["id"]}"'
-                }
-            )
-            if orders.items:
-                order = orders.items[0]
-
-                print("Updating order payment status to succeeded:")
-                print(order)
-
-                pb_admin().update('orders', order.id, {
-                    'payment_status': 'succeeded'
-                })
-                logger.info(f"Updated order {order.id} payment status to succeeded")
-            else:
-                logger.warning(f"No order found for payment intent {payment_intent['id']}")
-        except Exception as e:
-            logger.error(f"Error updating order payment status: {str(e)}")
-            logger.error("Full payment intent object:")
-            logger.error(json.dumps(payment_intent, indent=2))
-
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        # Update order payment status to failed
-        try:
-            logger.info(f"Processing payment_intent.payment_failed for intent {payment_intent['id']}")
-            orders = pb_admin().get_list(
-                'orders',
-                query_params={
-                    "filter": f'stripe_payment_intent_id = "{payment_intent["id"]}"'
-                }
-            )
-            if orders.items:
-                order = orders.items[0]
-                pb_admin().update('orders', order.id, {
-                    'payment_status': 'failed'
-                })
-                logger.info(f"Updated order {order.id} payment status to failed")
-            else:
-                logger.warning(f"No order found for payment intent {payment_intent['id']}")
-        except Exception as e:
-            logger.error(f"Error updating order payment status: {str(e)}")
-            logger.error("Full payment intent object:")
-            logger.error(json.dumps(payment_intent, indent=2))
-
-    return {"status": "success"}
\ No newline at end of file
+        if webhook_queue.enqueue(event['id'], event['type'], payload.decode('utf-8')):
+            logger.info(f"Queued {event['type']} for intent {payment_intent['id']}")
+            webhook_worker.wake()
+        else:
+            logger.info(f"Ignoring duplicate Stripe event {event['id']}")
+
+    return {"status": "success"}
+
+@router.post("/api/v0/payment/reconcile")
+async def reconcile_payment_statuses(
+    request: Request,
+    start: datetime.date = Query(..., alias="from"),
+    end: datetime.date = Query(..., alias="to"),
+    dry_run: bool = False
+):
+    """Correct order payment statuses that drifted from Stripe, e.g. after a missed webhook (admin only)."""
+    token = get_token_from_request(request)
+    user = pb(token).get_user_from_token(token)
+    if not user or 'admin' not in (getattr(user, 'roles', []) or []):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if end - start > datetime.timedelta(days=92):
+        raise HTTPException(status_code=400, detail="Range must not exceed 92 days")
+
+    try:
+        # A long admin job over up to 92 days of orders; each call keeps its own timeout
+        return await asyncio.to_thread(
+            without_deadline(reconcile_payments),
+            datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc),
+            datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time(), datetime.timezone.utc),
+            dry_run
+        )
+    except stripe.error.StripeError as e:
+        logger.error(f"Stripe error during reconciliation: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Stripe error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error reconciling payments: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile payments: {str(e)}")
@@ -20,7 +20,9 @@ def serialize_store(store) -> Dict:
         "created": getattr(store, "created", ""),
         "updated": getattr(store, "updated", ""),
         "latitude": getattr(store, "latitude", None),
-        "longitude": getattr(store, "longitude", None)
+        "longitude": getattr(store, "longitude", None),
+        "delivery_radius_km": getattr(store, "delivery_radius_km", None),
+        "delivery_zone": getattr(store, "delivery_zone", None)
     }
 
 def serialize_store_item(item) -> Dict:
@@ -30,6 +32,7 @@ def serialize_store_item(item) -> Dict:
         "name": getattr(item, "name", ""),
         "price": getattr(item, "price", 0.0),
         "description": getattr(item, "description", ""),
+        "sku": getattr(item, "sku", ""),
         "created": getattr(item, "created", ""),
         "updated": getattr(item, "updated", "")
     }
@@ -1,13 +1,19 @@
 """Store-related routes for the LocalMart API."""
 
 from fastapi import APIRouter, Request, HTTPException
-from typing import Dict, List
+from typing import Dict, List, Optional
+import asyncio
+import datetime
 
 from ..pocketbase import create_client as pb
-from ..api.models import StoreItem
-from ..api.utils import get_token_from_request, decode_jwt
+from ..api.models import StoreItem, StoreItemDeltaRequest
+from ..api.utils import get_token_from_request, decode_jwt, require_store_admin
 from ..api.serializers import serialize_store, serialize_store_item
 from ..geocoding import GeocodingService
+from ..config import Config
+from ..catalog import catalog
+from ..store_hours import open_filter_time
+from ..item_import import IMPORT_FORMATS, detect_format, iter_rows, StoreItemImporter
 
 # Initialize geocoding service
 geocoding_service = GeocodingService()
@@ -15,8 +21,12 @@ geocoding_service = GeocodingService()
 router = APIRouter(tags=["stores"])
 
 @router.get("/api/v0/stores", response_model=List[Dict])
-async def list_stores(request: Request = None):
-    """List all stores"""
+async def list_stores(
+    request: Request = None,
+    open_now: bool = False,
+    open_at: Optional[datetime.datetime] = None
+):
+    """List all stores, optionally only those open now or at a given time"""
     try:
         # Check if request has authorization header
         is_admin = False
@@ -29,11 +39,15 @@ async def list_stores(request: Request = None):
                 # If token validation fails, continue as non-admin
                 pass
         
-        # Get all records from the stores collection
-        stores = pb().get_list('stores', 1, 50)
+        # Serve the stores from the cached catalog
+        stores = catalog.stores()
+
+        when = open_filter_time(open_now, open_at)
+        if when is not None:
+            stores = [store for store in stores if catalog.is_open(store.id, when)]
 
         # Convert Record objects to simplified dictionaries
-        return [serialize_store(store) for store in stores.items]
+        return [serialize_store(store) for store in stores]
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -44,8 +58,8 @@ async def list_stores(request: Request = None):
 async def get_store(store_id: str):
     """Get a single store by ID"""
     try:
-        # Get the store record
-        store = pb().get_one('stores', store_id)
+        # Off the event loop, so concurrent requests for a featured store share one read
+        store = await asyncio.to_thread(pb().get_one, 'stores', store_id)
         return serialize_store(store)
     except Exception as e:
         raise HTTPException(
@@ -57,17 +71,11 @@ async def get_store(store_id: str):
 async def list_store_items(store_id: str):
     """List all items for a specific store"""
     try:
-        # Get all records from the store_items collection for this store
-        items = pb().get_list(
-            'store_items',
-            1, 50,
-            query_params={
-                "filter": f'store = "{store_id}"'
-            }
-        )
+        # Serve the store's items from the cached catalog; concurrent misses share one load
+        items = await asyncio.to_thread(catalog.store_items, store_id)
 
         # Convert Record objects to simplified dictionaries
-        return [serialize_store_item(item) for item in items.items]
+        return [serialize_store_item(item) for item in items]
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -97,13 +105,51 @@ async def create_store_item(store_id: str, item: StoreItem, request: Request):
             'name': item.name,
             'price': item.price,
             'description': item.description,
+            'sku': item.sku,
             'store': store_id
         })
+        catalog.evict_items(store_id)
 
         return serialize_store_item(new_item)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/api/v0/stores/{store_id}/items/import", response_model=Dict)
+async def import_store_items(store_id: str, request: Request, format: Optional[str] = None):
+    """
+    Bulk create or update store items from a streamed CSV or NDJSON upload
+
+    Rows are validated as they arrive and written in batches, matched to
+    existing items by SKU or name. Returns a per-row report.
+    """
+    token = get_token_from_request(request)
+    require_store_admin(token, store_id)
+
+    fmt = detect_format(format, request.headers.get('content-type'))
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported import format. Must be one of: {', '.join(IMPORT_FORMATS)}"
+        )
+
+    try:
+        importer = StoreItemImporter(pb(token), store_id)
+        importer.load_existing()
+
+        async for row_number, data, error in iter_rows(request.stream(), fmt):
+            if error:
+                importer.reject(row_number, error)
+            else:
+                importer.add_row(row_number, data)
+        importer.flush()
+        catalog.evict_items(store_id)
+
+        return importer.report()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to import store items: {str(e)}")
+
 @router.patch("/api/v0/stores/{store_id}/items/{item_id}", response_model=Dict)
 async def update_store_item(store_id: str, item_id: str, item: StoreItem, request: Request):
     token = get_token_from_request(request)
@@ -133,9 +179,81 @@ async def update_store_item(store_id: str, item_id: str, item: StoreItem, reques
         'price': item.price,
         'description': item.description
     })
+    catalog.evict_items(store_id)
 
     return serialize_store_item(updated_item)
 
+@router.patch("/api/v0/stores/{store_id}/items", response_model=Dict)
+async def update_store_items(store_id: str, body: StoreItemDeltaRequest, request: Request):
+    """
+    Apply changed fields to many items of a store at once
+
+    Ownership of every item is verified up front, and nothing is written if
+    any id does not belong to the store. Fields sent as null are ignored.
+    Writes go out in batches of POCKETBASE_BATCH_SIZE items, each applied
+    all or nothing; if one fails, the error lists the ids already updated.
+    """
+    token = get_token_from_request(request)
+    require_store_admin(token, store_id)
+
+    # Only send the fields each patch actually changes; null never overwrites a value
+    updates = {
+        item_id: patch.model_dump(exclude_unset=True, exclude_none=True)
+        for item_id, patch in body.patches.items()
+    }
+    updates = {item_id: data for item_id, data in updates.items() if data}
+    if not updates:
+        return {'store_id': store_id, 'updated': []}
+
+    try:
+        client = pb(token)
+        item_ids = list(updates)
+
+        # Verify all ids belong to the store, one filtered query per chunk of ids
+        owned = set()
+        for start in range(0, len(item_ids), 100):
+            chunk = item_ids[start:start + 100]
+            id_filter = ' || '.join(f'id = "{item_id}"' for item_id in chunk)
+            records = client.get_full_list(
+                'store_items',
+                query_params={
+                    "filter": f'store = "{store_id}" && ({id_filter})',
+                    "fields": "id"
+                }
+            )
+            owned.update(record.id for record in records)
+
+        missing = [item_id for item_id in item_ids if item_id not in owned]
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Items not found in store: {', '.join(missing)}"
+            )
+
+        # Apply the patches in batched writes
+        applied: List[str] = []
+        try:
+            for start in range(0, len(item_ids), Config.POCKETBASE_BATCH_SIZE):
+                chunk = item_ids[start:start + Config.POCKETBASE_BATCH_SIZE]
+                try:
+                    client.batch_update('store_items', {item_id: updates[item_id] for item_id in chunk})
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail={
+                        'message': f"Failed to update store items: {str(e)}",
+                        'updated': applied,
+                        'not_updated': item_ids[len(applied):]
+                    })
+                applied.extend(chunk)
+        finally:
+            if applied:
+                catalog.evict_items(store_id)
+
+        return {'store_id': store_id, 'updated': item_ids}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to update store items: {str(e)}")
+
 @router.delete("/api/v0/stores/{store_id}/items/{item_id}")
 async def delete_store_item(store_id: str, item_id: str, request: Request):
     try:
@@ -161,6 +279,7 @@ async def delete_store_item(store_id: str, item_id: str, request: Request):
 
         # Delete the item
         pb(token).delete('store_items', item_id)
+        catalog.evict_items(store_id)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -249,6 +368,7 @@ async def geocode_store_address(store_id: str, request: Request):
             'latitude': lat,
             'longitude': lon
         })
+        catalog.invalidate()
         
         return {
             'id': updated_store.id,
@@ -2,7 +2,16 @@
 
 from fastapi import HTTPException, Request
 import base64
+import hashlib
 import json
+import time
+
+from ..cache import TieredCache
+from ..pocketbase import create_client as pb
+
+# Tokens PocketBase has accepted recently (keyed by hash, since the shared
+# tier is on disk), mapped to their user
+_verified_tokens = TieredCache('verified_tokens', 60, maxsize=4096)
 
 def get_token_from_request(request: Request) -> str:
     """Extract and validate the auth token from a request"""
@@ -29,4 +38,43 @@ def decode_jwt(token):
         decoded = base64.b64decode(payload).decode('utf-8')
         return json.loads(decoded)
     except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Failed to decode token: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail=f"Failed to decode token: {str(e)}")
+
+def require_store_admin(token: str, store_id: str, detail: str = "Not authorized to manage store items"):
+    """Return the user for a token, raising 403 unless they are a global or store admin"""
+    user = pb(token).get_user_from_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    if 'admin' not in (getattr(user, 'roles', []) or []):
+        store_roles = pb(token).get_list(
+            'store_roles',
+            1, 1,
+            query_params={
+                "filter": f'user="{user.id}" && store="{store_id}" && role="admin"'
+            }
+        )
+        if not store_roles.items:
+            raise HTTPException(status_code=403, detail=detail)
+    return user
+
+def get_verified_user(token: str):
+    """
+    The user for a token, verified against PocketBase at most once a minute
+
+    Use this on hot read paths instead of get_user_from_token; the cached
+    entry never outlives the token's own expiry.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    user = _verified_tokens.get(key)
+    if user is not None:
+        return user
+
+    user = pb(token).get_user_from_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    expires_in = decode_jwt(token).get('exp', 0) - time.time()
+    if expires_in > 0:
+        _verified_tokens.set(key, user, ttl=min(60, expires_in))
+    return user
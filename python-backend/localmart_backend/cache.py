@@ -0,0 +1,493 @@
+import json
+import logging
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from . import metrics
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+cache_requests = metrics.registry.register(metrics.Counter(
+    'localmart_cache_requests_total',
+    'Cache lookups by the tier that answered them',
+    ('cache', 'result')
+))
+cache_evictions = metrics.registry.register(metrics.Counter(
+    'localmart_cache_evictions_total',
+    'Entries dropped from the in-process tier',
+    ('cache', 'reason')
+))
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the oldest entry when the cache is full"""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.maxsize:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def delete(self, *keys: Hashable) -> None:
+        """Remove the given keys, ignoring any that are not cached"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, calling loader to fill it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+class SharedStore:
+    """
+    Second cache tier shared by every worker process on the machine
+
+    Entries are pickled into SQLite under the data dir. Invalidated tags are
+    appended to a log whose latest sequence number is also kept in an 8-byte
+    memory-mapped file, so each read can tell with one memory access whether
+    any process has invalidated anything since it last looked. The log is
+    pruned after prune_interval; a process that finds it pruned past what it
+    has seen clears its local tier rather than miss an invalidation.
+    """
+
+    def __init__(self, path: str = Config.CACHE_PATH, prune_interval: float = 3600):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counter: Optional[mmap.mmap] = None
+        self._seen: Optional[int] = None
+        self._polled: Tuple[Optional[int], float] = (None, 0.0)
+        self._caches: List['TieredCache'] = []
+        self._last_prune = 0.0
+
+    def register(self, cache: 'TieredCache') -> None:
+        self._caches.append(cache)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    tags TEXT NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, namespace, key)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tag TEXT NOT NULL,
+                    at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def _sequence_map(self) -> mmap.mmap:
+        if self._counter is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path + '.seq', os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < 8:
+                    os.ftruncate(fd, 8)
+                self._counter = mmap.mmap(fd, 8)
+            finally:
+                os.close(fd)
+        return self._counter
+
+    def sequence(self) -> int:
+        """Sequence number of the latest invalidation logged by any process"""
+        return struct.unpack_from('<q', self._sequence_map(), 0)[0]
+
+    def poll(self) -> None:
+        """Drop local entries whose tags were invalidated since the last poll"""
+        current = self.sequence()
+        if current == self._seen:
+            return
+        # The counter is bumped just before its transaction commits (or rolls
+        # back), so it can briefly lead the log; look again at most once a second
+        if current == self._polled[0] and time.monotonic() - self._polled[1] < 1.0:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN')
+            try:
+                committed = conn.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+                ).fetchone()
+                rows = [] if self._seen is None else conn.execute(
+                    'SELECT seq, tag FROM cache_invalidations WHERE seq > ? ORDER BY seq', (self._seen,)
+                ).fetchall()
+            finally:
+                conn.execute('COMMIT')
+            committed_seq = committed[0] if committed else 0
+            # Committed sequence numbers have no holes, so a log that doesn't
+            # continue from the last one seen has been pruned past it (this
+            # process went more than prune_interval without polling)
+            missed = self._seen is not None and committed_seq > self._seen and (
+                not rows or rows[0][0] > self._seen + 1
+            )
+            if self._seen is not None and (committed_seq < self._seen or missed):
+                # The store was recreated underneath us, or invalidations were
+                # lost; nothing local can be trusted, so start over
+                logger.warning('Cache invalidation log is behind this process; clearing local caches')
+                for cache in self._caches:
+                    cache._clear_local('invalidated')
+                rows = []
+            self._seen = committed_seq
+            self._polled = (current, time.monotonic())
+        tags = {row[1] for row in rows}
+        if tags:
+            for cache in self._caches:
+                cache._evict_local(tags)
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float, Tuple[str, ...]]]:
+        """(value, expires_at, tags) of a live entry, or None"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT value, expires_at, tags FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?',
+                (namespace, key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0]), row[1], tuple(json.loads(row[2]))
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        expires_at: float,
+        tags: Tuple[str, ...],
+        since: Optional[int] = None
+    ) -> bool:
+        """
+        Store an entry; returns False without storing it if one of its tags
+        was invalidated after sequence `since` (the value may be stale)
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if since is not None:
+                    stale = conn.execute(
+                        f"SELECT 1 FROM cache_invalidations WHERE seq > ? AND tag IN ({', '.join('?' * len(tags))}) LIMIT 1",
+                        (since, *tags)
+                    ).fetchone()
+                    if stale:
+                        conn.execute('ROLLBACK')
+                        return False
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, tags) VALUES (?, ?, ?, ?, ?)',
+                    (namespace, key, blob, expires_at, json.dumps(tags))
+                )
+                conn.execute('DELETE FROM cache_tags WHERE namespace = ? AND key = ?', (namespace, key))
+                conn.executemany(
+                    'INSERT OR IGNORE INTO cache_tags (tag, namespace, key) VALUES (?, ?, ?)',
+                    [(tag, namespace, key) for tag in tags]
+                )
+                self._prune(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return True
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """Delete every entry carrying one of the tags and tell every process to do the same"""
+        tags = list(tags)
+        if not tags:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for tag in tags:
+                    conn.execute(
+                        'DELETE FROM cache_entries WHERE (namespace, key) IN '
+                        '(SELECT namespace, key FROM cache_tags WHERE tag = ?)',
+                        (tag,)
+                    )
+                    conn.execute('DELETE FROM cache_tags WHERE tag = ?', (tag,))
+                    seq = conn.execute('INSERT INTO cache_invalidations (tag, at) VALUES (?, ?)', (tag, now)).lastrowid
+                # Written inside the transaction, so the counter only ever moves forward
+                struct.pack_into('<q', self._sequence_map(), 0, seq)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Drop expired entries and old log lines, at most once per prune_interval"""
+        now = time.time()
+        if now - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = now
+        conn.execute('DELETE FROM cache_entries WHERE expires_at < ?', (now,))
+        conn.execute(
+            'DELETE FROM cache_tags WHERE (namespace, key) NOT IN (SELECT namespace, key FROM cache_entries)'
+        )
+        conn.execute('DELETE FROM cache_invalidations WHERE at < ?', (now - self.prune_interval,))
+
+shared_store = SharedStore()
+
+class TieredCache:
+    """
+    Bounded in-process LRU in front of the shared store, with TTLs and tags
+
+    Reads try the local tier, then the shared one (promoting what they find
+    there). Writes go to both. delete, clear and invalidate_tags are
+    broadcast through the shared store, so an entry dropped by one worker is
+    gone from every worker before its next read. Values that can't be
+    pickled are only cached locally, and a failing shared tier degrades to
+    local caching.
+
+    With stale_ttl set, expired local entries are kept that much longer so
+    get_or_load can fall back to them when the loader fails. Invalidated
+    entries are never served stale.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        maxsize: int = 1024,
+        shared: SharedStore = shared_store,
+        stale_ttl: float = 0
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any, Tuple[str, ...]]]' = OrderedDict()
+        self._tagged: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        shared.register(self)
+
+    def _tags(self, key: Hashable, tags: Iterable[str]) -> Tuple[str, ...]:
+        """Every entry is also tagged with the cache name and its own key"""
+        return (self.name, f"{self.name}#{key}", *tags)
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def _get_local(self, key: Hashable, stale: bool = False) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] < time.time():
+                if entry[0] + self.stale_ttl >= time.time():
+                    return entry[1] if stale else _MISSING
+                self._drop(key)
+                cache_evictions.inc(self.name, 'expired')
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _set_local(self, key: Hashable, value: Any, expires_at: float, tags: Tuple[str, ...]) -> None:
+        with self._lock:
+            self._drop(key)
+            while len(self._entries) >= self.maxsize:
+                self._drop(next(iter(self._entries)))
+                cache_evictions.inc(self.name, 'size')
+            self._entries[key] = (expires_at, value, tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+
+    def _evict_local(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tagged.get(tag, ())):
+                    self._drop(key)
+                    cache_evictions.inc(self.name, 'invalidated')
+
+    def _clear_local(self, reason: str) -> None:
+        with self._lock:
+            if self._entries:
+                cache_evictions.inc(self.name, reason, amount=len(self._entries))
+            self._entries.clear()
+            self._tagged.clear()
+
+    def _broadcast(self, tags: Tuple[str, ...]) -> None:
+        self._evict_local(tags)
+        try:
+            self.shared.invalidate(tags)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Could not broadcast invalidation of {', '.join(tags)}: {str(e)}")
+
+    def _poll(self) -> None:
+        try:
+            self.shared.poll()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not read cache invalidations: {str(e)}")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        self._poll()
+        value = self._get_local(key)
+        if value is not _MISSING:
+            cache_requests.inc(self.name, 'local')
+            return value
+
+        try:
+            found = self.shared.get(self.name, str(key))
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {self.name}: {str(e)}")
+            found = None
+        if found is not None:
+            value, expires_at, tags = found
+            self._set_local(key, value, expires_at, tags)
+            cache_requests.inc(self.name, 'shared')
+            return value
+
+        cache_requests.inc(self.name, 'miss')
+        return default
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+        since: Optional[int] = None
+    ) -> None:
+        """Store a value in both tiers, evicting the least recently used local entry when full"""
+        self._poll()
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        all_tags = self._tags(key, tags)
+        self._set_local(key, value, expires_at, all_tags)
+        try:
+            stored = self.shared.set(self.name, str(key), value, expires_at, all_tags, since)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug(f"Not sharing {self.name} entry {key}: {str(e)}")
+            return
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Shared cache write failed for {self.name}: {str(e)}")
+            return
+        if not stored:
+            # Invalidated while it was being loaded
+            with self._lock:
+                self._drop(key)
+
+    def delete(self, *keys: Hashable) -> None:
+        """Remove the given keys from every worker, ignoring any that are not cached"""
+        if keys:
+            self._broadcast(tuple(f"{self.name}#{key}" for key in keys))
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """Remove every entry carrying one of the tags from every worker"""
+        if tags:
+            self._broadcast(tags)
+
+    def clear(self) -> None:
+        """Remove every entry from every worker"""
+        self._broadcast((self.name,))
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = ()
+    ) -> Any:
+        """
+        Return the cached value for key, calling loader to fill it on a miss
+
+        If the loader fails and an expired value is still within stale_ttl,
+        that value is returned instead of the error.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            try:
+                since = self.shared.sequence()
+            except OSError:
+                since = None
+            try:
+                value = loader()
+            except Exception as e:
+                value = self._get_local(key, stale=True) if self.stale_ttl else _MISSING
+                if value is _MISSING:
+                    raise
+                cache_requests.inc(self.name, 'stale')
+                logger.warning(f"Serving stale {self.name} entry {key}: {str(e)}")
+                return value
+            self.set(key, value, ttl, tags, since=since)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counts for this process, plus the local tier's size"""
+        return {
+            'local_hits': cache_requests.value(self.name, 'local'),
+            'shared_hits': cache_requests.value(self.name, 'shared'),
+            'misses': cache_requests.value(self.name, 'miss'),
+            'stale_hits': cache_requests.value(self.name, 'stale'),
+            'evictions': {
+                reason: cache_evictions.value(self.name, reason)
+                for reason in ('size', 'expired', 'invalidated')
+            },
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
@@ -0,0 +1,110 @@
+import datetime
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from pocketbase.utils import ClientResponseError
+from .cache import TieredCache
+from .config import Config
+from .delivery_zones import DeliveryZone
+from .pocketbase import create_client
+from .store_hours import WeeklyHours, parse_store_hours
+
+logger = logging.getLogger(__name__)
+
+class StoreCatalog:
+    """
+    Cached snapshot of every store plus data derived from it
+
+    The snapshot is loaded with a single paged query and rebuilt once the TTL
+    expires or `invalidate` is called, so per-request work such as delivery
+    zone checks and opening-hours filters never has to go back to PocketBase.
+    While PocketBase is down (or its circuit is open) the last snapshot keeps
+    being served for up to stale_ttl past its expiry.
+    """
+
+    def __init__(self, ttl: float = Config.CATALOG_TTL_SECONDS, stale_ttl: float = Config.CATALOG_STALE_SECONDS):
+        self._cache = TieredCache('catalog.stores', ttl, maxsize=1, stale_ttl=stale_ttl)
+        self._items = TieredCache('catalog.items', ttl, maxsize=1024, stale_ttl=stale_ttl)
+        # Stores missing from the snapshot, including ids that don't exist (cached as None)
+        self._zones = TieredCache('catalog.zones', ttl, maxsize=1024)
+
+    def _load(self) -> Dict[str, Any]:
+        stores = create_client().get_full_list('stores')
+        return {
+            'stores': stores,
+            'by_id': {store.id: store for store in stores},
+            'zones': {store.id: DeliveryZone.from_store(store) for store in stores},
+            'hours': {store.id: parse_store_hours(store) for store in stores}
+        }
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return self._cache.get_or_load('stores', self._load)
+
+    def stores(self) -> List[Any]:
+        """All store records"""
+        return self._snapshot()['stores']
+
+    def get_store(self, store_id: str) -> Optional[Any]:
+        """A single store record, or None if it is not in the snapshot"""
+        return self._snapshot()['by_id'].get(store_id)
+
+    def zone(self, store_id: str) -> Optional[DeliveryZone]:
+        """The delivery zone for a store, loading it directly if it is new"""
+        zones = self._snapshot()['zones']
+        if store_id in zones:
+            return zones[store_id]
+        try:
+            return self._zones.get_or_load(store_id, lambda: self._load_zone(store_id))
+        except Exception as e:
+            logger.warning(f"Could not load delivery zone for store {store_id}: {str(e)}")
+            return None
+
+    def _load_zone(self, store_id: str) -> Optional[DeliveryZone]:
+        try:
+            return DeliveryZone.from_store(create_client().get_one('stores', store_id))
+        except ClientResponseError as e:
+            # Unknown ids are remembered too, so they don't cost a lookup per call
+            if e.status == 404:
+                return None
+            raise
+
+    def zones(self, store_ids: Optional[Iterable[str]] = None) -> Dict[str, Optional[DeliveryZone]]:
+        """Delivery zones keyed by store id, for all stores or the given ids"""
+        if store_ids is None:
+            return dict(self._snapshot()['zones'])
+        return {store_id: self.zone(store_id) for store_id in store_ids}
+
+    def hours(self, store_id: str) -> Optional[WeeklyHours]:
+        """The parsed weekly hours for a store, or None if it has none"""
+        return self._snapshot()['hours'].get(store_id)
+
+    def is_open(self, store_id: str, when: datetime.datetime) -> bool:
+        """Whether a store is open at a moment; stores without hours count as closed"""
+        hours = self.hours(store_id)
+        return hours is not None and hours.is_open_at(when)
+
+    def _load_items(self, store_id: str) -> Dict[str, Any]:
+        items = create_client().get_full_list(
+            'store_items',
+            query_params={"filter": f'store = "{store_id}"'}
+        )
+        return {'items': items, 'by_id': {item.id: item for item in items}}
+
+    def store_items(self, store_id: str) -> List[Any]:
+        """All items for a store"""
+        return self._items.get_or_load(store_id, lambda: self._load_items(store_id))['items']
+
+    def store_item(self, store_id: str, item_id: str) -> Optional[Any]:
+        """A single item of a store, or None if the store has no such item"""
+        return self._items.get_or_load(store_id, lambda: self._load_items(store_id))['by_id'].get(item_id)
+
+    def evict_items(self, *store_ids: str) -> None:
+        """Drop the cached items of the given stores"""
+        self._items.delete(*store_ids)
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next read reloads it"""
+        self._cache.clear()
+        self._items.clear()
+        self._zones.clear()
+
+catalog = StoreCatalog()
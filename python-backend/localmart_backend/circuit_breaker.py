@@ -0,0 +1,190 @@
+import contextlib
+import logging
+import threading
+import time
+from typing import Dict, Iterator, Optional
+import httpx
+from . import metrics
+from .config import Config
+from .deadlines import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state = metrics.registry.register(metrics.Gauge(
+    'localmart_circuit_state',
+    'Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open',
+    ('dependency',)
+))
+circuit_transitions = metrics.registry.register(metrics.Counter(
+    'localmart_circuit_transitions_total',
+    'Circuit breaker state changes, by the state entered',
+    ('dependency', 'state')
+))
+circuit_rejections = metrics.registry.register(metrics.Counter(
+    'localmart_circuit_rejections_total',
+    'Calls failed fast because the dependency\'s circuit was open',
+    ('dependency',)
+))
+circuit_fallbacks = metrics.registry.register(metrics.Counter(
+    'localmart_circuit_fallbacks_total',
+    'Answers served by a fallback because a dependency was unavailable',
+    ('dependency', 'fallback')
+))
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} is unavailable (circuit open, retrying in {retry_after:.0f}s)")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Fails calls to a dependency fast once it has failed several times in a row
+
+    After failure_threshold consecutive failures the circuit opens and every
+    call raises CircuitOpenError without touching the network. Once
+    reset_seconds have passed a single probe call is let through (half-open):
+    if it succeeds the circuit closes, otherwise it opens again for another
+    reset_seconds. Calls that run out of the request's own deadline before
+    starting say nothing about the dependency and are not counted.
+    """
+
+    def __init__(
+        self,
+        dependency: str,
+        failure_threshold: int = Config.CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = Config.CIRCUIT_RESET_SECONDS
+    ):
+        self.dependency = dependency
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        circuit_state.set(dependency, value=_STATE_VALUES[CLOSED])
+
+    def _enter(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning(f"Circuit for {self.dependency} opened after {self.failures} failures")
+        elif state == CLOSED:
+            logger.info(f"Circuit for {self.dependency} closed")
+        circuit_state.set(self.dependency, value=_STATE_VALUES[state])
+        circuit_transitions.inc(self.dependency, state)
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a probe through"""
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def acquire(self) -> bool:
+        """Admit a call or raise CircuitOpenError; True when the call is the half-open probe"""
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN and self.retry_after() == 0:
+                self._enter(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            retry_after = self.retry_after()
+        circuit_rejections.inc(self.dependency)
+        raise CircuitOpenError(self.dependency, retry_after)
+
+    def release(self, probe: bool, ok: Optional[bool]) -> None:
+        """Record a call's outcome; ok=None when it ended without telling anything about the dependency"""
+        with self._lock:
+            if probe:
+                self._probing = False
+                if ok is None:
+                    return
+                if ok:
+                    self.failures = 0
+                    self._enter(CLOSED)
+                else:
+                    self.opened_at = time.monotonic()
+                    self._enter(OPEN)
+                return
+            # Calls that started before the circuit opened don't get a say afterwards
+            if self.state != CLOSED or ok is None:
+                return
+            if ok:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._enter(OPEN)
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[Dict]:
+        """
+        Run the block as one call to the dependency
+
+        Exceptions count as failures; the block can also set call['ok'] to
+        False for a response that means the dependency is unhealthy.
+        """
+        probe = self.acquire()
+        call = {'ok': True}
+        try:
+            yield call
+        except DeadlineExceeded:
+            self.release(probe, None)
+            raise
+        except Exception:
+            self.release(probe, False)
+            raise
+        except BaseException:
+            # Cancelled, e.g. the losing copy of a hedged call
+            self.release(probe, None)
+            raise
+        self.release(probe, call['ok'])
+
+def healthy_response(status_code: int) -> bool:
+    """Whether an HTTP status says the dependency itself is working; 4xx other than 429 are the caller's problem"""
+    return status_code < 500 and status_code != 429
+
+class BreakerTransport(httpx.BaseTransport):
+    """httpx transport that routes every request through a circuit breaker"""
+
+    def __init__(self, breaker: CircuitBreaker, transport: Optional[httpx.BaseTransport] = None):
+        self.breaker = breaker
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self.breaker.guard() as call:
+            response = self._transport.handle_request(request)
+            call['ok'] = healthy_response(response.status_code)
+            return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+class AsyncBreakerTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of BreakerTransport"""
+
+    def __init__(self, breaker: CircuitBreaker, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.breaker = breaker
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with self.breaker.guard() as call:
+            response = await self._transport.handle_async_request(request)
+            call['ok'] = healthy_response(response.status_code)
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+# One breaker per dependency, named as in the dependency metrics
+breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name) for name in ('pocketbase', 'stripe', 'uber', 'google_maps')
+}
@@ -4,9 +4,71 @@ class Config:
     UBER_CLIENT_ID = os.getenv('LOCALMART_UBER_DIRECT_CLIENT_ID')
     UBER_CLIENT_SECRET = os.getenv('LOCALMART_UBER_DIRECT_CLIENT_SECRET')
     UBER_CUSTOMER_ID = os.getenv('LOCALMART_UBER_DIRECT_CUSTOMER_ID')
+    UBER_API_BASE = os.getenv('LOCALMART_UBER_API_BASE', 'https://api.uber.com/v1')
+    UBER_AUTH_URL = os.getenv('LOCALMART_UBER_AUTH_URL', 'https://auth.uber.com/oauth/v2/token')
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.getenv('LOCALMART_STRIPE_API_BASE')  # e.g. a local Stripe stand-in
     GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+    GOOGLE_GEOCODE_URL = os.getenv('LOCALMART_GOOGLE_GEOCODE_URL', 'https://maps.googleapis.com/maps/api/geocode/json')
     POCKETBASE_URL = os.getenv('POCKETBASE_URL', 'http://pocketbase:8090')
     POCKETBASE_ADMIN_EMAIL = os.getenv('POCKETBASE_ADMIN_EMAIL')
-    POCKETBASE_ADMIN_PASSWORD = os.getenv('POCKETBASE_ADMIN_PASSWORD')
\ No newline at end of file
+    POCKETBASE_ADMIN_PASSWORD = os.getenv('POCKETBASE_ADMIN_PASSWORD')
+    POCKETBASE_MAX_CONNECTIONS = int(os.getenv('LOCALMART_POCKETBASE_MAX_CONNECTIONS', '32'))
+    POCKETBASE_COALESCE_READS = os.getenv('LOCALMART_POCKETBASE_COALESCE_READS', 'true').lower() == 'true'
+    # Per-call timeout caps; a request's remaining deadline can shorten them further
+    POCKETBASE_TIMEOUT_SECONDS = float(os.getenv('LOCALMART_POCKETBASE_TIMEOUT_SECONDS', '10'))
+    UBER_TIMEOUT_SECONDS = float(os.getenv('LOCALMART_UBER_TIMEOUT_SECONDS', '15'))
+    STRIPE_TIMEOUT_SECONDS = float(os.getenv('LOCALMART_STRIPE_TIMEOUT_SECONDS', '20'))
+    GEOCODE_TIMEOUT_SECONDS = float(os.getenv('LOCALMART_GEOCODE_TIMEOUT_SECONDS', '5'))
+    REQUEST_DEADLINE_SECONDS = float(os.getenv('LOCALMART_REQUEST_DEADLINE_SECONDS', '15'))
+    HEDGE_MAX_RATIO = float(os.getenv('LOCALMART_HEDGE_MAX_RATIO', '0.1'))  # 0 disables hedging
+    HEDGE_MIN_DELAY_SECONDS = float(os.getenv('LOCALMART_HEDGE_MIN_DELAY_SECONDS', '0.02'))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LOCALMART_CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_SECONDS = float(os.getenv('LOCALMART_CIRCUIT_RESET_SECONDS', '30'))
+    CATALOG_STALE_SECONDS = float(os.getenv('LOCALMART_CATALOG_STALE_SECONDS', '3600'))  # how long a stale catalog may stand in for PocketBase
+    QUOTE_CACHE_SECONDS = float(os.getenv('LOCALMART_QUOTE_CACHE_SECONDS', '1800'))
+    GEOCODE_CACHE_SECONDS = float(os.getenv('LOCALMART_GEOCODE_CACHE_SECONDS', str(90 * 24 * 3600)))
+    CATALOG_TTL_SECONDS = float(os.getenv('LOCALMART_CATALOG_TTL_SECONDS', '60'))
+    DEFAULT_DELIVERY_RADIUS_KM = float(os.getenv('LOCALMART_DEFAULT_DELIVERY_RADIUS_KM', '0'))  # for stores without a zone; 0 leaves them unrestricted
+    STORE_TIMEZONE = os.getenv('LOCALMART_STORE_TIMEZONE', 'America/New_York')
+    POCKETBASE_BATCH_SIZE = int(os.getenv('LOCALMART_POCKETBASE_BATCH_SIZE', '50'))
+    DATA_DIR = os.getenv('LOCALMART_DATA_DIR', '/tmp/localmart')  # a persistent volume in production; see README
+    WEBHOOK_QUEUE_PATH = os.getenv('LOCALMART_WEBHOOK_QUEUE_PATH', os.path.join(DATA_DIR, 'stripe_events.sqlite3'))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('LOCALMART_WEBHOOK_MAX_ATTEMPTS', '8'))
+    WEBHOOK_POLL_INTERVAL_SECONDS = float(os.getenv('LOCALMART_WEBHOOK_POLL_INTERVAL_SECONDS', '5'))
+    DELIVERY_SLOT_MINUTES = int(os.getenv('LOCALMART_DELIVERY_SLOT_MINUTES', '60'))
+    SLOT_BOOK_PATH = os.getenv('LOCALMART_SLOT_BOOK_PATH', os.path.join(DATA_DIR, 'delivery_slots.sqlite3'))
+    DEFAULT_SLOT_CAPACITY = int(os.getenv('LOCALMART_DEFAULT_SLOT_CAPACITY', '10'))
+    DELIVERY_BATCH_RADIUS_KM = float(os.getenv('LOCALMART_DELIVERY_BATCH_RADIUS_KM', '0.8'))
+    DELIVERY_BATCH_MAX_STOPS = int(os.getenv('LOCALMART_DELIVERY_BATCH_MAX_STOPS', '3'))
+    UBER_MAX_CONCURRENT_DISPATCHES = int(os.getenv('LOCALMART_UBER_MAX_CONCURRENT_DISPATCHES', '4'))
+    DISPATCH_CLAIM_SECONDS = float(os.getenv('LOCALMART_DISPATCH_CLAIM_SECONDS', '600'))  # after which an unfinished claim can be taken over
+    QUOTE_LOG_PATH = os.getenv('LOCALMART_QUOTE_LOG_PATH', os.path.join(DATA_DIR, 'delivery_quotes.sqlite3'))
+    UBER_MAX_CONCURRENT_QUOTES = int(os.getenv('LOCALMART_UBER_MAX_CONCURRENT_QUOTES', '4'))
+    DEFAULT_TAX_RATE = os.getenv('LOCALMART_DEFAULT_TAX_RATE', '0.08875')
+    DELIVERY_FEE = os.getenv('LOCALMART_DELIVERY_FEE', '5.99')
+    CACHE_PATH = os.getenv('LOCALMART_CACHE_PATH', os.path.join(DATA_DIR, 'cache.sqlite3'))
+    ORDER_CACHE_TTL_SECONDS = float(os.getenv('LOCALMART_ORDER_CACHE_TTL_SECONDS', '30'))
+    STATUS_HISTORY_FLUSH_SECONDS = float(os.getenv('LOCALMART_STATUS_HISTORY_FLUSH_SECONDS', '2'))
+    STATUS_HISTORY_MAX_PENDING = int(os.getenv('LOCALMART_STATUS_HISTORY_MAX_PENDING', '10000'))  # oldest transitions are dropped beyond this
+    METRICS_DIR = os.getenv('LOCALMART_METRICS_DIR', '')  # shared by the workers of one server; set by serve.py
+    METRICS_SNAPSHOT_SECONDS = float(os.getenv('LOCALMART_METRICS_SNAPSHOT_SECONDS', '5'))
+    SERVER_TIMING = os.getenv('LOCALMART_SERVER_TIMING', 'false').lower() == 'true'  # otherwise only admins sending X-Server-Timing: 1 get it
+    PROFILE_DIR = os.getenv('LOCALMART_PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+    PROFILE_SAMPLE_RATE = float(os.getenv('LOCALMART_PROFILE_SAMPLE_RATE', '0.02'))
+    PROFILE_SLOW_SECONDS = float(os.getenv('LOCALMART_PROFILE_SLOW_SECONDS', '1'))
+    PROFILE_INTERVAL_SECONDS = float(os.getenv('LOCALMART_PROFILE_INTERVAL_SECONDS', '0.005'))
+    LOOP_BLOCK_THRESHOLD_SECONDS = float(os.getenv('LOCALMART_LOOP_BLOCK_THRESHOLD_SECONDS', '0.25'))
+    RATE_LIMIT_ENABLED = os.getenv('LOCALMART_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    SHED_MAX_IN_FLIGHT = int(os.getenv('LOCALMART_SHED_MAX_IN_FLIGHT', '200'))  # per worker; 0 turns this check off
+    SHED_MAX_LOOP_LAG_SECONDS = float(os.getenv('LOCALMART_SHED_MAX_LOOP_LAG_SECONDS', '0.5'))  # 0 turns this check off
+    SHED_LAG_WINDOW_SECONDS = float(os.getenv('LOCALMART_SHED_LAG_WINDOW_SECONDS', '2'))  # lag must hold this long
+    TRAFFIC_RECORD_PATH = os.getenv('LOCALMART_TRAFFIC_RECORD_PATH', '')  # empty disables recording
+    TRAFFIC_RECORD_SAMPLE_RATE = float(os.getenv('LOCALMART_TRAFFIC_RECORD_SAMPLE_RATE', '1'))
+    TRAFFIC_RECORD_MAX_BYTES = int(os.getenv('LOCALMART_TRAFFIC_RECORD_MAX_BYTES', str(512 * 1024 * 1024)))
+    TRAFFIC_RECORD_SALT = os.getenv('LOCALMART_TRAFFIC_RECORD_SALT')  # share across workers to keep hashes stable
+    HOST = os.getenv('LOCALMART_HOST', '0.0.0.0')
+    PORT = int(os.getenv('PORT', '8000'))
+    WORKERS = int(os.getenv('LOCALMART_WORKERS', '2'))
+    FORWARDED_ALLOW_IPS = os.getenv('LOCALMART_FORWARDED_ALLOW_IPS', '*')  # only Fly's proxy can reach the app
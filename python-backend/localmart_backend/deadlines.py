@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+import httpx
+from .config import Config
+
+# Monotonic time by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('localmart_deadline', default=None)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised instead of starting an outbound call once the request's budget is spent"""
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def timeout(cap: float) -> float:
+    """Timeout for one outbound call: the dependency's cap, shortened to the remaining budget"""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(cap, left)
+
+@contextlib.contextmanager
+def deadline(seconds: float) -> Iterator[float]:
+    """Run the block with a budget of seconds; never extends an enclosing budget"""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        at = min(at, current)
+    token = _deadline.set(at)
+    try:
+        yield at
+    finally:
+        _deadline.reset(token)
+
+def _detached_context() -> contextvars.Context:
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+def without_deadline(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a function to run outside the request's budget
+
+    The budget is copied into everything a request starts, including
+    background tasks that run after the response and jobs handed to a
+    thread; wrap those so they get each dependency's own timeout instead.
+    Coroutine functions run as a task created in the detached context.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run_async(*args, **kwargs):
+            return await _detached_context().run(asyncio.ensure_future, fn(*args, **kwargs))
+        return run_async
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return _detached_context().run(fn, *args, **kwargs)
+    return run
+
+def iterate_without_deadline(chunks: Iterable[Any]) -> Iterator[Any]:
+    """A streamed response body produced outside the request's budget, which ends when the handler returns"""
+    context = _detached_context()
+    iterator = context.run(iter, chunks)
+    while True:
+        try:
+            chunk = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield chunk
+
+def _timeouts(seconds: float) -> dict:
+    return {'connect': seconds, 'read': seconds, 'write': seconds, 'pool': seconds}
+
+class DeadlineTransport(httpx.BaseTransport):
+    """httpx transport that caps every request's timeouts at the dependency's limit and the remaining budget"""
+
+    def __init__(self, cap: float, transport: Optional[httpx.BaseTransport] = None):
+        self.cap = cap
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions['timeout'] = _timeouts(timeout(self.cap))
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        self._transport.close()
+
+class AsyncDeadlineTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of DeadlineTransport"""
+
+    def __init__(self, cap: float, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cap = cap
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions['timeout'] = _timeouts(timeout(self.cap))
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+async def deadline_middleware(request, call_next):
+    """
+    Give each request a budget that every outbound call it makes inherits,
+    including calls in worker threads
+
+    Work that outlives the handler (streamed bodies, background tasks) must
+    opt out with iterate_without_deadline or without_deadline.
+    """
+    with deadline(Config.REQUEST_DEADLINE_SECONDS):
+        return await call_next(request)
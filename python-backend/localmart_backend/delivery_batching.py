@@ -0,0 +1,268 @@
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from pocketbase.utils import ClientResponseError
+from .config import Config
+from .delivery_zones import coordinates_of, haversine_km
+from .timeutils import to_utc
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_CLAIMS = 'dispatch_claims'
+
+class DeliveryBatch:
+    """Orders from one store and delivery window that one courier can run together"""
+
+    def __init__(self, store: Any, window: Tuple[Optional[str], Optional[str]], orders: List[Any]):
+        self.store = store
+        self.window = window
+        self.orders = orders
+
+    @property
+    def order_ids(self) -> List[str]:
+        return [order.id for order in self.orders]
+
+def _window_key(order: Any) -> Tuple[Optional[str], Optional[str]]:
+    return (
+        getattr(order, 'scheduled_delivery_start', None) or None,
+        getattr(order, 'scheduled_delivery_end', None) or None
+    )
+
+def _route(origin: Optional[Tuple[float, float]], orders: List[Any]) -> List[Any]:
+    """Order stops nearest-neighbour first, starting from the store"""
+    if origin is None:
+        return orders
+    remaining = list(orders)
+    route = []
+    position = origin
+    while remaining:
+        nearest = min(remaining, key=lambda o: haversine_km(*position, *coordinates_of(o.delivery_address)))
+        remaining.remove(nearest)
+        route.append(nearest)
+        position = coordinates_of(nearest.delivery_address)
+    return route
+
+def plan_batches(
+    store: Any,
+    orders: List[Any],
+    radius_km: float = Config.DELIVERY_BATCH_RADIUS_KM,
+    max_stops: int = Config.DELIVERY_BATCH_MAX_STOPS
+) -> List[DeliveryBatch]:
+    """
+    Cluster a store's pending orders into delivery batches
+
+    Orders are grouped by scheduled window, then clustered greedily: the
+    stop closest to the store seeds a batch, which takes every other stop
+    within radius_km of the seed up to max_stops. Orders without geocoded
+    dropoffs are dispatched on their own.
+    """
+    origin = coordinates_of(store)
+    by_window: Dict[Tuple[Optional[str], Optional[str]], List[Any]] = defaultdict(list)
+    for order in orders:
+        by_window[_window_key(order)].append(order)
+
+    batches = []
+    for window, window_orders in by_window.items():
+        located = [o for o in window_orders if coordinates_of(o.delivery_address)]
+        batches.extend(DeliveryBatch(store, window, [o]) for o in window_orders if o not in located)
+
+        if origin:
+            located.sort(key=lambda o: haversine_km(*origin, *coordinates_of(o.delivery_address)))
+        while located:
+            seed = located.pop(0)
+            seed_point = coordinates_of(seed.delivery_address)
+            cluster = [seed]
+            for order in list(located):
+                if len(cluster) >= max_stops:
+                    break
+                if haversine_km(*seed_point, *coordinates_of(order.delivery_address)) <= radius_km:
+                    cluster.append(order)
+                    located.remove(order)
+            batches.append(DeliveryBatch(store, window, _route(origin, cluster)))
+    return batches
+
+def _dropoff_address(address: Dict) -> Dict:
+    return {
+        'street_address': address.get('street_address', []),
+        'city': address.get('city', ''),
+        'state': address.get('state', ''),
+        'zip_code': address.get('zip_code', ''),
+        'country': address.get('country', 'US')
+    }
+
+def delivery_window_times(start: Any = None, end: Any = None) -> Dict[str, datetime.datetime]:
+    """
+    Pickup and dropoff times for a delivery window, or for ASAP delivery
+
+    Pickup opens 45 minutes before the window (but never sooner than 15
+    minutes from now) and the dropoff deadline is at least an hour after
+    dropoff opens.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    earliest_pickup = now + datetime.timedelta(minutes=15)
+    if start and end:
+        start, end = to_utc(start), to_utc(end)
+        pickup_ready = max(earliest_pickup, start - datetime.timedelta(minutes=45))
+        dropoff_ready = max(start, pickup_ready)
+        dropoff_deadline = max(end, dropoff_ready + datetime.timedelta(hours=1))
+    else:
+        pickup_ready = earliest_pickup
+        dropoff_ready = pickup_ready + datetime.timedelta(minutes=30)
+        dropoff_deadline = dropoff_ready + datetime.timedelta(hours=1)
+    pickup_deadline = min(pickup_ready + datetime.timedelta(hours=1), dropoff_deadline - datetime.timedelta(minutes=15))
+    return {
+        'pickup_ready': pickup_ready,
+        'pickup_deadline': pickup_deadline,
+        'dropoff_ready': dropoff_ready,
+        'dropoff_deadline': dropoff_deadline
+    }
+
+def build_delivery(store: Any, order: Any, times: Dict[str, datetime.datetime]) -> Dict[str, Any]:
+    """Arguments for UberDirectClient.create_delivery for one order"""
+    manifest_items = []
+    for item in order.expand.get('order_items_via_order', []):
+        store_item = item.expand.get('store_item')
+        manifest_items.append({
+            'name': getattr(store_item, 'name', 'Item'),
+            'quantity': item.quantity,
+            'size': 'small',
+            'price': int(round(item.price_at_time * 100))
+        })
+
+    return {
+        'pickup_address': {
+            'street_address': [store.street_1],
+            'city': store.city,
+            'state': store.state,
+            'zip_code': store.zip,
+            'country': 'US'
+        },
+        'dropoff_address': _dropoff_address(order.delivery_address or {}),
+        'total_amount': order.total_amount or 0,
+        'manifest_items': manifest_items,
+        'external_id': order.id,
+        **{key: value.isoformat() for key, value in times.items()}
+    }
+
+def _id_taken(error: ClientResponseError) -> bool:
+    return error.status == 400 and 'id' in (error.data.get('data') or {})
+
+def _claim(claims, order_id: str) -> bool:
+    """Claim an order for dispatch; False if another dispatcher holds a live claim"""
+    try:
+        claims.create({'id': order_id, 'order': order_id})
+        return True
+    except ClientResponseError as e:
+        if not _id_taken(e):
+            raise
+
+    # Take over a claim whose dispatcher died before booking a courier
+    existing = claims.get_one(order_id)
+    age = (datetime.datetime.now(datetime.timezone.utc) - to_utc(existing.created)).total_seconds()
+    if getattr(existing, 'uber_delivery_id', '') or age < Config.DISPATCH_CLAIM_SECONDS:
+        return False
+    try:
+        claims.delete(order_id)
+    except ClientResponseError as e:
+        if e.status != 404:
+            raise
+    try:
+        claims.create({'id': order_id, 'order': order_id})
+        return True
+    except ClientResponseError as e:
+        if not _id_taken(e):
+            raise
+        return False
+
+def claim_orders(client, orders: List[Any]) -> List[Any]:
+    """
+    The orders this dispatcher now holds a claim on
+
+    A claim is a dispatch_claims row keyed by the order id, so only one
+    worker (or one of two clicks) can create it and go on to book a courier.
+    """
+    claims = client.client.collection(DISPATCH_CLAIMS)
+    claimed = []
+    for order in orders:
+        try:
+            if _claim(claims, order.id):
+                claimed.append(order)
+        except Exception as e:
+            logger.error(f"Failed to claim order {order.id} for dispatch: {str(e)}")
+    return claimed
+
+def _release(client, order_id: str) -> None:
+    try:
+        client.client.collection(DISPATCH_CLAIMS).delete(order_id)
+    except Exception as e:
+        logger.error(f"Failed to release dispatch claim on order {order_id}: {str(e)}")
+
+async def _dispatch_order(uber_client, client, store: Any, order: Any, times: Dict[str, datetime.datetime]) -> Dict[str, Any]:
+    try:
+        delivery = await uber_client.create_delivery(**build_delivery(store, order, times))
+    except Exception as e:
+        logger.error(f"Failed to dispatch order {order.id}: {str(e)}")
+        _release(client, order.id)
+        return {'order_id': order.id, 'error': str(e)}
+
+    recorded = {
+        'uber_delivery_id': delivery.get('id'),
+        'uber_tracking_url': delivery.get('tracking_url')
+    }
+    try:
+        client.update('orders', order.id, recorded)
+    except Exception as e:
+        # The order still looks undispatched; cancel this delivery rather than
+        # leave it orphaned, so the next dispatch books exactly one courier
+        logger.error(f"Failed to record delivery {delivery.get('id')} on order {order.id}: {str(e)}")
+        try:
+            await uber_client.cancel_delivery(delivery.get('id'))
+        except Exception as cancel_error:
+            # Keep the claim, noting the delivery, so the order is never booked twice
+            logger.error(f"Failed to cancel unrecorded delivery {delivery.get('id')} for order {order.id}: {str(cancel_error)}")
+            try:
+                client.update(DISPATCH_CLAIMS, order.id, {'uber_delivery_id': delivery.get('id')})
+            except Exception:
+                pass
+            return {'order_id': order.id, 'delivery_id': delivery.get('id'), 'error': f"Delivery created but not recorded: {str(e)}"}
+        _release(client, order.id)
+        return {'order_id': order.id, 'error': str(e)}
+
+    return {'order_id': order.id, 'delivery_id': delivery.get('id'), 'tracking_url': delivery.get('tracking_url')}
+
+async def dispatch_batches(
+    uber_client,
+    client,
+    batches: List[DeliveryBatch],
+    max_concurrent: int = Config.UBER_MAX_CONCURRENT_DISPATCHES
+) -> List[Dict[str, Any]]:
+    """
+    Create an Uber delivery for every claimed order, batch by batch
+
+    Uber Direct takes a single dropoff per delivery and this client has no
+    multi-drop API, so each order still gets its own delivery (and its own
+    fee) with only its own address and items. A batch only shares pickup and
+    dropoff times, which lets Uber pool its orders onto one courier. Orders
+    are booked concurrently, at most max_concurrent at a time, and each is
+    saved as soon as its delivery exists; orders that fail are released to
+    the next dispatch.
+    """
+    limit = asyncio.Semaphore(max_concurrent)
+
+    async def dispatch(batch: DeliveryBatch, order: Any, times: Dict[str, datetime.datetime]) -> Dict[str, Any]:
+        async with limit:
+            return await _dispatch_order(uber_client, client, batch.store, order, times)
+
+    async def dispatch_batch(batch: DeliveryBatch) -> Dict[str, Any]:
+        times = delivery_window_times(*batch.window)
+        deliveries = await asyncio.gather(*(dispatch(batch, order, times) for order in batch.orders))
+        return {'order_ids': batch.order_ids, 'deliveries': list(deliveries)}
+
+    results = await asyncio.gather(*(dispatch_batch(batch) for batch in batches))
+    for result in results:
+        failed = [d['order_id'] for d in result['deliveries'] if 'error' in d]
+        if failed:
+            logger.warning(f"Dispatch of batch {result['order_ids']} left {len(failed)} orders undispatched: {failed}")
+    return list(results)
@@ -0,0 +1,168 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+from .config import Config
+from .delivery_zones import DeliveryZone, is_eligible
+
+logger = logging.getLogger(__name__)
+
+# Local hours when couriers are busiest and quotes run higher
+PEAK_HOURS = {11, 12, 13, 17, 18, 19, 20}
+
+# Used until enough real quotes have been logged to fit a model
+DEFAULT_FEE_COEFFICIENTS = (599.0, 100.0, 0.0, 100.0)  # cents: base, per km, per $ of manifest, peak
+DEFAULT_ETA_COEFFICIENTS = (30.0, 4.0, 10.0)  # minutes: base, per km, peak
+
+MIN_SAMPLES = 20
+
+def _is_peak(when: datetime.datetime) -> float:
+    local = when.astimezone(ZoneInfo(Config.STORE_TIMEZONE)) if when.tzinfo else when
+    return 1.0 if local.hour in PEAK_HOURS else 0.0
+
+def _least_squares(rows: Sequence[Sequence[float]], targets: Sequence[float]) -> Optional[List[float]]:
+    """Solve the normal equations (X'X)b = X'y with Gaussian elimination; None if singular"""
+    n = len(rows[0])
+    xtx = [[sum(r[i] * r[j] for r in rows) for j in range(n)] for i in range(n)]
+    xty = [sum(r[i] * y for r, y in zip(rows, targets)) for i in range(n)]
+    # Small ridge term keeps the system solvable when a feature never varies
+    for i in range(1, n):
+        xtx[i][i] += 1e-6
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(xtx[r][col]))
+        if abs(xtx[pivot][col]) < 1e-12:
+            return None
+        xtx[col], xtx[pivot] = xtx[pivot], xtx[col]
+        xty[col], xty[pivot] = xty[pivot], xty[col]
+        for r in range(n):
+            if r != col:
+                factor = xtx[r][col] / xtx[col][col]
+                for c in range(col, n):
+                    xtx[r][c] -= factor * xtx[col][c]
+                xty[r] -= factor * xty[col]
+    return [xty[i] / xtx[i][i] for i in range(n)]
+
+class QuoteLog:
+    """Local SQLite log of successful Uber quotes, used to calibrate estimates"""
+
+    def __init__(self, path: str = Config.QUOTE_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS delivery_quotes (
+                    logged_at REAL NOT NULL,
+                    distance_km REAL NOT NULL,
+                    peak REAL NOT NULL,
+                    manifest_cents INTEGER NOT NULL,
+                    fee_cents INTEGER NOT NULL,
+                    eta_minutes REAL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def record(self, distance_km: float, quoted_at: datetime.datetime, manifest_cents: int, fee_cents: int, eta_minutes: Optional[float]) -> None:
+        try:
+            with self._lock:
+                self._connection().execute(
+                    'INSERT INTO delivery_quotes VALUES (?, ?, ?, ?, ?, ?)',
+                    (time.time(), distance_km, _is_peak(quoted_at), manifest_cents, fee_cents, eta_minutes)
+                )
+        except Exception as e:
+            logger.error(f"Error logging delivery quote: {str(e)}")
+
+    def samples(self, limit: int = 5000) -> List[Tuple]:
+        """The most recent quotes as (distance_km, peak, manifest_cents, fee_cents, eta_minutes)"""
+        with self._lock:
+            return self._connection().execute(
+                'SELECT distance_km, peak, manifest_cents, fee_cents, eta_minutes FROM delivery_quotes '
+                'ORDER BY logged_at DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+
+class DeliveryEstimator:
+    """
+    Predicts delivery fee and ETA from distance, time of day and manifest value
+
+    Two linear models are fitted to the quote log and refitted at most every
+    `refit_seconds`, so estimating for every candidate store is pure
+    arithmetic with no external calls.
+    """
+
+    def __init__(self, log: QuoteLog, refit_seconds: float = 3600):
+        self.log = log
+        self.refit_seconds = refit_seconds
+        self.fee_coefficients = list(DEFAULT_FEE_COEFFICIENTS)
+        self.eta_coefficients = list(DEFAULT_ETA_COEFFICIENTS)
+        self.samples = 0
+        self._fitted_at = 0.0
+        self._lock = threading.Lock()
+
+    def refit(self) -> None:
+        rows = self.log.samples()
+        with self._lock:
+            self._fitted_at = time.monotonic()
+            self.samples = len(rows)
+            if len(rows) < MIN_SAMPLES:
+                return
+            fee = _least_squares(
+                [(1.0, r[0], r[2] / 100.0, r[1]) for r in rows],
+                [float(r[3]) for r in rows]
+            )
+            if fee:
+                self.fee_coefficients = fee
+            eta_rows = [r for r in rows if r[4] is not None]
+            if len(eta_rows) >= MIN_SAMPLES:
+                eta = _least_squares([(1.0, r[0], r[1]) for r in eta_rows], [r[4] for r in eta_rows])
+                if eta:
+                    self.eta_coefficients = eta
+
+    def _ensure_fitted(self) -> None:
+        if time.monotonic() - self._fitted_at > self.refit_seconds:
+            try:
+                self.refit()
+            except Exception as e:
+                logger.error(f"Error fitting delivery estimator: {str(e)}")
+
+    def estimate_many(
+        self,
+        zones: Dict[str, Optional[DeliveryZone]],
+        point: Tuple[float, float],
+        manifest_cents: int,
+        when: datetime.datetime
+    ) -> List[Dict[str, Any]]:
+        """Fee (cents) and ETA (minutes) for every store that can deliver to point"""
+        self._ensure_fitted()
+        peak = _is_peak(when)
+        f0, f_km, f_value, f_peak = self.fee_coefficients
+        e0, e_km, e_peak = self.eta_coefficients
+        fee_base = f0 + f_value * manifest_cents / 100.0 + f_peak * peak
+        eta_base = e0 + e_peak * peak
+
+        estimates = []
+        for store_id, zone in zones.items():
+            distance = zone.distance_km(*point) if zone else None
+            if distance is None or not is_eligible(zone, point):
+                continue
+            estimates.append({
+                'store_id': store_id,
+                'distance_km': round(distance, 3),
+                'estimated_fee': max(0, int(round(fee_base + f_km * distance))),
+                'estimated_minutes': max(1, int(round(eta_base + e_km * distance)))
+            })
+        estimates.sort(key=lambda e: e['estimated_fee'])
+        return estimates
+
+quote_log = QuoteLog()
+delivery_estimator = DeliveryEstimator(quote_log)
@@ -0,0 +1,245 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .catalog import catalog
+from .config import Config
+from .pocketbase import create_admin_client
+from .timeutils import to_utc
+
+logger = logging.getLogger(__name__)
+
+class SlotFullError(Exception):
+    """Raised when a delivery window has no remaining capacity"""
+
+class SlotBook:
+    """
+    Index of booked scheduled deliveries per store and time bucket
+
+    Windows are split into fixed-size buckets; an order occupies one unit of
+    capacity in every bucket its window overlaps. Counts are kept in SQLite
+    under the data dir so every worker process checks the same capacity, and
+    reserve checks and books all of a window's buckets in one write
+    transaction so concurrent checkouts can't overbook a slot. The index is
+    rebuilt from `orders` once per server start and kept current by
+    reserve/release.
+    """
+
+    def __init__(self, path: str = Config.SLOT_BOOK_PATH, bucket_minutes: int = Config.DELIVERY_SLOT_MINUTES):
+        self.path = path
+        self.bucket_seconds = bucket_minutes * 60
+        # Workers started together by serve.py share this id, so only the first one rebuilds
+        self.generation = os.getenv('LOCALMART_SERVE_ID') or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS slot_bookings (
+                    store TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    booked INTEGER NOT NULL,
+                    PRIMARY KEY (store, bucket)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS slot_orders (
+                    order_id TEXT PRIMARY KEY,
+                    store TEXT NOT NULL,
+                    buckets TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS slot_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._conn = conn
+        return self._conn
+
+    @contextlib.contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction; BEGIN IMMEDIATE also excludes other worker processes"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    @staticmethod
+    def _stored_generation(conn: sqlite3.Connection) -> Optional[str]:
+        row = conn.execute("SELECT value FROM slot_meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else None
+
+    def _buckets(self, start: Any, end: Any) -> List[int]:
+        """Epoch starts of every bucket overlapping [start, end)"""
+        start_ts = int(to_utc(start).timestamp())
+        end_ts = int(to_utc(end).timestamp())
+        if end_ts <= start_ts:
+            raise ValueError("Delivery window must end after it starts")
+        first = start_ts - start_ts % self.bucket_seconds
+        return list(range(first, end_ts, self.bucket_seconds))
+
+    def capacity(self, store_id: str) -> int:
+        """Orders a store can deliver per bucket"""
+        store = catalog.get_store(store_id)
+        capacity = getattr(store, 'delivery_slot_capacity', None)
+        return int(capacity) if capacity else Config.DEFAULT_SLOT_CAPACITY
+
+    def rebuild(self, only_if_stale: bool = False) -> None:
+        """
+        Reload booked counts from all upcoming, non-cancelled scheduled orders
+
+        With only_if_stale the reload is skipped if another worker of the same
+        server start has already done it, since its counts may include
+        reservations made since.
+        """
+        if only_if_stale:
+            with self._lock:
+                current = self._stored_generation(self._connection()) == self.generation
+            if current:
+                self._loaded = True
+                return
+
+        since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        orders = create_admin_client().get_full_list(
+            'orders',
+            query_params={
+                "filter": f'scheduled_delivery_end >= "{since}" && status != "cancelled"',
+                "fields": "id,store,scheduled_delivery_start,scheduled_delivery_end"
+            }
+        )
+
+        booked: Dict[Tuple[str, int], int] = defaultdict(int)
+        by_order: Dict[str, Tuple[str, List[int]]] = {}
+        for order in orders:
+            start = getattr(order, 'scheduled_delivery_start', None)
+            end = getattr(order, 'scheduled_delivery_end', None)
+            if not (order.store and start and end):
+                continue
+            try:
+                buckets = self._buckets(start, end)
+            except ValueError:
+                continue
+            for bucket in buckets:
+                booked[(order.store, bucket)] += 1
+            by_order[order.id] = (order.store, buckets)
+
+        with self._write() as conn:
+            if only_if_stale and self._stored_generation(conn) == self.generation:
+                self._loaded = True
+                return
+            conn.execute('DELETE FROM slot_bookings')
+            conn.execute('DELETE FROM slot_orders')
+            conn.executemany(
+                'INSERT INTO slot_bookings (store, bucket, booked) VALUES (?, ?, ?)',
+                [(store_id, bucket, count) for (store_id, bucket), count in booked.items()]
+            )
+            conn.executemany(
+                'INSERT INTO slot_orders (order_id, store, buckets) VALUES (?, ?, ?)',
+                [(order_id, store_id, json.dumps(buckets)) for order_id, (store_id, buckets) in by_order.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO slot_meta (key, value) VALUES ('generation', ?)",
+                (self.generation,)
+            )
+        self._loaded = True
+        logger.info(f"Loaded {len(by_order)} scheduled deliveries into the slot index")
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild(only_if_stale=True)
+
+    def reserve(self, store_id: str, start: Any, end: Any, force: bool = False) -> List[int]:
+        """
+        Book one unit of capacity in every bucket of the window
+
+        Raises SlotFullError if any bucket is full, unless force is set (used
+        when reinstating an order that already held the slot).
+        """
+        self.ensure_loaded()
+        buckets = self._buckets(start, end)
+        capacity = self.capacity(store_id)
+        with self._write() as conn:
+            if not force:
+                full = conn.execute(
+                    f"SELECT 1 FROM slot_bookings WHERE store = ? AND bucket IN ({', '.join('?' * len(buckets))}) "
+                    "AND booked >= ? LIMIT 1",
+                    (store_id, *buckets, capacity)
+                ).fetchone()
+                if full:
+                    raise SlotFullError("The selected delivery window is full")
+            conn.executemany(
+                'INSERT INTO slot_bookings (store, bucket, booked) VALUES (?, ?, 1) '
+                'ON CONFLICT (store, bucket) DO UPDATE SET booked = booked + 1',
+                [(store_id, bucket) for bucket in buckets]
+            )
+        return buckets
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, store_id: str, buckets: List[int]) -> None:
+        conn.executemany(
+            'UPDATE slot_bookings SET booked = MAX(0, booked - 1) WHERE store = ? AND bucket = ?',
+            [(store_id, bucket) for bucket in buckets]
+        )
+
+    def release(self, store_id: str, buckets: List[int]) -> None:
+        """Give back a reservation made with reserve"""
+        with self._write() as conn:
+            self._release(conn, store_id, buckets)
+
+    def assign(self, order_id: str, store_id: str, buckets: List[int]) -> None:
+        """Remember which buckets an order holds so they can be released on cancellation"""
+        with self._write() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO slot_orders (order_id, store, buckets) VALUES (?, ?, ?)',
+                (order_id, store_id, json.dumps(buckets))
+            )
+
+    def release_order(self, order_id: str, store_id: Optional[str] = None, start: Any = None, end: Any = None) -> None:
+        """Release an order's buckets, falling back to its window if it isn't indexed"""
+        window = self._buckets(start, end) if store_id and start and end else None
+        with self._write() as conn:
+            held = conn.execute(
+                'DELETE FROM slot_orders WHERE order_id = ? RETURNING store, buckets', (order_id,)
+            ).fetchone()
+            if held:
+                self._release(conn, held[0], json.loads(held[1]))
+            elif window:
+                self._release(conn, store_id, window)
+
+    def availability(self, store_id: str, start: Any, end: Any) -> List[Dict[str, Any]]:
+        """Booked and remaining capacity for every bucket in a range"""
+        self.ensure_loaded()
+        capacity = self.capacity(store_id)
+        buckets = self._buckets(start, end)
+        with self._lock:
+            booked_by_bucket = dict(self._connection().execute(
+                'SELECT bucket, booked FROM slot_bookings WHERE store = ? AND bucket BETWEEN ? AND ?',
+                (store_id, buckets[0], buckets[-1])
+            ).fetchall())
+        slots = []
+        for bucket in buckets:
+            booked = booked_by_bucket.get(bucket, 0)
+            slots.append({
+                'start': datetime.datetime.fromtimestamp(bucket, datetime.timezone.utc).isoformat(),
+                'end': datetime.datetime.fromtimestamp(bucket + self.bucket_seconds, datetime.timezone.utc).isoformat(),
+                'capacity': capacity,
+                'booked': booked,
+                'available': max(0, capacity - booked)
+            })
+        return slots
+
+slot_book = SlotBook()
@@ -0,0 +1,174 @@
+import math
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+Point = Tuple[float, float]
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def coordinates_of(obj: Any) -> Optional[Point]:
+    """
+    Read (latitude, longitude) from a record or dict
+
+    PocketBase stores coordinates as text on stores and users, so values are
+    coerced to floats. Returns None when either coordinate is missing or invalid.
+    """
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        lat, lng = obj.get('latitude'), obj.get('longitude')
+    else:
+        lat, lng = getattr(obj, 'latitude', None), getattr(obj, 'longitude', None)
+    try:
+        if lat in (None, '') or lng in (None, ''):
+            return None
+        return (float(lat), float(lng))
+    except (TypeError, ValueError):
+        return None
+
+def _parse_polygon(raw: Any) -> Optional[List[Point]]:
+    """Accept either a list of [lat, lng] pairs or a GeoJSON Polygon"""
+    if isinstance(raw, dict) and raw.get('type') == 'Polygon':
+        # GeoJSON rings are [lng, lat]; only the outer ring is used
+        rings = raw.get('coordinates') or []
+        if not rings:
+            return None
+        points = [(float(p[1]), float(p[0])) for p in rings[0]]
+    elif isinstance(raw, list):
+        points = [(float(p[0]), float(p[1])) for p in raw]
+    else:
+        return None
+    return points if len(points) >= 3 else None
+
+class DeliveryZone:
+    """A store's delivery area: a radius around the store, a polygon, or unrestricted when neither is set"""
+
+    def __init__(
+        self,
+        center: Optional[Point] = None,
+        radius_km: Optional[float] = None,
+        polygon: Optional[Sequence[Point]] = None
+    ):
+        self.center = center
+        self.radius_km = radius_km
+        self.polygon = list(polygon) if polygon else None
+
+        # Precompute a bounding box so most points are rejected without trig
+        if self.polygon:
+            lats = [p[0] for p in self.polygon]
+            lngs = [p[1] for p in self.polygon]
+            self.bbox = (min(lats), min(lngs), max(lats), max(lngs))
+        elif center and radius_km is not None:
+            d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+            d_lng = d_lat / max(math.cos(math.radians(center[0])), 1e-6)
+            self.bbox = (center[0] - d_lat, center[1] - d_lng, center[0] + d_lat, center[1] + d_lng)
+        else:
+            self.bbox = None
+
+    @classmethod
+    def from_store(cls, store: Any) -> Optional['DeliveryZone']:
+        """
+        Build the zone for a store record
+
+        A `delivery_zone` polygon takes precedence over `delivery_radius_km`.
+        Stores with coordinates but neither setting use
+        LOCALMART_DEFAULT_DELIVERY_RADIUS_KM if it is set, and otherwise
+        deliver anywhere. Returns None when nothing is known about the
+        store's location.
+        """
+        center = coordinates_of(store)
+        raw_polygon = getattr(store, 'delivery_zone', None)
+        try:
+            polygon = _parse_polygon(raw_polygon) if raw_polygon else None
+        except (TypeError, ValueError, IndexError):
+            logger.warning(f"Ignoring malformed delivery zone for store {getattr(store, 'id', '')}")
+            polygon = None
+        if polygon:
+            return cls(center=center, polygon=polygon)
+
+        if not center:
+            return None
+        radius = getattr(store, 'delivery_radius_km', None)
+        try:
+            radius = float(radius) if radius else None
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed delivery radius for store {getattr(store, 'id', '')}")
+            radius = None
+        return cls(center=center, radius_km=radius or Config.DEFAULT_DELIVERY_RADIUS_KM or None)
+
+    @property
+    def unrestricted(self) -> bool:
+        return not self.polygon and self.radius_km is None
+
+    def _in_polygon(self, lat: float, lng: float) -> bool:
+        """Ray casting test against the polygon edges"""
+        inside = False
+        points = self.polygon
+        j = len(points) - 1
+        for i in range(len(points)):
+            lat_i, lng_i = points[i]
+            lat_j, lng_j = points[j]
+            if (lng_i > lng) != (lng_j > lng):
+                crossing = (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i
+                if lat < crossing:
+                    inside = not inside
+            j = i
+        return inside
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """Check whether a point falls inside the zone"""
+        if self.unrestricted:
+            return True
+        if self.bbox is None:
+            return False
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            return False
+        if self.polygon:
+            return self._in_polygon(lat, lng)
+        return haversine_km(self.center[0], self.center[1], lat, lng) <= self.radius_km
+
+    def contains_many(self, points: Iterable[Optional[Point]]) -> List[Optional[bool]]:
+        """Test many points against this zone; unknown points map to None"""
+        return [None if p is None else self.contains(p[0], p[1]) for p in points]
+
+    def distance_km(self, lat: float, lng: float) -> Optional[float]:
+        """Distance from the store to a point, if the store location is known"""
+        if not self.center:
+            return None
+        return haversine_km(self.center[0], self.center[1], lat, lng)
+
+def is_eligible(zone: Optional[DeliveryZone], point: Optional[Point]) -> bool:
+    """
+    Whether a store can deliver to a point
+
+    Unknown zones or points are treated as eligible so that checkout keeps
+    working for stores and addresses that have not been geocoded yet.
+    """
+    if zone is None or point is None:
+        return True
+    return zone.contains(point[0], point[1])
+
+def check_stores(zones: Dict[str, Optional[DeliveryZone]], point: Optional[Point]) -> List[Dict]:
+    """Test one point against many store zones"""
+    results = []
+    for store_id, zone in zones.items():
+        distance = zone.distance_km(*point) if zone and point else None
+        results.append({
+            'store_id': store_id,
+            'eligible': is_eligible(zone, point),
+            'distance_km': round(distance, 3) if distance is not None else None
+        })
+    return results
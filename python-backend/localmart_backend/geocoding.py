@@ -1,12 +1,45 @@
 import logging
+import re
 import requests
 from typing import Dict, Optional, Tuple
 import time
 import os
+from .cache import TieredCache
+from .circuit_breaker import CircuitOpenError, breakers, circuit_fallbacks, healthy_response
 from .config import Config
+from .deadlines import timeout
+from .metrics import track
 
 logger = logging.getLogger(__name__)
 
+# Statuses that mean Google, not the address, is the problem
+GOOGLE_UNAVAILABLE_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+class LocalGeocoder:
+    """
+    Addresses Google has already geocoded, shared by every worker
+
+    Coordinates of a street address don't change, so these answer for Google
+    while it is unavailable. Only exact (normalised) address matches are
+    returned: callers store the coordinates on the record, so an approximate
+    point would be worse than none.
+    """
+
+    def __init__(self, ttl: float = Config.GEOCODE_CACHE_SECONDS, maxsize: int = 4096):
+        self._cache = TieredCache('geocodes', ttl, maxsize=maxsize)
+
+    @staticmethod
+    def _key(address: str) -> str:
+        return re.sub(r'[\s,]+', ' ', address).strip().lower()
+
+    def lookup(self, address: str) -> Optional[Tuple[float, float]]:
+        return self._cache.get(self._key(address))
+
+    def remember(self, address: str, coordinates: Tuple[float, float]) -> None:
+        self._cache.set(self._key(address), coordinates)
+
+local_geocoder = LocalGeocoder()
+
 class GeocodingService:
     """Service for geocoding addresses using Google Maps Geocoding API"""
     
@@ -21,7 +54,7 @@ class GeocodingService:
         if not self.api_key:
             logger.warning("No Google Maps API key provided. Geocoding will not work.")
         
-        self.base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self.base_url = Config.GOOGLE_GEOCODE_URL
         # Google Maps API has rate limits, but they're much higher than Nominatim
         # Still, let's add a small delay between requests to be safe
         self.last_request_time = 0
@@ -53,7 +86,9 @@ class GeocodingService:
             country: Country (default: USA)
             
         Returns:
-            Tuple of (latitude, longitude) if successful, None otherwise
+            Tuple of (latitude, longitude) if successful, None otherwise.
+            While Google is unavailable, addresses geocoded before are
+            answered by the local geocoder.
         """
         if not self.api_key:
             logger.error("Cannot geocode: No Google Maps API key provided")
@@ -62,27 +97,37 @@ class GeocodingService:
         # Format the address for the API
         address = f"{street}, {city}, {state} {zip_code}, {country}"
         
-        # Apply rate limiting
-        self._rate_limit()
-        
         try:
-            # Make the request to Google Maps Geocoding API
-            response = requests.get(
-                self.base_url,
-                params={
-                    "address": address,
-                    "key": self.api_key
-                }
-            )
-            
-            # Check if the request was successful
-            if response.status_code != 200:
-                logger.error(f"Geocoding request failed with status code {response.status_code}")
-                return None
-            
-            # Parse the response
-            result = response.json()
-            
+            with breakers['google_maps'].guard() as guard:
+                # Apply rate limiting
+                self._rate_limit()
+
+                # Make the request to Google Maps Geocoding API
+                with track('google_maps', 'geocode') as call:
+                    response = requests.get(
+                        self.base_url,
+                        params={
+                            "address": address,
+                            "key": self.api_key
+                        },
+                        timeout=timeout(Config.GEOCODE_TIMEOUT_SECONDS)
+                    )
+                    call['ok'] = response.status_code == 200
+                    call['received'] = len(response.content)
+                guard['ok'] = healthy_response(response.status_code)
+
+                # Check if the request was successful
+                if response.status_code != 200:
+                    logger.error(f"Geocoding request failed with status code {response.status_code}")
+                    return self._fallback(address)
+
+                # Parse the response
+                result = response.json()
+                if result.get('status') in GOOGLE_UNAVAILABLE_STATUSES:
+                    guard['ok'] = False
+                    logger.error(f"Geocoding unavailable. Status: {result['status']}")
+                    return self._fallback(address)
+
             # Check if we got any results and the status is OK
             if result['status'] != 'OK' or not result.get('results'):
                 logger.warning(f"No geocoding results found for address: {address}. Status: {result['status']}")
@@ -92,9 +137,19 @@ class GeocodingService:
             location = result['results'][0]['geometry']['location']
             lat = float(location['lat'])
             lng = float(location['lng'])
-            
+
+            local_geocoder.remember(address, (lat, lng))
             return (lat, lng)
             
+        except CircuitOpenError:
+            return self._fallback(address)
         except Exception as e:
             logger.error(f"Error geocoding address: {str(e)}")
-            return None 
\ No newline at end of file
+            return self._fallback(address)
+
+    def _fallback(self, address: str) -> Optional[Tuple[float, float]]:
+        """Coordinates from the local geocoder while Google can't answer"""
+        coordinates = local_geocoder.lookup(address)
+        if coordinates is not None:
+            circuit_fallbacks.inc('google_maps', 'local_geocoder')
+        return coordinates 
\ No newline at end of file
@@ -0,0 +1,192 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import threading
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from . import deadlines, metrics
+from .config import Config
+
+hedged_requests = metrics.registry.register(metrics.Counter(
+    'localmart_hedged_requests_total',
+    'Backup copies of slow idempotent calls, and how many of them answered first',
+    ('dependency', 'operation', 'target', 'outcome')
+))
+
+Key = Tuple[str, str, str]
+
+class LatencyTracker:
+    """Recent latencies of one kind of call, for estimating its p95"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = collections.deque(maxlen=window)
+        self._p95: Optional[float] = None
+        self._since_update = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_update += 1
+
+    def p95(self) -> Optional[float]:
+        """None until there are enough samples; recomputed every few samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._p95 is None or self._since_update >= 10:
+                ordered = sorted(self._samples)
+                self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                self._since_update = 0
+            return self._p95
+
+class Hedger:
+    """
+    Sends a backup copy of a slow idempotent call once the first copy has
+    taken longer than that call's recent p95; whichever answers first wins
+
+    Hedges are capped at max_ratio of calls so a dependency that is slow
+    across the board doesn't see its load doubled, and are skipped when the
+    request's remaining budget wouldn't cover the wait.
+    """
+
+    def __init__(
+        self,
+        max_ratio: float = Config.HEDGE_MAX_RATIO,
+        min_delay: float = Config.HEDGE_MIN_DELAY_SECONDS,
+        max_threads: int = Config.POCKETBASE_MAX_CONNECTIONS * 2
+    ):
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.max_threads = max_threads
+        self._trackers: Dict[Key, LatencyTracker] = {}
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._calls = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    def _tracker(self, key: Key) -> LatencyTracker:
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers.setdefault(key, LatencyTracker())
+        return tracker
+
+    def delay(self, key: Key) -> Optional[float]:
+        """How long to wait before hedging, or None if this call shouldn't be hedged"""
+        if self.max_ratio <= 0:
+            return None
+        p95 = self._tracker(key).p95()
+        if p95 is None:
+            return None
+        delay = max(self.min_delay, p95)
+        left = deadlines.remaining()
+        if left is not None and left <= delay:
+            return None
+        return delay
+
+    def _count_call(self) -> None:
+        with self._lock:
+            self._calls += 1
+            # Keep the ratio recent rather than since startup
+            if self._calls >= 10000:
+                self._calls //= 2
+                self._hedges //= 2
+
+    def _allow_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > self.max_ratio * self._calls:
+                return False
+            self._hedges += 1
+            return True
+
+    def _timed(self, key: Key, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self._tracker(key).record(time.perf_counter() - started)
+
+    def _submit(self, key: Key, fn: Callable[[], Any]) -> concurrent.futures.Future:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(self.max_threads, thread_name_prefix='hedge')
+        # Each copy runs in its own copy of the caller's context, so it keeps the request deadline
+        return self._executor.submit(contextvars.copy_context().run, self._timed, key, fn)
+
+    def call(self, dependency: str, operation: str, target: str, fn: Callable[[], Any]) -> Any:
+        """Run a blocking idempotent call, hedging it if it runs past its p95"""
+        key = (dependency, operation, target)
+        self._count_call()
+        delay = self.delay(key)
+        if delay is None:
+            return self._timed(key, fn)
+
+        primary = self._submit(key, fn)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._allow_hedge():
+            return primary.result()
+
+        hedged_requests.inc(dependency, operation, target, 'sent')
+        backup = self._submit(key, fn)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        hedged_requests.inc(dependency, operation, target, 'won')
+                    # The slower copy can't be interrupted; it finishes in the background
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def call_async(self, dependency: str, operation: str, target: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call; the losing copy is cancelled"""
+        key = (dependency, operation, target)
+        self._count_call()
+        delay = self.delay(key)
+
+        async def timed() -> Any:
+            started = time.perf_counter()
+            try:
+                return await fn()
+            finally:
+                self._tracker(key).record(time.perf_counter() - started)
+
+        if delay is None:
+            return await timed()
+
+        primary = asyncio.ensure_future(timed())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._allow_hedge():
+                return await primary
+
+            hedged_requests.inc(dependency, operation, target, 'sent')
+            backup = asyncio.ensure_future(timed())
+            tasks.add(backup)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            hedged_requests.inc(dependency, operation, target, 'won')
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+hedger = Hedger()
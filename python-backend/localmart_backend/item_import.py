@@ -0,0 +1,217 @@
+import codecs
+import csv
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from .api.models import StoreItem
+from .config import Config
+from .pocketbase import PocketBaseService
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+def detect_format(requested: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Pick the upload format from an explicit parameter or the Content-Type header"""
+    if requested:
+        requested = requested.lower()
+        return 'ndjson' if requested in ('jsonl', 'ndjson') else requested
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json' in content_type:
+        return 'ndjson'
+    return None
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of byte chunks into text lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Join physical lines so quoted fields containing newlines stay in one record"""
+    record = None
+    async for line in lines:
+        record = line if record is None else f"{record}\n{line}"
+        # Doubled quotes escape a quote, so an odd count means we are inside a field
+        if record.count('"') % 2 == 0:
+            yield record
+            record = None
+    if record is not None:
+        yield record
+
+async def iter_rows(
+    chunks: AsyncIterator[bytes],
+    fmt: str
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Yield (row_number, data, error) for each row of a CSV or NDJSON upload
+
+    Row numbers are 1-based data rows (the CSV header is not counted).
+    Exactly one of data and error is set.
+    """
+    lines = iter_lines(chunks)
+    row_number = 0
+
+    if fmt == 'ndjson':
+        async for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {str(e)}"
+                continue
+            if not isinstance(data, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, data, None
+        return
+
+    header: Optional[List[str]] = None
+    async for record in _csv_records(lines):
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [column.strip().lower() for column in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells count as missing so optional fields fall back to their defaults
+        yield row_number, {
+            column: value for column, value in zip(header, values) if value != ''
+        }, None
+
+def _validation_message(error: ValidationError) -> str:
+    return '; '.join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+class StoreItemImporter:
+    """
+    Upserts validated rows into a store's items using batched writes
+
+    Existing items are matched by SKU when the row has one, otherwise by
+    case-insensitive name. Rows are buffered only until a batch is full.
+    """
+
+    def __init__(self, client: PocketBaseService, store_id: str, batch_size: int = Config.POCKETBASE_BATCH_SIZE):
+        self.client = client
+        self.store_id = store_id
+        self.batch_size = batch_size
+        self.by_sku: Dict[str, str] = {}
+        self.by_name: Dict[str, str] = {}
+        self.pending: List[Tuple[int, Optional[str], Dict[str, Any]]] = []
+        self.pending_keys = set()
+        self.results: List[Dict[str, Any]] = []
+        self.counts = {'created': 0, 'updated': 0, 'failed': 0}
+
+    def load_existing(self) -> None:
+        """Load the keys of the store's current items in one paged query"""
+        items = self.client.get_full_list(
+            'store_items',
+            query_params={
+                "filter": f'store = "{self.store_id}"',
+                "fields": "id,name,sku"
+            }
+        )
+        for item in items:
+            self._remember(item.id, getattr(item, 'sku', None), item.name)
+
+    def _remember(self, item_id: str, sku: Optional[str], name: str) -> None:
+        if sku:
+            self.by_sku[sku] = item_id
+        self.by_name[name.strip().lower()] = item_id
+
+    def _key(self, item: StoreItem) -> str:
+        return f"sku:{item.sku}" if item.sku else f"name:{item.name.strip().lower()}"
+
+    def _existing_id(self, item: StoreItem) -> Optional[str]:
+        if item.sku:
+            return self.by_sku.get(item.sku) or self.by_name.get(item.name.strip().lower())
+        return self.by_name.get(item.name.strip().lower())
+
+    def reject(self, row_number: int, error: str) -> None:
+        self.counts['failed'] += 1
+        self.results.append({'row': row_number, 'status': 'failed', 'error': error})
+
+    def add_row(self, row_number: int, data: Dict[str, Any]) -> None:
+        """Validate a raw row against StoreItem and queue it for writing"""
+        try:
+            item = StoreItem(**data)
+        except ValidationError as e:
+            self.reject(row_number, _validation_message(e))
+            return
+
+        # A repeated key must see the id created by the earlier row
+        key = self._key(item)
+        if key in self.pending_keys:
+            self.flush()
+
+        payload = {'name': item.name, 'price': item.price, 'description': item.description}
+        if item.sku:
+            payload['sku'] = item.sku
+        self.pending.append((row_number, self._existing_id(item), payload))
+        self.pending_keys.add(key)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _request(self, item_id: Optional[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        if item_id:
+            return {'method': 'PATCH', 'url': f'/api/collections/store_items/records/{item_id}', 'body': payload}
+        return {
+            'method': 'POST',
+            'url': '/api/collections/store_items/records',
+            'body': {**payload, 'store': self.store_id}
+        }
+
+    def _record_success(self, row_number: int, item_id: Optional[str], payload: Dict[str, Any], record_id: str) -> None:
+        status = 'updated' if item_id else 'created'
+        self.counts[status] += 1
+        self.results.append({'row': row_number, 'status': status, 'id': record_id})
+        self._remember(record_id, payload.get('sku'), payload['name'])
+
+    def flush(self) -> None:
+        """Write the queued rows; if the batch is rejected, retry row by row to pinpoint failures"""
+        pending, self.pending, self.pending_keys = self.pending, [], set()
+        if not pending:
+            return
+
+        try:
+            responses = self.client.batch([self._request(item_id, payload) for _, item_id, payload in pending])
+            for (row_number, item_id, payload), response in zip(pending, responses):
+                self._record_success(row_number, item_id, payload, response['body']['id'])
+            return
+        except Exception as e:
+            logger.warning(f"Batch import for store {self.store_id} failed, retrying rows individually: {str(e)}")
+
+        for row_number, item_id, payload in pending:
+            try:
+                if item_id:
+                    record = self.client.update('store_items', item_id, payload)
+                else:
+                    record = self.client.create('store_items', {**payload, 'store': self.store_id})
+                self._record_success(row_number, item_id, payload, record.id)
+            except Exception as e:
+                self.reject(row_number, str(e))
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'store_id': self.store_id,
+            'total_rows': len(self.results),
+            **self.counts,
+            'rows': sorted(self.results, key=lambda result: result['row'])
+        }
@@ -1,19 +1,40 @@
 import logging
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .api.routes import router as api_router
+from .api.orders import uber_client
+from .webhook_queue import webhook_worker
+from .status_history import status_history
+from . import metrics
+from .profiling import loop_monitor, timing_middleware
+from .traffic_recording import traffic_recorder, recording_middleware
+from .deadlines import deadline_middleware
+from .admission import admission_middleware
+from .warmup import warmup
+from .pocketbase import close_http_client
+from .config import Config
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional: a missing or slow Uber token shouldn't keep the instance out of rotation
+warmup.add('uber', uber_client.warm, required=False)
+
 app = FastAPI(
     title="LocalMart Backend",
     description="Backend API for LocalMart application",
     version="0.1.0"
 )
 
+# Per-user and per-IP rate limits, and shedding of low-priority routes under
+# overload. Registered before CORS so CORS wraps it and 429/503 responses
+# still carry CORS headers the browser can read.
+app.middleware("http")(admission_middleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,16 +60,79 @@ app.add_middleware(
 async def startup_event():
     """Initialize services on startup."""
     logger.info("Starting Localmart backend...")
-    
-    # Print all routes on startup with clickable URLs
+
+    # Start applying queued Stripe webhook events
+    loop_monitor.start()
+    metrics.worker_metrics.start()
+    webhook_worker.start()
+    status_history.start()
+    traffic_recorder.start()
+
+    # Admin token, connection pools, catalog and slot index; /readyz reports when done
+    warmup.start()
+
+    # Log all routes on startup with clickable URLs
     host = "http://localhost:8000"  # Default FastAPI host
-    print("\n🚀 Available routes:")
-    for route in app.routes:
-        if hasattr(route, "methods"):
-            methods = ", ".join(route.methods)
-            url = f"{host}{route.path}"
-            print(f"{methods:20} {url}")
-    print()
+    routes = [
+        f"{', '.join(route.methods):20} {host}{route.path}"
+        for route in app.routes if hasattr(route, "methods")
+    ]
+    logger.info("Available routes:\n" + "\n".join(routes))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers on shutdown."""
+    await webhook_worker.stop()
+    await status_history.stop()
+    await traffic_recorder.stop()
+    await warmup.stop()
+    await loop_monitor.stop()
+    await metrics.worker_metrics.stop()
+    await uber_client.aclose()
+    close_http_client()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request, labelled by route template rather than raw path."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.http_latency.observe(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status),
+            value=time.perf_counter() - started
+        )
+
+# Per-phase Server-Timing header (admins only unless configured) and sampled profiles of slow requests
+app.middleware("http")(timing_middleware)
+
+# Per-request deadline inherited by every outbound call
+app.middleware("http")(deadline_middleware)
+
+# Opt-in recording of anonymised traffic for replay benchmarks
+if Config.TRAFFIC_RECORD_PATH:
+    app.middleware("http")(recording_middleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 503 until startup warming has finished."""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
 
 @app.get("/", response_model=dict)
 async def hello_world():
@@ -0,0 +1,429 @@
+import asyncio
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import httpx
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merged(self, snapshots: List[Tuple[str, list, bool]]) -> 'Counter':
+        """A copy holding the sum of every worker's values"""
+        total = Counter(self.name, self.help, self.labelnames)
+        for _, values, _ in snapshots:
+            for labels, value in values:
+                total.inc(*labels, amount=value)
+        return total
+
+class Gauge(Counter):
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+    def merged(self, snapshots: List[Tuple[str, list, bool]]) -> 'Gauge':
+        """A copy with each live worker's values, labelled by worker"""
+        combined = Gauge(self.name, self.help, self.labelnames + ('worker',))
+        for worker, values, live in snapshots:
+            if live:
+                for labels, value in values:
+                    combined.set(*labels, worker, value=value)
+        return combined
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (non-cumulative, plus +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels: str, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), list(s[0]), s[1], s[2]] for labels, s in self._series.items()]
+
+    def merged(self, snapshots: List[Tuple[str, list, bool]]) -> 'Histogram':
+        """A copy holding the sum of every worker's observations"""
+        total = Histogram(self.name, self.help, self.labelnames, self.buckets)
+        for _, series, _ in snapshots:
+            for labels, counts, sum_, count in series:
+                mine = total._series.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0, 0])
+                mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                mine[1] += sum_
+                mine[2] += count
+        return total
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, list]:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render_merged(self, snapshots: List[Tuple[str, Dict[str, list], bool]]) -> str:
+        """Render the combination of several workers' snapshots: (worker, snapshot, live)"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            per_worker = [(worker, snapshot.get(metric.name, []), live) for worker, snapshot, live in snapshots]
+            lines.extend(metric.merged(per_worker).render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+DEPENDENCY_LABELS = ('dependency', 'operation', 'target')
+
+dependency_latency = registry.register(Histogram(
+    'localmart_dependency_request_duration_seconds',
+    'Time spent in calls to external dependencies',
+    DEPENDENCY_LABELS
+))
+dependency_requests = registry.register(Counter(
+    'localmart_dependency_requests_total',
+    'Calls to external dependencies',
+    DEPENDENCY_LABELS + ('outcome',)
+))
+dependency_errors = registry.register(Counter(
+    'localmart_dependency_errors_total',
+    'Failed calls to external dependencies (transport errors and 4xx/5xx responses)',
+    DEPENDENCY_LABELS
+))
+dependency_payload = registry.register(Histogram(
+    'localmart_dependency_payload_bytes',
+    'Request and response body sizes of calls to external dependencies',
+    DEPENDENCY_LABELS + ('direction',),
+    buckets=SIZE_BUCKETS
+))
+http_latency = registry.register(Histogram(
+    'localmart_http_request_duration_seconds',
+    'Time to handle API requests, by route template',
+    ('method', 'route', 'status')
+))
+
+# Called with (dependency, operation, target, seconds) after every dependency call
+_observers: List[Callable[[str, str, str, float], None]] = []
+
+def add_observer(observer: Callable[[str, str, str, float], None]) -> None:
+    _observers.append(observer)
+
+def record_call(
+    dependency: str,
+    operation: str,
+    target: str,
+    seconds: float,
+    ok: bool,
+    sent: Optional[int] = None,
+    received: Optional[int] = None
+) -> None:
+    """Record one call to an external dependency"""
+    labels = (dependency, operation, target)
+    dependency_latency.observe(*labels, value=seconds)
+    dependency_requests.inc(*labels, 'ok' if ok else 'error')
+    if not ok:
+        dependency_errors.inc(*labels)
+    if sent is not None:
+        dependency_payload.observe(*labels, 'sent', value=sent)
+    if received is not None:
+        dependency_payload.observe(*labels, 'received', value=received)
+    for observer in _observers:
+        observer(dependency, operation, target, seconds)
+
+@contextmanager
+def track(dependency: str, operation: str, target: str = '') -> Iterator[Dict]:
+    """
+    Time a dependency call made inside the block
+
+    The yielded dict can be given `ok`, `sent` and `received` to record the
+    outcome and payload sizes; an exception marks the call as failed.
+    """
+    call: Dict = {'ok': True}
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call['ok'] = False
+        raise
+    finally:
+        record_call(
+            dependency, operation, target, time.perf_counter() - started,
+            call['ok'], call.get('sent'), call.get('received')
+        )
+
+# Path segments that are record or object ids rather than resource names
+_ID_SEGMENT = re.compile(r'^(?:(?=[a-z]*\d)[a-z0-9]{15}|[a-z]+_(?=[A-Za-z]*\d)[A-Za-z0-9]{8,}|[0-9a-f-]{32,36}|\d+)$')
+
+def path_operation(path: str) -> str:
+    """A low-cardinality name for a URL path, e.g. /v1/payment_intents/pi_123/confirm -> v1/payment_intents/:id/confirm"""
+    return '/'.join(':id' if _ID_SEGMENT.match(part) else part for part in path.strip('/').split('/'))
+
+def _request_size(request: httpx.Request) -> Optional[int]:
+    length = request.headers.get('content-length')
+    return int(length) if length else None
+
+class _CountingStream(httpx.SyncByteStream):
+    def __init__(self, stream, on_close: Callable[[int], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._size = 0
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._size += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+        self._on_close(self._size)
+
+class _AsyncCountingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_close: Callable[[int], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._size = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._size += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+        self._on_close(self._size)
+
+Classifier = Callable[[httpx.Request], Tuple[str, str]]
+
+def _default_classifier(request: httpx.Request) -> Tuple[str, str]:
+    return f'{request.method} {path_operation(request.url.path)}', ''
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """httpx transport that records latency, outcome and payload sizes of every call"""
+
+    def __init__(self, dependency: str, classify: Classifier = _default_classifier, transport: Optional[httpx.BaseTransport] = None):
+        self.dependency = dependency
+        self.classify = classify
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        operation, target = self.classify(request)
+        started = time.perf_counter()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            record_call(self.dependency, operation, target, time.perf_counter() - started, False, _request_size(request))
+            raise
+        # Latency is time to response headers; the body size is recorded once it has been read
+        record_call(self.dependency, operation, target, time.perf_counter() - started, response.status_code < 400, _request_size(request))
+        response.stream = _CountingStream(
+            response.stream,
+            lambda size: dependency_payload.observe(self.dependency, operation, target, 'received', value=size)
+        )
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of InstrumentedTransport"""
+
+    def __init__(self, dependency: str, classify: Classifier = _default_classifier, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.dependency = dependency
+        self.classify = classify
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation, target = self.classify(request)
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            record_call(self.dependency, operation, target, time.perf_counter() - started, False, _request_size(request))
+            raise
+        record_call(self.dependency, operation, target, time.perf_counter() - started, response.status_code < 400, _request_size(request))
+        response.stream = _AsyncCountingStream(
+            response.stream,
+            lambda size: dependency_payload.observe(self.dependency, operation, target, 'received', value=size)
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+def classify_pocketbase(request: httpx.Request) -> Tuple[str, str]:
+    """(operation, collection) for a PocketBase API call"""
+    parts = request.url.path.strip('/').split('/')
+    if parts[:2] == ['api', 'collections'] and len(parts) >= 4:
+        collection = parts[2]
+        if parts[3] == 'records':
+            if len(parts) == 4:
+                return ('list' if request.method == 'GET' else 'create'), collection
+            return {'GET': 'view', 'PATCH': 'update', 'DELETE': 'delete'}.get(request.method, request.method), collection
+        return parts[3], collection
+    if parts[:2] == ['api', 'admins'] and len(parts) >= 3:
+        return parts[2], '_admins'
+    return _default_classifier(request)
+
+class WorkerMetrics:
+    """
+    Combines the registries of all workers of one server
+
+    Each worker process has its own registry, so without this a scrape would
+    return whichever worker answered it. Every worker writes a snapshot of
+    its registry to a shared directory every few seconds, and the worker
+    answering a scrape renders the sum of all snapshots, its own taken fresh.
+    Counters and histograms are summed, including those of workers that have
+    since exited, so they stay monotonic; gauges are reported per worker and
+    only for workers whose snapshot is recent.
+    """
+
+    def __init__(self, directory: str = Config.METRICS_DIR, interval: float = Config.METRICS_SNAPSHOT_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self.worker = str(os.getpid())
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Keep this worker's counts once it has exited
+            try:
+                await asyncio.to_thread(self.write)
+            except Exception as e:
+                logger.error(f"Error writing final metrics snapshot: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.write)
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def write(self) -> None:
+        path = os.path.join(self.directory, f'{self.worker}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def render(self) -> str:
+        self.write()
+        snapshots: List[Tuple[str, Dict[str, Any], bool]] = []
+        stale_before = time.time() - 3 * self.interval
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+                live = os.path.getmtime(path) >= stale_before
+            except (OSError, ValueError):
+                continue
+            snapshots.append((os.path.basename(path)[:-len('.json')], snapshot, live))
+        return registry.render_merged(snapshots)
+
+worker_metrics = WorkerMetrics()
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format, across all workers when there are several"""
+    if worker_metrics.enabled:
+        return worker_metrics.render()
+    return registry.render()
@@ -0,0 +1,10 @@
+from .cache import TieredCache
+from .config import Config
+
+# Hydrated order records (with items) by order id, shared by all workers.
+# Anything that changes an order must evict it: status updates, the Stripe
+# webhook worker and dispatch. A hit returns the cached record itself, so
+# handlers must treat orders as read-only.
+order_cache = TieredCache('orders', Config.ORDER_CACHE_TTL_SECONDS, maxsize=2048)
+
+ORDER_EXPAND = "order_items_via_order.store_item,order_items_via_order.store_item.store"
@@ -0,0 +1,186 @@
+import csv
+import datetime
+import io
+import json
+import logging
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+from .timeutils import to_pocketbase, to_utc
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+ORDER_FIELDS = [
+    'order_id', 'created', 'user', 'store', 'status', 'payment_status',
+    'subtotal_amount', 'tax_amount', 'delivery_fee', 'total_amount',
+    'scheduled_delivery_start', 'scheduled_delivery_end', 'stripe_payment_intent_id',
+]
+ITEM_FIELDS = ['item_id', 'store_item_id', 'item_name', 'quantity', 'price_at_time', 'total_price']
+
+def iter_orders(client, start: datetime.datetime, end: datetime.datetime, page_size: int = 200) -> Iterator[Any]:
+    """
+    Every order created in [start, end), oldest first, with items expanded
+
+    Pages with a (created, id) cursor rather than page numbers, so each query
+    is an index range scan and deep pages cost the same as the first. Pages
+    are read raw because the SDK's parsed `created` drops the milliseconds,
+    and a truncated cursor would match the previous page's last row again.
+    """
+    records = client.client.collection('orders')
+    bounds = f'created >= "{to_pocketbase(start)}" && created < "{to_pocketbase(end)}"'
+    cursor: Optional[tuple] = None
+    while True:
+        page_filter = bounds
+        if cursor:
+            page_filter += f' && (created > "{cursor[0]}" || (created = "{cursor[0]}" && id > "{cursor[1]}"))'
+        page = client.client.send(records.base_crud_path(), {
+            'method': 'GET',
+            'params': {
+                "page": 1,
+                "perPage": page_size,
+                "filter": page_filter,
+                "sort": "created,id",
+                "expand": "order_items_via_order.store_item",
+                "skipTotal": 1
+            }
+        })
+        items = page.get('items', [])
+        # Decoding consumes the raw dicts, so take the cursor first
+        last = (items[-1]['created'], items[-1]['id']) if items else None
+        yield from (records.decode(item) for item in items)
+        if len(items) < page_size:
+            return
+        cursor = last
+
+def _timestamp(value: Any) -> Optional[str]:
+    return to_utc(value).isoformat() if value else None
+
+def order_row(order: Any) -> Dict[str, Any]:
+    return {
+        'order_id': order.id,
+        'created': _timestamp(order.created),
+        'user': order.user,
+        'store': order.store,
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'subtotal_amount': getattr(order, 'subtotal_amount', None),
+        'tax_amount': getattr(order, 'tax_amount', None),
+        'delivery_fee': getattr(order, 'delivery_fee', None),
+        'total_amount': getattr(order, 'total_amount', None),
+        'scheduled_delivery_start': _timestamp(getattr(order, 'scheduled_delivery_start', None)),
+        'scheduled_delivery_end': _timestamp(getattr(order, 'scheduled_delivery_end', None)),
+        'stripe_payment_intent_id': getattr(order, 'stripe_payment_intent_id', None),
+    }
+
+def item_rows(order: Any) -> List[Dict[str, Any]]:
+    rows = []
+    for item in order.expand.get('order_items_via_order', []):
+        store_item = item.expand.get('store_item')
+        rows.append({
+            'item_id': item.id,
+            'store_item_id': item.store_item,
+            'item_name': getattr(store_item, 'name', None),
+            'quantity': item.quantity,
+            'price_at_time': item.price_at_time,
+            'total_price': item.total_price,
+        })
+    return rows
+
+def line_rows(order: Any) -> List[Dict[str, Any]]:
+    """One flat row per line item; orders without items still get one row"""
+    base = order_row(order)
+    items = item_rows(order)
+    if not items:
+        return [{**base, **{field: None for field in ITEM_FIELDS}}]
+    return [{**base, **item} for item in items]
+
+def _csv_chunks(orders: Iterator[Any]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ORDER_FIELDS + ITEM_FIELDS)
+    writer.writeheader()
+    for order in orders:
+        writer.writerows(line_rows(order))
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def _ndjson_chunks(orders: Iterator[Any]) -> Iterator[bytes]:
+    lines = []
+    size = 0
+    for order in orders:
+        line = json.dumps({**order_row(order), 'items': item_rows(order)}) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= 64 * 1024:
+            yield ''.join(lines).encode('utf-8')
+            lines, size = [], 0
+    yield ''.join(lines).encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def _parquet_chunks(orders: Iterator[Any], rows_per_group: int = 10000) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(field, pa.string()) for field in ORDER_FIELDS[:6]]
+        + [(field, pa.float64()) for field in ORDER_FIELDS[6:10]]
+        + [(field, pa.string()) for field in ORDER_FIELDS[10:]]
+        + [('item_id', pa.string()), ('store_item_id', pa.string()), ('item_name', pa.string()),
+           ('quantity', pa.int64()), ('price_at_time', pa.float64()), ('total_price', pa.float64())]
+    )
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    rows: List[Dict[str, Any]] = []
+    for order in orders:
+        rows.extend(line_rows(order))
+        if len(rows) >= rows_per_group:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            rows = []
+            yield sink.drain()
+    if rows:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def export_orders(client, start: datetime.datetime, end: datetime.datetime, fmt: str = 'csv', gzip: bool = True) -> Iterator[bytes]:
+    """Encoded export of every order in [start, end), produced page by page"""
+    orders = iter_orders(client, start, end)
+    if fmt == 'parquet':
+        # Parquet compresses its own column chunks
+        return _parquet_chunks(orders)
+    chunks = _csv_chunks(orders) if fmt == 'csv' else _ndjson_chunks(orders)
+    return _gzip(chunks) if gzip else chunks
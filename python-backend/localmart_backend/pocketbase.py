@@ -1,18 +1,94 @@
 import logging
 import base64
 import json
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Any, Optional, Tuple
+import httpx
 from pocketbase import PocketBase
+from . import metrics
+from .circuit_breaker import BreakerTransport, breakers
 from .config import Config
+from .deadlines import DeadlineTransport
+from .hedging import hedger
+from .metrics import InstrumentedTransport, classify_pocketbase
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+pocketbase_reads = metrics.registry.register(metrics.Counter(
+    'localmart_pocketbase_reads_total',
+    'PocketBase reads by whether they were fetched or shared with an identical in-flight read',
+    ('operation', 'collection', 'result')
+))
+
+# Identical concurrent reads (same query and auth scope) share one request
+_reads = SingleFlight()
+
+_http_client: Optional[httpx.Client] = None
+_http_lock = threading.Lock()
+
+def shared_http_client() -> httpx.Client:
+    """
+    Process-wide connection pool for PocketBase; auth headers are sent per
+    request, so it is safe to share
+
+    Every call goes through the pocketbase circuit breaker, so while
+    PocketBase is down calls fail in microseconds instead of timing out.
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    transport=BreakerTransport(
+                        breakers['pocketbase'],
+                        InstrumentedTransport(
+                            'pocketbase',
+                            classify_pocketbase,
+                            DeadlineTransport(
+                                Config.POCKETBASE_TIMEOUT_SECONDS,
+                                httpx.HTTPTransport(limits=httpx.Limits(
+                                    max_connections=Config.POCKETBASE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=Config.POCKETBASE_MAX_CONNECTIONS
+                                ))
+                            )
+                        )
+                    )
+                )
+    return _http_client
+
+def close_http_client() -> None:
+    global _http_client
+    with _http_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
 class PocketBaseService:
-    def __init__(self, url: str = Config.POCKETBASE_URL):
+    def __init__(self, url: str = Config.POCKETBASE_URL, coalesce: bool = Config.POCKETBASE_COALESCE_READS):
         self.url = url
-        self.client = PocketBase(url)
+        self.coalesce = coalesce
+        self.client = PocketBase(url, timeout=Config.POCKETBASE_TIMEOUT_SECONDS, http_client=shared_http_client())
         self.pb = self.client  # Alias for compatibility
 
+    def _read(self, operation: str, collection: str, args: Tuple, query_params: Optional[Dict[str, Any]], fetch: Callable[[], Any]) -> Any:
+        """Run a read, hedged past its p95 and joining an identical one already in flight in this process"""
+        hedged = lambda: hedger.call('pocketbase', operation, collection, fetch)
+        if not self.coalesce:
+            return hedged()
+        key: Hashable = (
+            self.url,
+            self.client.auth_store.token,
+            operation,
+            collection,
+            args,
+            tuple(sorted((name, str(value)) for name, value in (query_params or {}).items()))
+        )
+        result, shared = _reads.do(key, hedged)
+        pocketbase_reads.inc(operation, collection, 'shared' if shared else 'fetched')
+        return result
+
     def set_token(self, token: str) -> None:
         """Set the auth token for subsequent requests"""
         self.client.auth_store.save(token, None)
@@ -30,16 +106,30 @@ class PocketBaseService:
     ) -> Dict[str, Any]:
         """Get a list of records from a collection"""
         try:
-            result = self.client.collection(collection).get_list(
-                page,
-                per_page,
-                query_params=query_params or {}
+            return self._read(
+                'list', collection, (page, per_page), query_params,
+                lambda: self.client.collection(collection).get_list(page, per_page, query_params=query_params or {})
             )
-            return result
         except Exception as e:
             logger.error(f"Error fetching records from {collection}: {str(e)}")
             raise
 
+    def get_full_list(
+        self,
+        collection: str,
+        batch: int = 200,
+        query_params: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        """Get every record from a collection, paging through the results"""
+        try:
+            return self._read(
+                'full_list', collection, (batch,), query_params,
+                lambda: self.client.collection(collection).get_full_list(batch, query_params=query_params or {})
+            )
+        except Exception as e:
+            logger.error(f"Error fetching all records from {collection}: {str(e)}")
+            raise
+
     def get_one(
         self,
         collection: str,
@@ -48,11 +138,10 @@ class PocketBaseService:
     ) -> Dict[str, Any]:
         """Get a single record from a collection"""
         try:
-            result = self.client.collection(collection).get_one(
-                record_id,
-                query_params=query_params or {}
+            return self._read(
+                'view', collection, (record_id,), query_params,
+                lambda: self.client.collection(collection).get_one(record_id, query_params=query_params or {})
             )
-            return result
         except Exception as e:
             logger.error(f"Error fetching record {record_id} from {collection}: {str(e)}")
             raise
@@ -110,6 +199,39 @@ class PocketBaseService:
             logger.error(f"Error deleting record {record_id} from {collection}: {str(e)}")
             raise
 
+    def batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Send several write requests in one round trip via PocketBase's batch API
+
+        Each request is a dict with `method`, `url` and optional `body`. The batch
+        runs in a single transaction, so either every request succeeds or none do.
+        Returns one `{"status": ..., "body": ...}` entry per request.
+        """
+        if not requests:
+            return []
+        try:
+            return self.client.send('/api/batch', {
+                'method': 'POST',
+                'body': {'requests': requests}
+            })
+        except Exception as e:
+            logger.error(f"Error sending batch of {len(requests)} requests: {str(e)}")
+            raise
+
+    def batch_create(self, collection: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several records in one batch request"""
+        return self.batch([
+            {'method': 'POST', 'url': f'/api/collections/{collection}/records', 'body': data}
+            for data in records
+        ])
+
+    def batch_update(self, collection: str, updates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Update several records, keyed by record id, in one batch request"""
+        return self.batch([
+            {'method': 'PATCH', 'url': f'/api/collections/{collection}/records/{record_id}', 'body': data}
+            for record_id, data in updates.items()
+        ])
+
     def auth_with_password(
         self,
         collection: str,
@@ -173,8 +295,48 @@ def create_client(token: Optional[str] = None):
         _pb.set_token(token)
     return _pb
 
+def _token_expiry(token: str) -> float:
+    """The exp claim of a JWT as a unix timestamp, or 0 if it can't be read"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload)).get('exp', 0))
+    except Exception:
+        return 0.0
+
+class AdminTokenCache:
+    """Superuser token shared by every admin client until shortly before it expires"""
+
+    def __init__(self, margin: float = 300, fallback_ttl: float = 600):
+        self.margin = margin
+        self.fallback_ttl = fallback_ttl
+        self._token: Optional[Tuple[str, float]] = None
+        self._lock = threading.Lock()
+
+    def get(self, client: PocketBaseService) -> str:
+        """A valid admin token, authenticating with client only when none is cached"""
+        cached = self._token
+        if cached and time.time() < cached[1]:
+            return cached[0]
+        with self._lock:
+            cached = self._token
+            if cached and time.time() < cached[1]:
+                return cached[0]
+            result = client.client.admins.auth_with_password(
+                Config.POCKETBASE_ADMIN_EMAIL, Config.POCKETBASE_ADMIN_PASSWORD
+            )
+            expires_at = _token_expiry(result.token) or time.time() + self.fallback_ttl + self.margin
+            self._token = (result.token, expires_at - self.margin)
+            logger.debug("Admin token refreshed")
+            return result.token
+
+    def clear(self) -> None:
+        with self._lock:
+            self._token = None
+
+admin_token = AdminTokenCache()
+
 def create_admin_client():
     _pb = PocketBaseService(Config.POCKETBASE_URL)
-    _pb.client.admins.auth_with_password(Config.POCKETBASE_ADMIN_EMAIL, Config.POCKETBASE_ADMIN_PASSWORD)
-    print("Admin client created")
+    _pb.set_token(admin_token.get(_pb))
     return _pb
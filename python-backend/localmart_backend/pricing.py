@@ -0,0 +1,163 @@
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional
+from .catalog import catalog
+from .config import Config
+from .pocketbase import create_client
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+# Combined state and local sales tax by ZIP prefix. NYC (all five boroughs) is 8.875%.
+TAX_RATES_BY_ZIP_PREFIX = {
+    '100': Decimal('0.08875'),  # Manhattan
+    '101': Decimal('0.08875'),
+    '102': Decimal('0.08875'),
+    '103': Decimal('0.08875'),  # Staten Island
+    '104': Decimal('0.08875'),  # Bronx
+    '110': Decimal('0.08625'),  # Nassau
+    '111': Decimal('0.08875'),  # Long Island City
+    '112': Decimal('0.08875'),  # Brooklyn
+    '113': Decimal('0.08875'),  # Queens
+    '114': Decimal('0.08875'),
+    '115': Decimal('0.08625'),  # Nassau
+    '116': Decimal('0.08875'),  # Rockaways
+    '117': Decimal('0.08625'),  # Suffolk
+    '118': Decimal('0.08625'),
+    '119': Decimal('0.08625'),
+}
+
+# Individual ZIPs whose rate differs from their prefix
+TAX_RATES_BY_ZIP: Dict[str, Decimal] = {}
+
+# Client totals may differ from ours by this much (they are computed in floating point)
+TOLERANCE = Decimal('0.01')
+
+class PricingError(ValueError):
+    """Raised when a cart can't be priced or its totals don't match the server's"""
+
+def to_money(value: Any) -> Decimal:
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def tax_rate_for_zip(zip_code: Optional[str]) -> Decimal:
+    """Sales tax rate for a delivery ZIP, falling back to the configured default"""
+    zip_code = (zip_code or '').strip()[:5]
+    if zip_code in TAX_RATES_BY_ZIP:
+        return TAX_RATES_BY_ZIP[zip_code]
+    return TAX_RATES_BY_ZIP_PREFIX.get(zip_code[:3], Decimal(Config.DEFAULT_TAX_RATE))
+
+class PricedCart:
+    """A cart priced from stored item prices"""
+
+    def __init__(self, lines: List[Dict[str, Any]], tax_rate: Decimal, delivery_fee: Decimal):
+        self.lines = lines
+        self.tax_rate = tax_rate
+        self.subtotal = sum((line['total_price'] for line in lines), Decimal('0.00'))
+        self.tax = (self.subtotal * tax_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+        self.delivery_fee = delivery_fee
+        self.total = self.subtotal + self.tax + self.delivery_fee
+
+    @property
+    def total_cents(self) -> int:
+        return int(self.total * 100)
+
+    def summary(self) -> Dict[str, Any]:
+        """Server-side amounts in the fields an order request submits them in"""
+        return {
+            'items': [
+                {
+                    'store_item_id': line['store_item_id'],
+                    'quantity': line['quantity'],
+                    'price': float(line['unit_price']),
+                    'total_price': float(line['total_price'])
+                }
+                for line in self.lines
+            ],
+            'tax_rate': float(self.tax_rate),
+            'subtotal_amount': float(self.subtotal),
+            'tax_amount': float(self.tax),
+            'delivery_fee': float(self.delivery_fee),
+            'total_amount': float(self.total)
+        }
+
+    def check_client_totals(self, request: Dict[str, Any]) -> None:
+        """Reject a request whose submitted prices or totals differ from the server's"""
+        for line, item in zip(self.lines, request['items']):
+            if 'price' in item and abs(Decimal(str(item['price'])) - line['unit_price']) > TOLERANCE:
+                raise PricingError(f"Price of item {line['store_item_id']} has changed to {line['unit_price']}")
+
+        expected = {
+            'subtotal_amount': self.subtotal,
+            'tax_amount': self.tax,
+            'delivery_fee': self.delivery_fee,
+            'total_amount': self.total,
+        }
+        for field, amount in expected.items():
+            if field in request and abs(Decimal(str(request[field])) - amount) > TOLERANCE:
+                raise PricingError(f"Order {field} does not match: expected {amount}")
+
+def load_item_prices(store_id: str, item_ids: List[str]) -> Dict[str, Decimal]:
+    """
+    Current prices of a store's items
+
+    Served from the catalog's per-store item cache; anything missing from it
+    (e.g. an item created on another instance) is fetched in a single query.
+    """
+    prices = {}
+    misses = []
+    for item_id in set(item_ids):
+        item = catalog.store_item(store_id, item_id)
+        if item is not None:
+            prices[item_id] = to_money(item.price)
+        else:
+            misses.append(item_id)
+
+    if misses:
+        id_filter = ' || '.join(f'id = "{item_id}"' for item_id in misses)
+        items = create_client().get_full_list(
+            'store_items',
+            query_params={"filter": f'store = "{store_id}" && ({id_filter})', "fields": "id,price"}
+        )
+        for item in items:
+            prices[item.id] = to_money(item.price)
+        if items:
+            # The cached item list is stale
+            catalog.evict_items(store_id)
+    return prices
+
+def price_cart(store_id: str, items: List[Dict[str, Any]], delivery_address: Optional[Dict] = None) -> PricedCart:
+    """Price cart lines from stored prices, with tax for the delivery ZIP"""
+    if not items:
+        raise PricingError("Cart is empty")
+
+    quantities = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('store_item_id'), str) or not item['store_item_id']:
+            raise PricingError("Every cart line needs a store_item_id")
+        quantity = item.get('quantity')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise PricingError(f"Invalid quantity for item {item.get('store_item_id')}")
+        quantities.append(quantity)
+
+    prices = load_item_prices(store_id, [item['store_item_id'] for item in items])
+    unknown = [item['store_item_id'] for item in items if item['store_item_id'] not in prices]
+    if unknown:
+        raise PricingError(f"Items not sold by this store: {', '.join(unknown)}")
+
+    lines = []
+    for item, quantity in zip(items, quantities):
+        unit_price = prices[item['store_item_id']]
+        lines.append({
+            'store_item_id': item['store_item_id'],
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': unit_price * quantity
+        })
+
+    zip_code = (delivery_address or {}).get('zip_code')
+    if not zip_code:
+        store = catalog.get_store(store_id)
+        zip_code = getattr(store, 'zip', None)
+
+    return PricedCart(lines, tax_rate_for_zip(zip_code), to_money(Config.DELIVERY_FEE))
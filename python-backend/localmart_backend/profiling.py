@@ -0,0 +1,275 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from .config import Config
+from . import metrics
+from .api.utils import get_verified_user
+
+logger = logging.getLogger(__name__)
+
+loop_lag = metrics.registry.register(metrics.Histogram(
+    'localmart_event_loop_lag_seconds',
+    'How late the event loop ran a timer scheduled for now',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+
+class RequestTiming:
+    """Time spent in each phase of one request, reported in a Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = collections.defaultdict(float)
+        self.max_loop_lag = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        # Phases can be recorded from worker threads running asyncio.to_thread
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def header(self) -> str:
+        total = time.perf_counter() - self.started
+        with self._lock:
+            phases = dict(self.phases)
+        # Time not attributed to any dependency or explicit phase
+        phases['app'] = max(0.0, total - sum(phases.values()))
+        entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in phases.items()]
+        if self.max_loop_lag:
+            entries.append(f'loop-lag;dur={self.max_loop_lag * 1000:.1f}')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+_current: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar('request_timing', default=None)
+_active: "set[RequestTiming]" = set()
+
+def add_phase_time(phase: str, seconds: float) -> None:
+    timing = _current.get()
+    if timing is not None:
+        timing.add(phase, seconds)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Attribute the time spent in the block to a named phase of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase_time(name, time.perf_counter() - started)
+
+def _record_dependency_phase(dependency: str, operation: str, target: str, seconds: float) -> None:
+    # Token checks are PocketBase reads of the auth collections; report them as their own phase
+    if dependency == 'pocketbase' and target in ('users', '_superusers', '_admins'):
+        dependency = 'auth'
+    add_phase_time(dependency, seconds)
+
+metrics.add_observer(_record_dependency_phase)
+
+def _collapse(frame) -> str:
+    """A stack as "outer;...;inner" function names, as used by flame graph tools"""
+    stack = []
+    for summary in traceback.extract_stack(frame):
+        stack.append(f"{os.path.basename(summary.filename)}:{summary.name}")
+    return ';'.join(stack)
+
+def write_profile(label: str, stacks: Dict[str, int], header: str = '') -> Optional[str]:
+    """Save folded stack samples under PROFILE_DIR; returns the file path"""
+    if not stacks:
+        return None
+    try:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        path = os.path.join(Config.PROFILE_DIR, f"{stamp}-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}.folded")
+        with open(path, 'w') as f:
+            if header:
+                f.write(f"# {header}\n")
+            for stack, count in sorted(stacks.items(), key=lambda pair: -pair[1]):
+                f.write(f"{stack} {count}\n")
+        return path
+    except OSError as e:
+        logger.error(f"Could not write profile: {str(e)}")
+        return None
+
+class StackSampler:
+    """
+    Samples one thread's stack at a fixed interval from a background thread
+
+    Pointed at the event loop thread, the samples show what the loop was
+    running while a request was in flight, including any blocking call.
+    """
+
+    _busy = threading.Lock()
+
+    def __init__(self, thread_id: int, interval: float = Config.PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Start sampling unless another sampler is already running"""
+        if not StackSampler._busy.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> Dict[str, int]:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            StackSampler._busy.release()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+class LoopMonitor:
+    """
+    Measures event loop lag and catches what blocks the loop
+
+    A task on the loop records how late each timer fires. A watchdog thread
+    watches the task's heartbeat; when the loop has been stuck longer than
+    the threshold it logs the loop thread's stack and saves it to disk, which
+    points straight at handlers doing blocking work on the loop.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = Config.LOOP_BLOCK_THRESHOLD_SECONDS):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag = 0.0
+        # (when, lag) of recent samples, for telling sustained lag from a one-off stall
+        self._samples: collections.deque = collections.deque(maxlen=256)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self._samples.append((now, self.lag))
+            loop_lag.observe(value=self.lag)
+            for timing in list(_active):
+                timing.max_loop_lag = max(timing.max_loop_lag, self.lag)
+
+    def sustained_lag(self, window: float) -> float:
+        """The lowest lag sampled over the last window seconds: how far behind the loop has stayed throughout"""
+        cutoff = time.monotonic() - window
+        recent = [lag for at, lag in list(self._samples) if at >= cutoff]
+        # Fewer than two samples in the window means the loop could barely run a timer
+        if len(recent) < 2:
+            return self.lag
+        return min(recent)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stop.wait(self.block_threshold / 2):
+            beat = self._heartbeat
+            stuck_for = time.monotonic() - beat
+            if stuck_for < self.block_threshold + self.interval or beat == reported_beat:
+                continue
+            reported_beat = beat  # one report per stall
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = _collapse(frame)
+            logger.warning(
+                f"Event loop blocked for {stuck_for:.2f}s in:\n" + ''.join(traceback.format_stack(frame)[-8:])
+            )
+            write_profile('loop-blocked', {stack: 1}, header=f"event loop blocked for {stuck_for:.3f}s")
+
+loop_monitor = LoopMonitor()
+
+async def _wants_server_timing(request) -> bool:
+    """
+    Whether to send this response's Server-Timing header
+
+    The breakdown reveals which dependencies a request touched and how
+    long they took, so unless LOCALMART_SERVER_TIMING is on it only goes to
+    global admins who ask for it with `X-Server-Timing: 1`.
+    """
+    if Config.SERVER_TIMING:
+        return True
+    authorization = request.headers.get('authorization', '')
+    if request.headers.get('x-server-timing') != '1' or not authorization.startswith('Bearer '):
+        return False
+    try:
+        user = await asyncio.to_thread(get_verified_user, authorization.split(' ', 1)[1])
+    except Exception:
+        return False
+    return 'admin' in (getattr(user, 'roles', []) or [])
+
+async def timing_middleware(request, call_next):
+    """Add a Server-Timing breakdown for admins (or everyone, if configured) and profile a sample of slow requests"""
+    timing = RequestTiming()
+    token = _current.set(timing)
+    _active.add(timing)
+
+    sampler = None
+    if Config.PROFILE_SAMPLE_RATE and random.random() < Config.PROFILE_SAMPLE_RATE:
+        sampler = StackSampler(threading.get_ident())
+        if not sampler.start():
+            sampler = None
+
+    try:
+        response = await call_next(request)
+        header = timing.header()
+        if await _wants_server_timing(request):
+            response.headers['Server-Timing'] = header
+        return response
+    finally:
+        _active.discard(timing)
+        _current.reset(token)
+        if sampler is not None:
+            stacks = sampler.stop()
+            elapsed = time.perf_counter() - timing.started
+            if elapsed >= Config.PROFILE_SLOW_SECONDS:
+                route = getattr(request.scope.get('route'), 'path', request.url.path)
+                path = write_profile(
+                    f"{request.method} {route}",
+                    stacks,
+                    header=f"{request.method} {request.url.path} took {elapsed:.3f}s; {timing.header()}"
+                )
+                if path:
+                    logger.info(f"Saved profile of slow request {request.method} {request.url.path} to {path}")
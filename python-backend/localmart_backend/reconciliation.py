@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import json
+import logging
+from typing import Any, Dict, List, Optional
+import stripe
+from .config import Config
+from .stripe_client import configure_stripe
+from .order_cache import order_cache
+from .pocketbase import create_admin_client
+from .status_history import status_history
+from .webhook_queue import payment_intent_index
+
+logger = logging.getLogger(__name__)
+
+configure_stripe()
+
+def payment_status_for(payment_intent: Any) -> Optional[str]:
+    """The order payment_status a PaymentIntent implies, or None while it is still in flight"""
+    status = payment_intent['status']
+    if status == 'succeeded':
+        return 'succeeded'
+    if status == 'canceled':
+        return 'failed'
+    if status == 'requires_payment_method' and payment_intent.get('last_payment_error'):
+        return 'failed'
+    return None
+
+def _load_orders(client, payment_intent_ids: List[str]) -> Dict[str, Any]:
+    """Orders for a page of payment intents in one query, keyed by payment intent id"""
+    intent_filter = ' || '.join(f'stripe_payment_intent_id = "{pi}"' for pi in payment_intent_ids)
+    orders = client.get_full_list(
+        'orders',
+        query_params={"filter": intent_filter, "fields": "id,stripe_payment_intent_id,payment_status"}
+    )
+    return {order.stripe_payment_intent_id: order for order in orders}
+
+def reconcile_payments(
+    start: datetime.datetime,
+    end: datetime.datetime,
+    dry_run: bool = False,
+    client=None,
+    page_size: int = 100
+) -> Dict[str, Any]:
+    """
+    Bring order payment statuses in line with Stripe for intents created in [start, end)
+
+    Walks Stripe's PaymentIntent list a page at a time; each page costs one
+    order lookup and, if anything drifted, one batched write.
+    """
+    client = client or create_admin_client()
+    report: Dict[str, Any] = {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'dry_run': dry_run,
+        'pages': 0,
+        'payment_intents': 0,
+        'matched': 0,
+        'in_flight': 0,
+        'unchanged': 0,
+        'unmatched': [],
+        'corrections': []
+    }
+
+    params = {
+        'created': {'gte': int(start.timestamp()), 'lt': int(end.timestamp())},
+        'limit': page_size
+    }
+    while True:
+        page = stripe.PaymentIntent.list(**params)
+        intents = page['data']
+        report['pages'] += 1
+        report['payment_intents'] += len(intents)
+        if not intents:
+            break
+
+        orders = _load_orders(client, [pi['id'] for pi in intents])
+        corrections = []
+        for payment_intent in intents:
+            order = orders.get(payment_intent['id'])
+            if order is None:
+                report['unmatched'].append(payment_intent['id'])
+                continue
+            report['matched'] += 1
+            payment_intent_index.remember(payment_intent['id'], order.id)
+
+            expected = payment_status_for(payment_intent)
+            if expected is None:
+                report['in_flight'] += 1
+            elif expected == order.payment_status:
+                report['unchanged'] += 1
+            else:
+                corrections.append({
+                    'order_id': order.id,
+                    'payment_intent': payment_intent['id'],
+                    'from': order.payment_status,
+                    'to': expected
+                })
+        report['corrections'].extend(corrections)
+
+        if corrections and not dry_run:
+            for offset in range(0, len(corrections), Config.POCKETBASE_BATCH_SIZE):
+                chunk = corrections[offset:offset + Config.POCKETBASE_BATCH_SIZE]
+                client.batch_update('orders', {c['order_id']: {'payment_status': c['to']} for c in chunk})
+            order_cache.delete(*(c['order_id'] for c in corrections))
+            for correction in corrections:
+                status_history.record(
+                    correction['order_id'], 'payment_status', correction['to'], correction['from'],
+                    source='reconciliation'
+                )
+
+        if not page.get('has_more'):
+            break
+        params['starting_after'] = intents[-1]['id']
+
+    logger.info(
+        f"Payment reconciliation {report['from']} - {report['to']}: {report['payment_intents']} intents, "
+        f"{len(report['corrections'])} corrections, {len(report['unmatched'])} unmatched"
+    )
+    return report
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Reconcile order payment statuses with Stripe")
+    parser.add_argument('--from', dest='start', required=True, type=datetime.date.fromisoformat, help="first day (UTC), YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', required=True, type=datetime.date.fromisoformat, help="last day (UTC), inclusive")
+    parser.add_argument('--dry-run', action='store_true', help="report corrections without writing them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    start = datetime.datetime.combine(args.start, datetime.time(), datetime.timezone.utc)
+    end = datetime.datetime.combine(args.end + datetime.timedelta(days=1), datetime.time(), datetime.timezone.utc)
+    report = reconcile_payments(start, end, dry_run=args.dry_run)
+    # Nothing flushes the status history buffer outside the server
+    status_history.flush()
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
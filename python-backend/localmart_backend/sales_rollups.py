@@ -0,0 +1,203 @@
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+from zoneinfo import ZoneInfo
+from pocketbase.utils import ClientResponseError
+from .config import Config
+from .pocketbase import create_admin_client
+from .timeutils import to_utc
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = 'store_daily_stats'
+ITEM_ROLLUP_COLLECTION = 'store_daily_item_stats'
+# One row per order currently counted, keyed by the order id
+COUNTED_COLLECTION = 'order_sales'
+
+def store_day(value: Any) -> str:
+    """The store-local calendar day an order belongs to, as YYYY-MM-DD"""
+    return to_utc(value).astimezone(ZoneInfo(Config.STORE_TIMEZONE)).date().isoformat()
+
+def rollup_id(*parts: str) -> str:
+    """Record id of a rollup row, derived from its key so every worker writes the same row without looking it up"""
+    return hashlib.sha1('/'.join(parts).encode()).hexdigest()[:15]
+
+def _modifiers(amounts: Dict[str, float]) -> Dict[str, float]:
+    """PocketBase number modifiers that add each amount to the stored value"""
+    return {f"{field}{'+' if amount >= 0 else '-'}": abs(amount) for field, amount in amounts.items()}
+
+# (collection, record id, key fields, amounts)
+Row = Tuple[str, str, Dict[str, Any], Dict[str, float]]
+
+class SalesRollups:
+    """
+    Per-store daily sales totals, maintained incrementally as orders change
+
+    Each (store, day) row holds gross (subtotal), tax, delivery fees and the
+    order count, and each (store, day, item) row the units sold. Orders add
+    to their day when created and are subtracted again if cancelled, so
+    dashboard stats are a sum over days rather than a scan over orders.
+
+    Rows are changed with PocketBase's `field+`/`field-` modifiers, which
+    PocketBase applies to the stored value, so workers never overwrite each
+    other's totals. Whether an order is counted is kept as a row in
+    order_sales with the order's id: creating it (or deleting it on cancel)
+    succeeds exactly once, so a retried write or two concurrent cancels
+    can't count an order twice.
+    """
+
+    def record_order(
+        self,
+        order_id: str,
+        store_id: str,
+        created: Any,
+        subtotal: float,
+        tax: float,
+        delivery_fee: float,
+        items: Iterable[Dict[str, Any]],
+        sign: int = 1
+    ) -> None:
+        """Add (sign=1) or remove (sign=-1) an order's contribution to its day, unless it already has been"""
+        units: Dict[str, int] = defaultdict(int)
+        for item in items:
+            units[item['store_item']] += int(item['quantity'])
+        day = store_day(created)
+        rows: List[Row] = [(
+            ROLLUP_COLLECTION,
+            rollup_id(store_id, day),
+            {'store': store_id, 'day': day},
+            {
+                'gross': sign * float(subtotal or 0),
+                'tax': sign * float(tax or 0),
+                'delivery_fees': sign * float(delivery_fee or 0),
+                'order_count': sign
+            }
+        )]
+        rows.extend(
+            (
+                ITEM_ROLLUP_COLLECTION,
+                rollup_id(store_id, day, item_id),
+                {'store': store_id, 'day': day, 'store_item': item_id},
+                {'units': sign * quantity}
+            )
+            for item_id, quantity in units.items() if quantity
+        )
+        try:
+            client = create_admin_client()
+            if not self._set_counted(client, order_id, sign > 0):
+                return
+            try:
+                self._apply(client, rows)
+            except Exception:
+                # Undo the mark so the order isn't recorded as counted when it wasn't
+                self._set_counted(client, order_id, sign < 0)
+                raise
+        except Exception as e:
+            # Rollups are derived data; never fail the order write because of them
+            logger.error(f"Error updating sales rollup for order {order_id}: {str(e)}")
+
+    def record_order_record(self, order: Any, sign: int = 1) -> None:
+        """Same as record_order, reading amounts and items from an expanded order record"""
+        items = [
+            {'store_item': item.store_item, 'quantity': item.quantity}
+            for item in order.expand.get('order_items_via_order', [])
+        ]
+        self.record_order(
+            order.id,
+            order.store,
+            order.created,
+            getattr(order, 'subtotal_amount', 0),
+            getattr(order, 'tax_amount', 0),
+            getattr(order, 'delivery_fee', 0),
+            items,
+            sign=sign
+        )
+
+    def _set_counted(self, client, order_id: str, counted: bool) -> bool:
+        """Mark an order as counted or not; False when it already was"""
+        records = client.client.collection(COUNTED_COLLECTION)
+        try:
+            if counted:
+                records.create({'id': order_id, 'order': order_id})
+            else:
+                records.delete(order_id)
+        except ClientResponseError as e:
+            # A taken id on create, or a missing row on delete: someone got there first
+            if (counted and e.status == 400 and 'id' in (e.data.get('data') or {})) or (not counted and e.status == 404):
+                return False
+            raise
+        return True
+
+    def _apply(self, client, rows: List[Row]) -> None:
+        """Add amounts to rollup rows, creating any that don't exist yet"""
+        try:
+            # Usually every row exists; the batch is one transaction, so if any is
+            # missing nothing was applied and the rows can be retried one by one
+            client.client.send('/api/batch', {'method': 'POST', 'body': {'requests': [
+                {'method': 'PATCH', 'url': f'/api/collections/{collection}/records/{record_id}', 'body': _modifiers(amounts)}
+                for collection, record_id, _, amounts in rows
+            ]}})
+            return
+        except ClientResponseError:
+            pass
+        for row in rows:
+            self._apply_row(client, *row)
+
+    def _apply_row(self, client, collection: str, record_id: str, key: Dict[str, Any], amounts: Dict[str, float]) -> None:
+        records = client.client.collection(collection)
+        try:
+            records.update(record_id, _modifiers(amounts))
+            return
+        except ClientResponseError as e:
+            if e.status != 404:
+                raise
+        try:
+            records.create({'id': record_id, **key, **amounts})
+        except ClientResponseError as e:
+            # Another worker created the row in the meantime
+            if e.status != 400 or 'id' not in (e.data.get('data') or {}):
+                raise
+            records.update(record_id, _modifiers(amounts))
+
+    def stats(self, store_id: str, start_day: str, end_day: str, top: int = 10) -> Dict[str, Any]:
+        """Totals, a per-day series and best sellers for an inclusive day range"""
+        client = create_admin_client()
+        day_filter = f'store = "{store_id}" && day >= "{start_day}" && day <= "{end_day}"'
+        rows = client.get_full_list(ROLLUP_COLLECTION, query_params={"filter": day_filter, "sort": "day"})
+        item_rows = client.get_full_list(
+            ITEM_ROLLUP_COLLECTION,
+            query_params={"filter": day_filter, "fields": "store_item,units"}
+        )
+
+        totals = {'gross': 0.0, 'tax': 0.0, 'delivery_fees': 0.0, 'order_count': 0}
+        days: List[Dict[str, Any]] = []
+        for row in rows:
+            day = {
+                'day': row.day,
+                'gross': round(row.gross or 0, 2),
+                'tax': round(row.tax or 0, 2),
+                'delivery_fees': round(row.delivery_fees or 0, 2),
+                'order_count': row.order_count or 0
+            }
+            days.append(day)
+            for key in totals:
+                totals[key] += day[key]
+
+        units: Dict[str, int] = defaultdict(int)
+        for row in item_rows:
+            units[row.store_item] += int(row.units or 0)
+        units = {item_id: quantity for item_id, quantity in units.items() if quantity}
+
+        for key in ('gross', 'tax', 'delivery_fees'):
+            totals[key] = round(totals[key], 2)
+        totals['units'] = sum(units.values())
+
+        best_sellers = sorted(units.items(), key=lambda pair: pair[1], reverse=True)[:top]
+        return {
+            'totals': totals,
+            'days': days,
+            'top_items': [{'store_item': item_id, 'units': quantity} for item_id, quantity in best_sellers]
+        }
+
+sales_rollups = SalesRollups()
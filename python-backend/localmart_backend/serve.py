@@ -0,0 +1,32 @@
+import importlib.util
+import os
+import shutil
+import uuid
+import uvicorn
+from .config import Config
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def main() -> None:
+    """Production entry point: a supervised pool of workers, no reload"""
+    # Workers of one run share this id so shared state (the slot index) is rebuilt once
+    os.environ['LOCALMART_SERVE_ID'] = uuid.uuid4().hex
+    if Config.WORKERS > 1 and not Config.METRICS_DIR:
+        # Workers combine their metrics through snapshots here; drop earlier runs'
+        metrics_root = os.path.join(Config.DATA_DIR, 'metrics')
+        shutil.rmtree(metrics_root, ignore_errors=True)
+        os.environ['LOCALMART_METRICS_DIR'] = os.path.join(metrics_root, os.environ['LOCALMART_SERVE_ID'])
+    uvicorn.run(
+        'localmart_backend.main:app',
+        host=Config.HOST,
+        port=Config.PORT,
+        workers=Config.WORKERS,
+        loop='uvloop' if _installed('uvloop') else 'asyncio',
+        http='httptools' if _installed('httptools') else 'h11',
+        proxy_headers=True,
+        forwarded_allow_ips=Config.FORWARDED_ALLOW_IPS,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+class SingleFlight:
+    """
+    Lets concurrent identical calls share one execution and its outcome
+
+    The first caller for a key runs the function; callers that arrive while
+    it is running wait for it and receive the same result or exception.
+    Nothing is cached: a call that starts after the flight has landed runs
+    again.
+
+    Results are often mutable (PocketBase records), so when a flight is
+    shared every caller gets its own deep copy and none can change what
+    another sees. An unshared result is returned as is.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(result, shared): shared is True when the result came from another caller's flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                followers = flight.followers
+            flight.done.set()
+        # Followers copy flight.result, so the leader must not get that same object
+        return (copy.deepcopy(flight.result) if followers else flight.result), False
+
+    def in_flight(self) -> int:
+        return len(self._flights)
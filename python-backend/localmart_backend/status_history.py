@@ -0,0 +1,147 @@
+import asyncio
+import datetime
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from .config import Config
+from .pocketbase import create_admin_client
+from .timeutils import to_utc
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLLECTION = 'order_status_updates'
+
+class StatusHistory:
+    """
+    Append-only log of order status and payment_status transitions
+
+    Transitions are buffered in memory and written to `order_status_updates`
+    in batches by a background task, so recording one costs the write path
+    nothing but a list append. Buffered entries are merged into timeline
+    reads, so a transition is visible before it has been flushed.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = Config.STATUS_HISTORY_FLUSH_SECONDS,
+        max_pending: int = Config.STATUS_HISTORY_MAX_PENDING
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def record(self, order_id: str, field: str, to_value: str, from_value: Optional[str] = None, source: str = 'api') -> None:
+        """Queue one transition of an order's status or payment_status"""
+        if from_value == to_value:
+            return
+        entry = {
+            'order': order_id,
+            'status': to_value,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'details': {'field': field, 'from': from_value, 'source': source}
+        }
+        with self._lock:
+            self._pending.append(entry)
+            self._trim()
+            full = len(self._pending) >= Config.POCKETBASE_BATCH_SIZE
+        # Transitions are also recorded from worker threads
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Don't lose what is still buffered, but don't hold up the rest of shutdown either
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            with self._lock:
+                lost = len(self._pending)
+            logger.error(f"Order status history flush on shutdown failed, dropping {lost} transitions: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Order status history flush error: {str(e)}")
+
+    def flush(self) -> int:
+        """Write buffered transitions; failed batches are put back for the next flush"""
+        if not self._pending:
+            return 0
+        client = create_admin_client()
+        with self._lock:
+            entries, self._pending = self._pending, []
+
+        written = 0
+        for start in range(0, len(entries), Config.POCKETBASE_BATCH_SIZE):
+            chunk = entries[start:start + Config.POCKETBASE_BATCH_SIZE]
+            try:
+                client.batch_create(HISTORY_COLLECTION, chunk)
+                written += len(chunk)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = entries[start:]
+                    self._trim()
+                raise
+        return written
+
+    def _trim(self) -> None:
+        """Drop the oldest buffered transitions beyond max_pending, e.g. while PocketBase is down; call with the lock held"""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            logger.error(f"Order status history buffer full, dropped the {excess} oldest transitions")
+
+    def timeline(self, order_id: str) -> List[Dict[str, Any]]:
+        """Every recorded transition of an order, oldest first"""
+        rows = create_admin_client().get_full_list(
+            HISTORY_COLLECTION,
+            query_params={
+                "filter": f'order = "{order_id}"',
+                "sort": "timestamp,created",
+                "fields": "status,timestamp,details"
+            }
+        )
+        events = [
+            {'status': row.status, 'timestamp': to_utc(row.timestamp).isoformat(), 'details': row.details or {}}
+            for row in rows
+        ]
+        with self._lock:
+            events.extend(
+                {'status': e['status'], 'timestamp': e['timestamp'], 'details': e['details']}
+                for e in self._pending if e['order'] == order_id
+            )
+
+        return [
+            {
+                'field': event['details'].get('field', 'status'),
+                'from': event['details'].get('from'),
+                'to': event['status'],
+                'at': event['timestamp'],
+                'source': event['details'].get('source')
+            }
+            for event in events
+        ]
+
+status_history = StatusHistory()
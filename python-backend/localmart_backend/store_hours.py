@@ -0,0 +1,135 @@
+import bisect
+import datetime
+import logging
+import re
+from typing import Any, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_TIME_RE = re.compile(r'^\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*$', re.IGNORECASE)
+
+def _day_index(key: str) -> Optional[int]:
+    """Map 'Monday', 'mon' or 'MON' to 0..6"""
+    key = key.strip().lower()
+    for index, name in enumerate(DAY_NAMES):
+        if key == name or key == name[:3]:
+            return index
+    return None
+
+def _parse_time(value: str) -> int:
+    """Parse '8', '08:30', '9pm' or '21:00' into minutes after midnight"""
+    match = _TIME_RE.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid time: {value}")
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    meridiem = (match.group(3) or '').lower()
+    if meridiem == 'pm' and hour != 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    if hour > 24 or minute > 59:
+        raise ValueError(f"Invalid time: {value}")
+    return hour * 60 + minute
+
+def _day_ranges(value: Any) -> List[Tuple[int, int]]:
+    """
+    Normalise one day's hours to (open, close) minute pairs
+
+    Accepts "08:00-21:00", {"open": "08:00", "close": "21:00"}, a list of
+    either, or a falsy/"closed" value.
+    """
+    if not value or (isinstance(value, str) and value.strip().lower() == 'closed'):
+        return []
+    if isinstance(value, list):
+        ranges = []
+        for part in value:
+            ranges.extend(_day_ranges(part))
+        return ranges
+    if isinstance(value, dict):
+        if value.get('closed'):
+            return []
+        return [(_parse_time(value['open']), _parse_time(value['close']))]
+    opens, closes = str(value).split('-', 1)
+    return [(_parse_time(opens), _parse_time(closes))]
+
+class WeeklyHours:
+    """
+    A store's opening hours as sorted minute-of-week intervals
+
+    Intervals are half-open [start, end) and never overlap, so membership is a
+    single binary search. Ranges that run past midnight are split across days.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int]], timezone: str = Config.STORE_TIMEZONE):
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+        self.tz = ZoneInfo(timezone)
+
+    @classmethod
+    def parse(cls, hours: Any, timezone: str = Config.STORE_TIMEZONE) -> Optional['WeeklyHours']:
+        """Build from the `hours` JSON on a store; returns None if there is none"""
+        if not hours or not isinstance(hours, dict):
+            return None
+        intervals = []
+        for key, value in hours.items():
+            day = _day_index(key)
+            if day is None:
+                continue
+            for opens, closes in _day_ranges(value):
+                start = day * MINUTES_PER_DAY + opens
+                end = day * MINUTES_PER_DAY + closes
+                if closes <= opens:
+                    # Overnight: runs into the next day
+                    end += MINUTES_PER_DAY
+                if end > MINUTES_PER_WEEK:
+                    intervals.append((start, MINUTES_PER_WEEK))
+                    intervals.append((0, end - MINUTES_PER_WEEK))
+                else:
+                    intervals.append((start, end))
+        if not intervals:
+            return None
+        return cls(intervals, timezone)
+
+    def _minute_of_week(self, when: datetime.datetime) -> int:
+        # Naive datetimes are taken to be in the store's local time
+        local = when.astimezone(self.tz) if when.tzinfo else when
+        return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+    def is_open_at(self, when: datetime.datetime) -> bool:
+        """Whether the store is open at the given moment"""
+        minute = self._minute_of_week(when)
+        index = bisect.bisect_right(self.starts, minute) - 1
+        return index >= 0 and minute < self.ends[index]
+
+    def is_open_now(self) -> bool:
+        return self.is_open_at(datetime.datetime.now(datetime.timezone.utc))
+
+def parse_store_hours(store: Any) -> Optional[WeeklyHours]:
+    """Parse a store record's hours, logging and ignoring malformed data"""
+    try:
+        return WeeklyHours.parse(getattr(store, 'hours', None))
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Ignoring malformed hours for store {getattr(store, 'id', '')}: {str(e)}")
+        return None
+
+def open_filter_time(open_now: bool, open_at: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """The moment to filter stores by, if an open_now/open_at filter was requested"""
+    if open_at is not None:
+        return open_at
+    if open_now:
+        return datetime.datetime.now(datetime.timezone.utc)
+    return None
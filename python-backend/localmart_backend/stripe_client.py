@@ -0,0 +1,46 @@
+import logging
+from typing import Mapping, Optional
+import stripe
+from . import deadlines
+from .circuit_breaker import CircuitOpenError, breakers, healthy_response
+from .config import Config
+from .metrics import path_operation, track
+
+logger = logging.getLogger(__name__)
+
+class InstrumentedStripeClient(stripe.RequestsClient):
+    """Stripe's default HTTP client, recording metrics for every API call and failing fast while Stripe is down"""
+
+    def __init__(self, timeout: float = Config.STRIPE_TIMEOUT_SECONDS, **kwargs):
+        super().__init__(timeout=timeout, **kwargs)
+
+    # RequestsClient reads self._timeout for every request; shorten it to the request's remaining deadline
+    @property
+    def _timeout(self) -> float:
+        return deadlines.timeout(self._timeout_cap)
+
+    @_timeout.setter
+    def _timeout(self, value: float) -> None:
+        self._timeout_cap = value
+
+    def request(self, method: str, url: str, headers: Optional[Mapping[str, str]], post_data=None):
+        path = url.split('://', 1)[-1].split('/', 1)[-1].split('?', 1)[0]
+        try:
+            with breakers['stripe'].guard() as guard, track('stripe', f'{method.upper()} {path_operation(path)}') as call:
+                call['sent'] = len(post_data) if post_data else 0
+                content, status_code, response_headers = super().request(method, url, headers, post_data)
+                call['ok'] = status_code < 400
+                call['received'] = len(content)
+                guard['ok'] = healthy_response(status_code)
+                return content, status_code, response_headers
+        except CircuitOpenError as e:
+            # Surfaces through the SDK like any other connection failure, and is never retried
+            raise stripe.error.APIConnectionError(str(e), should_retry=False)
+
+def configure_stripe() -> None:
+    """Point the Stripe SDK at the configured key, API base and instrumented client"""
+    stripe.api_key = Config.STRIPE_SECRET_KEY
+    if Config.STRIPE_API_BASE:
+        stripe.api_base = Config.STRIPE_API_BASE
+    if not isinstance(stripe.default_http_client, InstrumentedStripeClient):
+        stripe.default_http_client = InstrumentedStripeClient()
@@ -0,0 +1,21 @@
+import datetime
+from typing import Any
+
+def to_utc(value: Any) -> datetime.datetime:
+    """
+    Normalise a PocketBase or ISO 8601 timestamp to an aware UTC datetime
+
+    PocketBase returns naive UTC datetimes for created/updated (or the raw
+    string if it can't parse them) and "YYYY-MM-DD HH:MM:SS.sssZ" strings for
+    date fields.
+    """
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.strip().replace('Z', '+00:00').replace(' ', 'T'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+def to_pocketbase(value: Any) -> str:
+    """Format a timestamp the way PocketBase stores it, for use in filters"""
+    value = to_utc(value)
+    return value.strftime('%Y-%m-%d %H:%M:%S.') + f"{value.microsecond // 1000:03d}Z"
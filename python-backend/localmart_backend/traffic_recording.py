@@ -0,0 +1,212 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Query parameters whose values are kept verbatim; anything else is hashed
+PLAIN_QUERY_PARAMS = {
+    'open_now', 'open_at', 'include', 'format', 'gzip', 'dry_run', 'from', 'to', 'start', 'end', 'page', 'perPage'
+}
+
+# Largest JSON body whose shape is recorded
+MAX_SHAPE_BYTES = 64 * 1024
+
+class Anonymizer:
+    """Replaces identifiers with stable keyed hashes, so repeat visits stay recognisable"""
+
+    def __init__(self, salt: Optional[str] = None):
+        self._key = (salt or os.urandom(16).hex()).encode()
+
+    def hash(self, value: Any) -> str:
+        return hmac.new(self._key, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def shape(self, value: Any, key: str = '') -> Any:
+        """
+        The structure of a JSON value without its content
+
+        Objects keep their keys, lists become their length (or the shapes of
+        their items when those are objects), ids become hashes, booleans and
+        nulls are kept and every other scalar becomes its type name.
+        """
+        if isinstance(value, dict):
+            return {k: self.shape(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            if value and all(isinstance(item, dict) for item in value):
+                return [self.shape(item) for item in value]
+            if key.endswith('_ids'):
+                return [self.hash(item) for item in value]
+            return len(value)
+        if isinstance(value, str) and (key == 'id' or key.endswith('_id')):
+            return self.hash(value)
+        if isinstance(value, bool) or value is None:
+            return value
+        return type(value).__name__
+
+def token_subject(authorization: Optional[str]) -> Optional[str]:
+    """The user id in a bearer token, read without verifying it"""
+    if not authorization or not authorization.startswith('Bearer '):
+        return None
+    try:
+        payload = authorization.split(' ', 1)[1].split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('id')
+    except Exception:
+        return None
+
+class TrafficRecorder:
+    """
+    Opt-in log of request shapes and timings for replaying real traffic
+
+    Each request becomes one NDJSON line with its route template, hashed ids,
+    body shape and size, auth class, status and duration. Names, addresses,
+    emails and amounts are never written. Lines are buffered and appended to
+    the file by a background task.
+    """
+
+    def __init__(
+        self,
+        path: str = Config.TRAFFIC_RECORD_PATH,
+        sample_rate: float = Config.TRAFFIC_RECORD_SAMPLE_RATE,
+        max_bytes: int = Config.TRAFFIC_RECORD_MAX_BYTES,
+        flush_interval: float = 1.0
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.anonymizer = Anonymizer(Config.TRAFFIC_RECORD_SALT)
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._full = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self._full
+
+    def sampled(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def entry(self, request, body: Optional[bytes], status: int, seconds: float, response_bytes: Optional[int]) -> Dict[str, Any]:
+        """The anonymised record of one handled request"""
+        route = request.scope.get('route')
+        subject = token_subject(request.headers.get('authorization'))
+        entry: Dict[str, Any] = {
+            'ts': round(time.time(), 3),
+            'm': request.method,
+            'r': getattr(route, 'path', 'unmatched'),
+            'a': 'user' if subject else ('invalid' if request.headers.get('authorization') else 'anonymous'),
+            's': status,
+            'ms': round(seconds * 1000, 2),
+        }
+        if subject:
+            entry['u'] = self.anonymizer.hash(subject)
+        path_params = request.scope.get('path_params') or {}
+        if path_params:
+            entry['p'] = {name: self.anonymizer.hash(value) for name, value in path_params.items()}
+        if request.query_params:
+            entry['q'] = {
+                name: value if name in PLAIN_QUERY_PARAMS else self.anonymizer.hash(value)
+                for name, value in request.query_params.items()
+            }
+        length = request.headers.get('content-length')
+        if length:
+            entry['b'] = int(length)
+        if body:
+            try:
+                entry['j'] = self.anonymizer.shape(json.loads(body))
+            except ValueError:
+                pass
+        if response_bytes is not None:
+            entry['rb'] = response_bytes
+        return entry
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._pending.append(line)
+
+    def start(self) -> None:
+        if self.path and self._task is None:
+            logger.info(f"Recording traffic to {self.path} (sample rate {self.sample_rate})")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Traffic recording flush error: {str(e)}")
+
+    def flush(self) -> int:
+        """Append buffered lines to the log; stops recording once it reaches max_bytes"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A single O_APPEND write per flush keeps lines from several worker processes intact
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, ''.join(lines).encode('utf-8'))
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.max_bytes and not self._full:
+            self._full = True
+            logger.warning(f"Traffic recording stopped: {self.path} reached {size} bytes")
+        return len(lines)
+
+traffic_recorder = TrafficRecorder()
+
+async def recording_middleware(request, call_next):
+    """Record the shape and timing of a sample of requests (only installed when recording is enabled)"""
+    if not traffic_recorder.sampled():
+        return await call_next(request)
+
+    body = None
+    length = request.headers.get('content-length')
+    if length and int(length) <= MAX_SHAPE_BYTES and 'json' in request.headers.get('content-type', ''):
+        # Starlette replays the body to the handler once it has been read here
+        body = await request.body()
+
+    started = time.perf_counter()
+    status = 500
+    response = None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        response_bytes = None
+        if response is not None and response.headers.get('content-length'):
+            response_bytes = int(response.headers['content-length'])
+        try:
+            traffic_recorder.record(
+                traffic_recorder.entry(request, body, status, time.perf_counter() - started, response_bytes)
+            )
+        except Exception as e:
+            logger.error(f"Could not record request: {str(e)}")
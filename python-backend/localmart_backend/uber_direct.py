@@ -1,11 +1,42 @@
+import asyncio
+import hashlib
 import json
+import time
 import httpx
 import logging
 import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
+from .cache import TieredCache
+from .circuit_breaker import AsyncBreakerTransport, breakers, circuit_fallbacks, healthy_response
+from .config import Config
+from .deadlines import AsyncDeadlineTransport
+from .hedging import hedger
+from .metrics import AsyncInstrumentedTransport
 
 logger = logging.getLogger(__name__)
 
+# Recent quotes, answered again while Uber is unavailable
+quote_cache = TieredCache('uber.quotes', Config.QUOTE_CACHE_SECONDS)
+
+def _quote_key(pickup_address: Dict, dropoff_address: Dict, lead: datetime.timedelta, item_price_cents: int) -> str:
+    """Same route and manifest, with pickup a similar time ahead (to the quarter hour)"""
+    route = json.dumps([pickup_address, dropoff_address, item_price_cents], sort_keys=True, default=str)
+    return f"{hashlib.sha256(route.encode()).hexdigest()}:{round(lead.total_seconds() / 900)}"
+
+def _cached_quote(key: str) -> Optional[Dict]:
+    """A cached quote with its ETA moved forward by the time since it was quoted"""
+    cached = quote_cache.get(key)
+    if cached is None:
+        return None
+    quote = dict(cached['quote'], cached=True)
+    if quote.get('dropoff_eta'):
+        try:
+            eta = datetime.datetime.fromisoformat(quote['dropoff_eta'].replace('Z', '+00:00'))
+            quote['dropoff_eta'] = (eta + datetime.timedelta(seconds=time.time() - cached['quoted_at'])).isoformat()
+        except ValueError:
+            pass
+    return quote
+
 class UberDirectClient:
     """Client for interacting with the Uber Direct API"""
     
@@ -13,13 +44,43 @@ class UberDirectClient:
         self.customer_id = customer_id
         self.client_id = client_id
         self.client_secret = client_secret
-        self.base_url = "https://api.uber.com/v1"
-        self.auth_url = "https://auth.uber.com/oauth/v2/token"
+        self.base_url = Config.UBER_API_BASE
+        self.auth_url = Config.UBER_AUTH_URL
+        self._access_token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        # Caps concurrent quote calls across all requests to stay under Uber's rate limit
+        self._quote_slots = asyncio.Semaphore(Config.UBER_MAX_CONCURRENT_QUOTES)
+
+    def _http(self) -> httpx.AsyncClient:
+        """Shared connection pool for all Uber calls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=Config.UBER_TIMEOUT_SECONDS,
+                transport=AsyncBreakerTransport(
+                    breakers['uber'],
+                    AsyncInstrumentedTransport('uber', transport=AsyncDeadlineTransport(Config.UBER_TIMEOUT_SECONDS))
+                )
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def _get_access_token(self) -> str:
-        """Get OAuth access token from Uber"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        """Get OAuth access token from Uber, reusing it until shortly before it expires"""
+        if self._access_token and time.monotonic() < self._token_expires_at:
+            return self._access_token
+
+        async with self._token_lock:
+            # Another caller may have refreshed it while we waited
+            if self._access_token and time.monotonic() < self._token_expires_at:
+                return self._access_token
+
+            response = await self._http().post(
                 self.auth_url,
                 data={
                     'client_id': self.client_id,
@@ -29,7 +90,16 @@ class UberDirectClient:
                 }
             )
             data = response.json()
-            return data['access_token']
+            self._access_token = data['access_token']
+            self._token_expires_at = time.monotonic() + max(0, int(data.get('expires_in', 3600)) - 300)
+            return self._access_token
+
+    async def warm(self) -> bool:
+        """Fetch the access token ahead of the first quote; False when no credentials are configured"""
+        if not (self.client_id and self.client_secret):
+            return False
+        await self._get_access_token()
+        return True
 
     async def get_delivery_quote(
         self,
@@ -41,34 +111,99 @@ class UberDirectClient:
         dropoff_deadline: datetime.datetime,
         item_price_cents: int
     ) -> Dict:
-        """Get a delivery quote from Uber Direct"""
+        """
+        Get a delivery quote from Uber Direct
+
+        If Uber can't be reached, a recent quote for the same route and
+        manifest is returned instead, marked with `cached: True`.
+        """
+        key = _quote_key(
+            pickup_address,
+            dropoff_address,
+            pickup_ready - datetime.datetime.now(pickup_ready.tzinfo),
+            item_price_cents
+        )
+        try:
+            quote = await self._fetch_quote(
+                pickup_address, dropoff_address, pickup_ready, pickup_deadline,
+                dropoff_ready, dropoff_deadline, item_price_cents
+            )
+        except (httpx.TransportError, ConnectionError) as e:
+            # Also covers CircuitOpenError, so an open circuit answers from the cache in microseconds
+            cached = _cached_quote(key)
+            if cached is None:
+                raise
+            logger.warning(f"Serving cached delivery quote: {str(e)}")
+            circuit_fallbacks.inc('uber', 'cached_quote')
+            return cached
+        quote_cache.set(key, {'quote': quote, 'quoted_at': time.time()})
+        return quote
+
+    async def _fetch_quote(
+        self,
+        pickup_address: Dict,
+        dropoff_address: Dict,
+        pickup_ready: datetime.datetime,
+        pickup_deadline: datetime.datetime,
+        dropoff_ready: datetime.datetime,
+        dropoff_deadline: datetime.datetime,
+        item_price_cents: int
+    ) -> Dict:
         access_token = await self._get_access_token()
+
+        # Quotes have no side effects, so a slow one is hedged with a second request
+        response = await hedger.call_async('uber', 'delivery_quotes', '', lambda: self._http().post(
+            f'{self.base_url}/customers/{self.customer_id}/delivery_quotes',
+            headers={
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                "pickup_address": json.dumps(pickup_address),
+                "dropoff_address": json.dumps(dropoff_address),
+                "pickup_ready_dt": pickup_ready.isoformat(),
+                "pickup_deadline_dt": pickup_deadline.isoformat(),
+                "dropoff_ready_dt": dropoff_ready.isoformat(),
+                "dropoff_deadline_dt": dropoff_deadline.isoformat(),
+                "manifest_total_value": item_price_cents,
+                "pickup_phone_number": "+15555555555",
+                "dropoff_phone_number": "+15555555555"
+            }
+        ))
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f'{self.base_url}/customers/{self.customer_id}/delivery_quotes',
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    "pickup_address": json.dumps(pickup_address),
-                    "dropoff_address": json.dumps(dropoff_address),
-                    "pickup_ready_dt": pickup_ready.isoformat(),
-                    "pickup_deadline_dt": pickup_deadline.isoformat(),
-                    "dropoff_ready_dt": dropoff_ready.isoformat(),
-                    "dropoff_deadline_dt": dropoff_deadline.isoformat(),
-                    "manifest_total_value": item_price_cents,
-                    "pickup_phone_number": "+15555555555",
-                    "dropoff_phone_number": "+15555555555"
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Uber API error: {response.text}")
-                raise Exception("Failed to get delivery quote from Uber")
-            
-            return response.json()
+        if not healthy_response(response.status_code):
+            logger.error(f"Uber API error: {response.text}")
+            raise ConnectionError("Uber could not quote the delivery")
+        if response.status_code != 200:
+            logger.error(f"Uber API error: {response.text}")
+            raise Exception("Failed to get delivery quote from Uber")
+        
+        return response.json()
+
+    async def get_delivery_quotes(
+        self,
+        pickup_address: Dict,
+        dropoff_address: Dict,
+        windows: List[Dict[str, datetime.datetime]],
+        item_price_cents: int
+    ) -> List[Union[Dict, Exception]]:
+        """Quote several delivery windows concurrently; failed windows are returned as exceptions"""
+        # Fetch the token once up front so concurrent quotes don't race to refresh it
+        try:
+            await self._get_access_token()
+        except (httpx.TransportError, ConnectionError):
+            pass  # each window falls back to its cached quote on its own
+
+        async def quote(window: Dict[str, datetime.datetime]) -> Dict:
+            async with self._quote_slots:
+                return await self.get_delivery_quote(
+                    pickup_address=pickup_address,
+                    dropoff_address=dropoff_address,
+                    item_price_cents=item_price_cents,
+                    **window
+                )
+
+        return await asyncio.gather(*(quote(window) for window in windows), return_exceptions=True)
 
     async def create_delivery(
         self,
@@ -79,50 +214,69 @@ class UberDirectClient:
         dropoff_ready: str,
         dropoff_deadline: str,
         total_amount: float,
-        manifest_items: List[Dict]
+        manifest_items: List[Dict],
+        external_id: Optional[str] = None
     ) -> Dict:
         """Create a new delivery in Uber Direct"""
         access_token = await self._get_access_token()
+
+        optional_fields = {}
+        if external_id:
+            optional_fields['external_id'] = external_id
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f'{self.base_url}/customers/{self.customer_id}/deliveries',
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'pickup_address': json.dumps(pickup_address),
-                    'dropoff_address': json.dumps(dropoff_address),
-                    'pickup_ready_dt': pickup_ready,
-                    'pickup_deadline_dt': pickup_deadline,
-                    'dropoff_ready_dt': dropoff_ready,
-                    'dropoff_deadline_dt': dropoff_deadline,
-                    'manifest_total_value': int(total_amount * 100),
-                    'pickup_phone_number': '+15555555555',
-                    'dropoff_phone_number': '+15555555555',
-                    'manifest_items': manifest_items
-                }
-            )
+        response = await self._http().post(
+            f'{self.base_url}/customers/{self.customer_id}/deliveries',
+            headers={
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                **optional_fields,
+                'pickup_address': json.dumps(pickup_address),
+                'dropoff_address': json.dumps(dropoff_address),
+                'pickup_ready_dt': pickup_ready,
+                'pickup_deadline_dt': pickup_deadline,
+                'dropoff_ready_dt': dropoff_ready,
+                'dropoff_deadline_dt': dropoff_deadline,
+                'manifest_total_value': int(total_amount * 100),
+                'pickup_phone_number': '+15555555555',
+                'dropoff_phone_number': '+15555555555',
+                'manifest_items': manifest_items
+            }
+        )
 
-            if response.status_code != 200:
-                logger.error(f"Uber API error: {response.text}")
-                raise Exception(f"Failed to create Uber delivery: {response.text}")
-            
-            return response.json()
+        if response.status_code != 200:
+            logger.error(f"Uber API error: {response.text}")
+            raise Exception(f"Failed to create Uber delivery: {response.text}")
+        
+        return response.json()
 
     async def get_delivery_status(self, delivery_id: str) -> Dict:
         """Get the status of a delivery from Uber Direct"""
         access_token = await self._get_access_token()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f'{self.base_url}/customers/{self.customer_id}/deliveries/{delivery_id}',
-                headers={'Authorization': f'Bearer {access_token}'}
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Uber API error: {response.text}")
-                raise Exception("Failed to get delivery status from Uber")
-            
-            return response.json() 
\ No newline at end of file
+        response = await self._http().get(
+            f'{self.base_url}/customers/{self.customer_id}/deliveries/{delivery_id}',
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"Uber API error: {response.text}")
+            raise Exception("Failed to get delivery status from Uber")
+        
+        return response.json() 
+
+    async def cancel_delivery(self, delivery_id: str) -> Dict:
+        """Cancel a delivery in Uber Direct"""
+        access_token = await self._get_access_token()
+
+        response = await self._http().post(
+            f'{self.base_url}/customers/{self.customer_id}/deliveries/{delivery_id}/cancel',
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+
+        if response.status_code != 200:
+            logger.error(f"Uber API error: {response.text}")
+            raise Exception(f"Failed to cancel Uber delivery: {response.text}")
+
+        return response.json()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from .catalog import catalog
+from .delivery_slots import slot_book
+from .pocketbase import create_admin_client
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Awaitable[object]]
+
+class Warmup:
+    """
+    Background task that fills connection pools and caches after startup
+
+    Required steps are retried with backoff until they succeed; the instance
+    reports ready (see /readyz) once all of them have. Optional steps are
+    tried once and only logged on failure, so a slow third party can't keep
+    the instance out of rotation.
+    """
+
+    def __init__(self, backoff: Tuple[float, ...] = (1, 2, 5, 10, 30)):
+        self.backoff = backoff
+        self.steps: Dict[str, str] = {}
+        self.ready = False
+        self.started_at = 0.0
+        self.ready_after: Optional[float] = None
+        self._required: List[Tuple[str, Step]] = []
+        self._optional: List[Tuple[str, Step]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    def add(self, name: str, step: Step, required: bool = True) -> None:
+        (self._required if required else self._optional).append((name, step))
+        self.steps[name] = 'pending'
+
+    def start(self) -> None:
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._background):
+            task.cancel()
+
+    async def _attempt(self, name: str, step: Step) -> bool:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            # The error only goes to the log; /readyz is public
+            self.steps[name] = 'failed'
+            logger.warning(f"Warmup step {name} failed: {str(e)}")
+            return False
+        self.steps[name] = 'ok'
+        logger.info(f"Warmup step {name} took {(time.perf_counter() - started) * 1000:.0f}ms")
+        return True
+
+    async def _run(self) -> None:
+        for name, step in self._optional:
+            task = asyncio.create_task(self._attempt(name, step))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        pending = list(self._required)
+        attempt = 0
+        while pending:
+            pending = [(name, step) for name, step in pending if not await self._attempt(name, step)]
+            if pending:
+                await asyncio.sleep(self.backoff[min(attempt, len(self.backoff) - 1)])
+                attempt += 1
+
+        self.ready = True
+        self.ready_after = time.monotonic() - self.started_at
+        logger.info(f"Ready after {self.ready_after:.2f}s")
+
+    def status(self) -> Dict[str, object]:
+        return {'ready': self.ready, 'steps': dict(self.steps)}
+
+warmup = Warmup()
+
+# The admin token and the first pooled PocketBase connection come first;
+# the catalog and slot index reuse both
+warmup.add('pocketbase', lambda: asyncio.to_thread(create_admin_client))
+warmup.add('catalog', lambda: asyncio.to_thread(catalog.stores))
+warmup.add('delivery_slots', lambda: asyncio.to_thread(slot_book.ensure_loaded))
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from .cache import TTLCache
+from .config import Config
+from .order_cache import order_cache
+from .pocketbase import create_admin_client
+from .status_history import status_history
+
+logger = logging.getLogger(__name__)
+
+# Stripe event type -> order payment_status it implies
+PAYMENT_STATUS_BY_EVENT = {
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'failed',
+}
+
+class WebhookQueue:
+    """
+    Durable local queue of Stripe events, keyed by Stripe event id
+
+    Events are stored in SQLite so they survive a restart between the ack and
+    processing. The primary key on the event id makes redelivered events a
+    no-op, including ones that were already processed.
+    """
+
+    def __init__(self, path: str = Config.WEBHOOK_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS stripe_events (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    received_at REAL NOT NULL,
+                    processed_at REAL,
+                    error TEXT
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_stripe_events_pending '
+                'ON stripe_events (status, next_attempt_at)'
+            )
+            # The newest event applied to each payment intent, so a retried or
+            # late older event can't overwrite a newer status
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS applied_intents (
+                    payment_intent TEXT PRIMARY KEY,
+                    event_id TEXT NOT NULL,
+                    created INTEGER NOT NULL,
+                    payment_status TEXT NOT NULL,
+                    applied_at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, event_id: str, event_type: str, payload: str) -> bool:
+        """Persist an event; returns False if it was already queued or processed"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                'INSERT OR IGNORE INTO stripe_events (id, type, payload, next_attempt_at, received_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (event_id, event_type, payload, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, limit: int, lease_seconds: float = 60) -> List[Dict[str, Any]]:
+        """
+        Pending events that are due, oldest first
+
+        Claimed events are hidden from other workers for lease_seconds, after
+        which they are retried if they were neither marked done nor rescheduled.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._connection().execute(
+                'UPDATE stripe_events SET next_attempt_at = ? WHERE id IN ('
+                'SELECT id FROM stripe_events WHERE status = ? AND next_attempt_at <= ? ORDER BY received_at LIMIT ?'
+                ') RETURNING id, type, payload, attempts, received_at',
+                (now + lease_seconds, 'pending', now, limit)
+            ).fetchall()
+        rows.sort(key=lambda row: row[4])
+        return [
+            {'id': row[0], 'type': row[1], 'event': json.loads(row[2]), 'attempts': row[3]}
+            for row in rows
+        ]
+
+    def mark_done(self, event_ids: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().executemany(
+                'UPDATE stripe_events SET status = ?, processed_at = ?, error = NULL WHERE id = ?',
+                [('done', now, event_id) for event_id in event_ids]
+            )
+
+    def retry_later(self, events: Iterable[Dict[str, Any]], error: str) -> None:
+        """Back off exponentially; give up after the configured number of attempts"""
+        now = time.time()
+        updates = []
+        for event in events:
+            attempts = event['attempts'] + 1
+            status = 'failed' if attempts >= Config.WEBHOOK_MAX_ATTEMPTS else 'pending'
+            updates.append((status, attempts, now + min(2 ** attempts, 300), error, event['id']))
+        with self._lock:
+            self._connection().executemany(
+                'UPDATE stripe_events SET status = ?, attempts = ?, next_attempt_at = ?, error = ? WHERE id = ?',
+                updates
+            )
+
+    def claim_intents(self, events: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Record events as the newest applied to their payment intents
+
+        events maps payment intent -> event. Returns the intents whose event
+        is newer than the one already recorded (or is that same event being
+        retried); the others have been superseded and must not be applied.
+        """
+        now = time.time()
+        claimed = []
+        with self._lock:
+            conn = self._connection()
+            for payment_intent, event in events.items():
+                row = conn.execute(
+                    'INSERT INTO applied_intents (payment_intent, event_id, created, payment_status, applied_at) '
+                    'VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (payment_intent) DO UPDATE SET event_id = excluded.event_id, '
+                    'created = excluded.created, payment_status = excluded.payment_status, applied_at = excluded.applied_at '
+                    'WHERE excluded.event_id = event_id OR excluded.created > created '
+                    "OR (excluded.created = created AND excluded.payment_status = 'succeeded' AND payment_status != 'succeeded') "
+                    'RETURNING payment_intent',
+                    (payment_intent, event['id'], event_created(event), PAYMENT_STATUS_BY_EVENT[event['type']], now)
+                ).fetchone()
+                if row:
+                    claimed.append(payment_intent)
+        return claimed
+
+    def applied_intents(self, payment_intents: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """The newest recorded event id and payment status per payment intent"""
+        payment_intents = list(payment_intents)
+        if not payment_intents:
+            return {}
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT payment_intent, event_id, payment_status FROM applied_intents '
+                f"WHERE payment_intent IN ({', '.join('?' * len(payment_intents))})",
+                payment_intents
+            ).fetchall()
+        return {row[0]: {'event_id': row[1], 'payment_status': row[2]} for row in rows}
+
+    def prune(self, older_than_seconds: float) -> None:
+        """Forget processed events once Stripe can no longer redeliver them"""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM stripe_events WHERE status = ? AND processed_at < ?', ('done', cutoff))
+            conn.execute('DELETE FROM applied_intents WHERE applied_at < ?', (cutoff,))
+
+def event_created(event: Dict[str, Any]) -> int:
+    """Stripe's creation time of a queued event"""
+    return int(event['event'].get('created') or 0)
+
+def _newer(event: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """
+    Whether event supersedes current for the same payment intent
+
+    Stripe's created is in whole seconds; within a second a success wins,
+    since a payment intent never fails after it has succeeded.
+    """
+    created, current_created = event_created(event), event_created(current)
+    if created != current_created:
+        return created > current_created
+    return PAYMENT_STATUS_BY_EVENT[event['type']] == 'succeeded' or PAYMENT_STATUS_BY_EVENT[current['type']] != 'succeeded'
+
+class PaymentIntentIndex:
+    """Cached stripe_payment_intent_id -> order id lookups"""
+
+    def __init__(self, ttl: float = 3600):
+        self._cache = TTLCache(ttl, maxsize=10000)
+
+    def remember(self, payment_intent_id: str, order_id: str) -> None:
+        self._cache.set(payment_intent_id, order_id)
+
+    def resolve(self, client, payment_intent_ids: Iterable[str]) -> Dict[str, str]:
+        """Map payment intents to order ids, fetching all cache misses in one query"""
+        resolved = {}
+        misses = []
+        for payment_intent_id in set(payment_intent_ids):
+            order_id = self._cache.get(payment_intent_id)
+            if order_id:
+                resolved[payment_intent_id] = order_id
+            else:
+                misses.append(payment_intent_id)
+
+        if misses:
+            intent_filter = ' || '.join(f'stripe_payment_intent_id = "{pi}"' for pi in misses)
+            orders = client.get_full_list(
+                'orders',
+                query_params={"filter": intent_filter, "fields": "id,stripe_payment_intent_id"}
+            )
+            for order in orders:
+                self.remember(order.stripe_payment_intent_id, order.id)
+                resolved[order.stripe_payment_intent_id] = order.id
+        return resolved
+
+class WebhookWorker:
+    """Background task that drains the queue and applies payment status updates in batches"""
+
+    def __init__(self, queue: WebhookQueue, index: PaymentIntentIndex, batch_size: int = 100):
+        self.queue = queue
+        self.index = index
+        self.batch_size = batch_size
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.process_once)
+            except Exception as e:
+                logger.error(f"Stripe webhook worker error: {str(e)}")
+                processed = 0
+
+            # Keep draining while there is a backlog, otherwise wait for new events
+            if processed < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=Config.WEBHOOK_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def process_once(self) -> int:
+        """Apply one batch of queued events; returns the number of events claimed"""
+        if time.time() - self._last_prune > 3600:
+            self.queue.prune(older_than_seconds=7 * 24 * 3600)
+            self._last_prune = time.time()
+
+        events = self.queue.claim(self.batch_size)
+        if not events:
+            return 0
+
+        # Collapse to the latest status per payment intent
+        latest: Dict[str, Dict[str, Any]] = {}
+        for event in events:
+            payment_intent = event['event']['data']['object']
+            current = latest.get(payment_intent['id'])
+            if current is None or _newer(event, current):
+                latest[payment_intent['id']] = event
+
+        client = create_admin_client()
+        try:
+            orders_by_intent = self.index.resolve(client, latest.keys())
+        except Exception as e:
+            self.queue.retry_later(events, f"Order lookup failed: {str(e)}")
+            raise
+
+        # An intent without an order may be one whose order is still being created
+        unmatched = [pi for pi in latest if pi not in orders_by_intent]
+        if unmatched:
+            logger.warning(f"No order found yet for payment intents: {', '.join(unmatched)}")
+            self.queue.retry_later(
+                [e for e in events if e['event']['data']['object']['id'] in unmatched],
+                'No matching order'
+            )
+
+        # Events older than one already applied, possibly in an earlier batch or
+        # by another worker, are dropped rather than overwriting a newer status
+        matched = [e for e in events if e['event']['data']['object']['id'] in orders_by_intent]
+        fresh = self.queue.claim_intents({pi: event for pi, event in latest.items() if pi in orders_by_intent})
+        superseded = [pi for pi in latest if pi in orders_by_intent and pi not in fresh]
+        if superseded:
+            logger.info(f"Skipping superseded payment events for intents: {', '.join(superseded)}")
+
+        updates = {
+            orders_by_intent[pi]: {'payment_status': PAYMENT_STATUS_BY_EVENT[latest[pi]['type']]}
+            for pi in fresh
+        }
+        try:
+            self._write(client, updates)
+            # A worker that claimed a newer event while this batch was being
+            # written may have written it first; write its status again
+            overtaken = {
+                orders_by_intent[pi]: {'payment_status': applied['payment_status']}
+                for pi, applied in self.queue.applied_intents(fresh).items()
+                if applied['event_id'] != latest[pi]['id']
+            }
+            self._write(client, overtaken)
+            updates.update(overtaken)
+        except Exception as e:
+            self.queue.retry_later(matched, f"Order update failed: {str(e)}")
+            raise
+
+        self.queue.mark_done(e['id'] for e in matched)
+        order_cache.delete(*updates)
+        for order_id, data in updates.items():
+            status_history.record(order_id, 'payment_status', data['payment_status'], source='stripe')
+            logger.info(f"Updated order {order_id} payment status to {data['payment_status']}")
+        return len(events)
+
+    def _write(self, client, updates: Dict[str, Dict[str, Any]]) -> None:
+        order_ids = list(updates)
+        for start in range(0, len(order_ids), Config.POCKETBASE_BATCH_SIZE):
+            chunk = order_ids[start:start + Config.POCKETBASE_BATCH_SIZE]
+            client.batch_update('orders', {order_id: updates[order_id] for order_id in chunk})
+
+webhook_queue = WebhookQueue()
+payment_intent_index = PaymentIntentIndex()
+webhook_worker = WebhookWorker(webhook_queue, payment_intent_index)
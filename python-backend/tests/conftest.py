@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Config is read at import time; keep queues and caches out of the real data dir
+os.environ.setdefault('LOCALMART_DATA_DIR', tempfile.mkdtemp(prefix='localmart-tests-'))
@@ -0,0 +1,58 @@
+import pytest
+
+from localmart_backend.cache import SharedStore, TieredCache
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' views of one cache: separate stores and local tiers over the same file"""
+    path = str(tmp_path / 'cache.sqlite3')
+    first, second = SharedStore(path), SharedStore(path)
+    return TieredCache('things', 60, shared=first), TieredCache('things', 60, shared=second)
+
+def test_value_set_by_one_worker_is_read_by_another(workers):
+    first, second = workers
+    first.set('a', {'n': 1})
+    assert second.get('a') == {'n': 1}
+
+def test_delete_reaches_the_other_workers_local_tier(workers):
+    first, second = workers
+    first.set('a', 1)
+    assert second.get('a') == 1  # now held locally by the second worker too
+
+    first.delete('a')
+    assert second.get('a') is None
+    assert first.get('a') is None
+
+def test_tag_invalidation_round_trip(workers):
+    first, second = workers
+    first.set('a', 1, tags=['store:1'])
+    first.set('b', 2, tags=['store:2'])
+    assert (second.get('a'), second.get('b')) == (1, 2)
+
+    second.invalidate_tags('store:1')
+    assert first.get('a') is None
+    assert first.get('b') == 2
+
+def test_value_loaded_across_an_invalidation_is_not_shared(workers):
+    first, second = workers
+
+    def load():
+        # Another worker invalidates while this one is still loading
+        second.delete('a')
+        return 'stale'
+
+    assert first.get_or_load('a', load) == 'stale'
+    assert second.get('a') is None
+
+def test_local_tier_is_cleared_when_the_log_was_pruned_past_it(workers):
+    first, second = workers
+    second.set('a', 1)
+    assert second.get('a') == 1
+
+    first.delete('a')
+    # Simulate the log being pruned before the second worker polled
+    with first.shared._lock:
+        first.shared._connection().execute('DELETE FROM cache_invalidations')
+    second.shared._polled = (None, 0.0)
+
+    assert second.get('a') is None
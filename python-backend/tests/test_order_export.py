@@ -0,0 +1,59 @@
+import datetime
+import re
+
+from pocketbase import PocketBase
+
+from localmart_backend.order_export import iter_orders
+
+CURSOR = re.compile(r'created > "([^"]+)" \|\| \(created = "\1" && id > "([^"]+)"\)')
+
+class FakeClient:
+    """Serves raw order pages from a list, applying iter_orders' keyset cursor"""
+
+    def __init__(self, rows):
+        self.client = PocketBase('http://pocketbase.test')
+        self.client.send = self.send
+        self.rows = sorted(rows, key=lambda row: (row['created'], row['id']))
+        self.filters = []
+
+    def send(self, path, config):
+        params = config['params']
+        self.filters.append(params['filter'])
+        rows = self.rows
+        cursor = CURSOR.search(params['filter'])
+        if cursor:
+            rows = [row for row in rows if (row['created'], row['id']) > cursor.groups()]
+        assert params['page'] == 1
+        return {'items': [dict(row) for row in rows[:params['perPage']]]}
+
+def order(order_id, created):
+    return {'id': order_id, 'created': created, 'collectionId': 'orders', 'collectionName': 'orders'}
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+END = datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc)
+
+def test_pages_cover_every_order_once_in_order():
+    # Several orders share a millisecond, and pages end in the middle of them
+    rows = [
+        order('a0000000000000c', '2026-01-02 10:00:00.123Z'),
+        order('a0000000000000a', '2026-01-02 10:00:00.123Z'),
+        order('a0000000000000b', '2026-01-02 10:00:00.123Z'),
+        order('a0000000000000d', '2026-01-02 10:00:00.124Z'),
+        order('a0000000000000e', '2026-01-03 09:00:00.000Z'),
+    ]
+    client = FakeClient(rows)
+
+    ids = [record.id for record in iter_orders(client, START, END, page_size=2)]
+    assert ids == ['a0000000000000a', 'a0000000000000b', 'a0000000000000c', 'a0000000000000d', 'a0000000000000e']
+    # Three pages; the last is short, so there is no extra empty query
+    assert len(client.filters) == 3
+
+def test_cursor_keeps_milliseconds():
+    client = FakeClient([order('a0000000000000a', '2026-01-02 10:00:00.123Z'), order('a0000000000000b', '2026-01-02 10:00:00.999Z')])
+    list(iter_orders(client, START, END, page_size=1))
+    assert 'created > "2026-01-02 10:00:00.123Z"' in client.filters[1]
+
+def test_range_bounds_are_in_every_query():
+    client = FakeClient([])
+    assert list(iter_orders(client, START, END)) == []
+    assert client.filters == ['created >= "2026-01-01 00:00:00.000Z" && created < "2026-02-01 00:00:00.000Z"']
@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+import pytest
+
+from localmart_backend import pricing
+from localmart_backend.pricing import PricingError, price_cart, tax_rate_for_zip
+
+@pytest.fixture
+def prices(monkeypatch):
+    """Stored prices by item id, standing in for the catalog and PocketBase"""
+    stored = {}
+    monkeypatch.setattr(
+        pricing, 'load_item_prices',
+        lambda store_id, item_ids: {item_id: pricing.to_money(stored[item_id]) for item_id in item_ids if item_id in stored}
+    )
+    monkeypatch.setattr(pricing.catalog, 'get_store', lambda store_id: None)
+    return stored
+
+def test_tax_rounds_half_up_to_the_cent(prices):
+    prices['apple'] = 1.00
+    # 1.00 * 8.875% = 0.08875, which rounds up rather than to even
+    cart = price_cart('store', [{'store_item_id': 'apple', 'quantity': 1}], {'zip_code': '10001'})
+    assert cart.tax == Decimal('0.09')
+    assert cart.total == Decimal('1.00') + Decimal('0.09') + pricing.to_money(pricing.Config.DELIVERY_FEE)
+
+def test_line_totals_are_exact(prices):
+    prices['milk'] = 3.10
+    cart = price_cart('store', [{'store_item_id': 'milk', 'quantity': 3}], {'zip_code': '11201'})
+    # 3 * 3.10 is 9.299999... in floating point
+    assert cart.subtotal == Decimal('9.30')
+    assert cart.summary()['items'][0]['total_price'] == 9.3
+
+def test_tax_rate_by_zip_prefix_with_default():
+    assert tax_rate_for_zip('11550') == Decimal('0.08625')
+    assert tax_rate_for_zip(' 10001-1234') == Decimal('0.08875')
+    assert tax_rate_for_zip(None) == Decimal(pricing.Config.DEFAULT_TAX_RATE)
+
+def test_client_totals_within_a_cent_are_accepted(prices):
+    prices['bread'] = 4.99
+    cart = price_cart('store', [{'store_item_id': 'bread', 'quantity': 2}], {'zip_code': '10001'})
+    summary = cart.summary()
+    request = {**summary, 'total_amount': summary['total_amount'] + 0.01}
+    cart.check_client_totals(request)
+
+def test_client_totals_off_by_more_than_a_cent_are_rejected(prices):
+    prices['bread'] = 4.99
+    cart = price_cart('store', [{'store_item_id': 'bread', 'quantity': 2}], {'zip_code': '10001'})
+    summary = cart.summary()
+    with pytest.raises(PricingError, match='total_amount'):
+        cart.check_client_totals({**summary, 'total_amount': summary['total_amount'] - 0.02})
+    with pytest.raises(PricingError, match='bread'):
+        cart.check_client_totals({**summary, 'items': [{**summary['items'][0], 'price': 3.99}]})
+
+@pytest.mark.parametrize('items, message', [
+    ([], 'empty'),
+    ([{'store_item_id': 'apple', 'quantity': 0}], 'quantity'),
+    ([{'store_item_id': 'apple', 'quantity': True}], 'quantity'),
+    ([{'store_item_id': 'apple', 'quantity': 1.5}], 'quantity'),
+    ([{'quantity': 1}], 'store_item_id'),
+    ([{'store_item_id': 'pear', 'quantity': 1}], 'pear'),
+])
+def test_invalid_carts_are_rejected(prices, items, message):
+    prices['apple'] = 1.00
+    with pytest.raises(PricingError, match=message):
+        price_cart('store', items)
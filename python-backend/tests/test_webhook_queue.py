@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from localmart_backend import webhook_queue
+from localmart_backend.webhook_queue import WebhookQueue, WebhookWorker
+
+class FakeIndex:
+    """Every payment intent belongs to the order named after it"""
+
+    def resolve(self, client, payment_intent_ids):
+        return {pi: f'order_{pi}' for pi in payment_intent_ids}
+
+class FakeClient:
+    def __init__(self):
+        self.writes = []
+        self.fail = False
+
+    def batch_update(self, collection, updates):
+        if self.fail:
+            raise RuntimeError('PocketBase is down')
+        self.writes.append(updates)
+
+@pytest.fixture
+def queue(tmp_path):
+    return WebhookQueue(str(tmp_path / 'events.sqlite3'))
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(webhook_queue, 'create_admin_client', lambda: client)
+    monkeypatch.setattr(webhook_queue.status_history, 'record', lambda *args, **kwargs: None)
+    monkeypatch.setattr(webhook_queue.order_cache, 'delete', lambda *keys: None)
+    return client
+
+@pytest.fixture
+def worker(queue, client):
+    return WebhookWorker(queue, FakeIndex())
+
+def enqueue(queue, event_id, status, created, payment_intent='pi_1'):
+    event_type = {'succeeded': 'payment_intent.succeeded', 'failed': 'payment_intent.payment_failed'}[status]
+    event = {'id': event_id, 'type': event_type, 'created': created, 'data': {'object': {'id': payment_intent}}}
+    return queue.enqueue(event_id, event_type, json.dumps(event))
+
+def statuses(queue):
+    with queue._lock:
+        return dict(queue._connection().execute('SELECT id, status FROM stripe_events').fetchall())
+
+def test_redelivered_events_are_queued_once(queue):
+    assert enqueue(queue, 'evt_1', 'succeeded', 100)
+    assert not enqueue(queue, 'evt_1', 'succeeded', 100)
+
+def test_batch_collapses_to_the_latest_event_per_intent(queue, client, worker):
+    enqueue(queue, 'evt_1', 'failed', 100)
+    enqueue(queue, 'evt_2', 'succeeded', 200)
+    enqueue(queue, 'evt_3', 'failed', 150, payment_intent='pi_2')
+
+    assert worker.process_once() == 3
+    assert client.writes == [{'order_pi_1': {'payment_status': 'succeeded'}, 'order_pi_2': {'payment_status': 'failed'}}]
+    assert set(statuses(queue).values()) == {'done'}
+
+def test_success_wins_within_the_same_second(queue, client, worker):
+    enqueue(queue, 'evt_1', 'succeeded', 100)
+    enqueue(queue, 'evt_2', 'failed', 100)
+
+    worker.process_once()
+    assert client.writes == [{'order_pi_1': {'payment_status': 'succeeded'}}]
+
+def test_older_event_in_a_later_batch_is_skipped(queue, client, worker):
+    enqueue(queue, 'evt_2', 'succeeded', 200)
+    worker.process_once()
+    enqueue(queue, 'evt_1', 'failed', 100)
+    worker.process_once()
+
+    assert client.writes == [{'order_pi_1': {'payment_status': 'succeeded'}}]
+    assert statuses(queue) == {'evt_1': 'done', 'evt_2': 'done'}
+
+def test_failed_write_is_retried_later(queue, client, worker):
+    enqueue(queue, 'evt_1', 'succeeded', 100)
+    client.fail = True
+    with pytest.raises(RuntimeError):
+        worker.process_once()
+
+    with queue._lock:
+        attempts = queue._connection().execute(
+            'SELECT attempts FROM stripe_events WHERE id = ?', ('evt_1',)
+        ).fetchone()[0]
+    assert attempts == 1
+    # Backed off, so not claimed again straight away
+    assert queue.claim(10) == []
+    with queue._lock:
+        queue._connection().execute('UPDATE stripe_events SET next_attempt_at = 0')
+
+    # The retry of the same event is still the newest for its intent
+    client.fail = False
+    assert worker.process_once() == 1
+    assert client.writes == [{'order_pi_1': {'payment_status': 'succeeded'}}]
+    assert statuses(queue) == {'evt_1': 'done'}
+
+def test_events_give_up_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(webhook_queue.Config, 'WEBHOOK_MAX_ATTEMPTS', 2)
+    enqueue(queue, 'evt_1', 'succeeded', 100)
+    for _ in range(2):
+        events = queue.claim(10, lease_seconds=0)
+        queue.retry_later(events, 'boom')
+        with queue._lock:
+            queue._connection().execute('UPDATE stripe_events SET next_attempt_at = 0')
+    assert statuses(queue) == {'evt_1': 'failed'}